@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'kgqa',
 ]
 
 MIDDLEWARE = [
@@ -131,11 +132,24 @@ STATICFILES_DIRS  =(
 )
 
 STATIC_URL = '/static/'
-from kgqa.KB_query import jena_sparql_endpoint
-from kgqa.KB_query import question2sparql
-# TODO 连接Fuseki服务器。
-fuseki = jena_sparql_endpoint.JenaFuseki()
-# TODO 初始化自然语言到SPARQL查询的模块，参数是外部词典列表。
-q2s = question2sparql.Question2Sparql(['E:/kgqa/code/KGQA/kgqa/KB_query/dict/jibing_pos_name.txt',
-                                       'E:/kgqa/code/KGQA/kgqa/KB_query/dict/drug_pos_name.txt',
-                                       'E:/kgqa/code/KGQA/kgqa/KB_query/dict/symptom_pos.txt'])
+
+# 问答流水线（见kgqa/pipeline.py），第一次使用或预热时才加载，导入settings不做任何加载
+# Fuseki服务器的查询地址
+KGQA_FUSEKI_ENDPOINT = os.environ.get('KGQA_FUSEKI_ENDPOINT', 'http://localhost:3030/kgdrug/query')
+# 外部词典列表，环境变量KGQA_DICT_PATHS可以给出用os.pathsep分隔的路径
+KGQA_DICT_DIR = os.path.join(BASE_DIR, 'kgqa', 'KB_query', 'dict')
+KGQA_DICT_PATHS = [os.path.join(KGQA_DICT_DIR, name) for name in
+                   ['jibing_pos_name.txt', 'drug_pos_name.txt', 'symptom_pos.txt']]
+if os.environ.get('KGQA_DICT_PATHS'):
+    KGQA_DICT_PATHS = os.environ['KGQA_DICT_PATHS'].split(os.pathsep)
+# 词典缓存目录，None为系统临时目录
+KGQA_DICT_CACHE_DIR = os.environ.get('KGQA_DICT_CACHE_DIR') or None
+# save_rules保存的规则文件（python manage.py warmup --save-rules生成），None时在启动时构造规则
+KGQA_RULES_PATH = os.environ.get('KGQA_RULES_PATH') or None
+# 每隔多少秒检查一次词典文件，改动后在后台重新加载（不必重启），0（默认）为不检查。
+# POST /kgqa/dict/reload只重新加载一个进程的词典，多进程部署要让所有进程都更新时打开，如设为60
+KGQA_DICT_WATCH_INTERVAL = float(os.environ.get('KGQA_DICT_WATCH_INTERVAL', '0'))
+# 最多缓存多少个问题的解析结果（按规范化后的问题），0为不缓存
+KGQA_QUESTION_CACHE_SIZE = int(os.environ.get('KGQA_QUESTION_CACHE_SIZE', '1024'))
+# wsgi启动时如何预热：'sync'预热完才接受请求，'background'在后台线程预热，''不预热（第一次请求时加载）
+KGQA_WARM_UP = os.environ.get('KGQA_WARM_UP', 'background')
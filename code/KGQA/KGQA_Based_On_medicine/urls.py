@@ -22,4 +22,6 @@ import sys
 from kgqa import views
 urlpatterns = [
     url(r'^kgqa$', views.search_post),
+    url(r'^kgqa/ready$', views.ready),
+    url(r'^kgqa/dict/reload$', views.reload_dictionaries),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
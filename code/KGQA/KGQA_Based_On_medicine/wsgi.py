@@ -13,6 +13,14 @@ from django.core.wsgi import get_wsgi_application
 from os.path import join,dirname,abspath
 PROJECT_DIR = dirname(dirname(abspath(__file__)))
 sys.path.insert(0,PROJECT_DIR)
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testproject.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "KGQA_Based_On_medicine.settings")
 
 application = get_wsgi_application()
+
+# 在接受请求之前（或在后台）预热问答流水线，见settings.KGQA_WARM_UP
+from django.conf import settings
+from kgqa.pipeline import pipeline
+if settings.KGQA_WARM_UP == 'sync':
+    pipeline.warm_up()
+elif settings.KGQA_WARM_UP == 'background':
+    pipeline.warm_up_in_background()
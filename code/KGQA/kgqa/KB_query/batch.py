@@ -0,0 +1,135 @@
+# encoding=utf-8
+
+"""
+@desc: 离线批量解析问题（如重新跑几个月的问题日志做评测）。
+jieba分词、标注词性是纯Python的计算，受GIL限制只能用一个核；这里把问题分块交给ProcessPoolExecutor，
+每个子进程只加载一次词典、规则，结果按输入顺序逐个返回，写成JSONL：
+
+    python -m kgqa.KB_query.batch questions.txt -o parsed.jsonl --workers 8
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DICT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dict')
+# 与settings.KGQA_DICT_PATHS相同的词典
+DICT_PATHS = [os.path.join(DICT_DIR, name) for name in
+              ['jibing_pos_name.txt', 'drug_pos_name.txt', 'symptom_pos.txt']]
+
+# 子进程中的Question2Sparql，由_init_worker构造
+_q2s = None
+
+
+def _init_worker(dict_paths, rules_path, cache_dir):
+    global _q2s
+    from kgqa.KB_query.question2sparql import Question2Sparql
+    _q2s = Question2Sparql(dict_paths, rules_path=rules_path, cache_dir=cache_dir)
+
+
+def _build_caches(dict_paths, cache_dir):
+    """
+    先在本进程生成词典缓存，子进程都直接读缓存，不会各自加载词典。
+    用单独的jieba.Tokenizer生成，不改动本进程的jieba.dt
+    """
+    import jieba
+    from kgqa.KB_query import userdict_cache
+    from kgqa.KB_query.gazetteer import Gazetteer
+    tokenizer = jieba.Tokenizer()
+    if userdict_cache.read_cache(userdict_cache.cache_file(dict_paths, cache_dir, tokenizer)) is None:
+        userdict_cache.load_userdicts(dict_paths, cache_dir, tokenizer)
+    Gazetteer.load(dict_paths, cache_dir)
+
+
+def _parse_chunk(questions):
+    results = []
+    for question in questions:
+        parsed = _q2s.parse(question)
+        results.append({
+            'question': question,
+            'intent': parsed.intent,
+            'entities': [list(entity) for entity in parsed.entities],
+            'sparql': parsed.sparql,
+        })
+    return results
+
+
+def _chunks(questions, chunksize):
+    questions = iter(questions)
+    while True:
+        chunk = list(itertools.islice(questions, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_questions(questions, dict_paths=None, rules_path=None, cache_dir=None,
+                    workers=None, chunksize=200):
+    """
+    在多个进程中解析问题，按输入顺序逐个产生结果。
+    同时在处理的块数有上限，questions可以是很大的文件，不会一次读入
+    :param questions: 问题（str）的可迭代对象
+    :param dict_paths: 外部词典路径列表，默认为DICT_PATHS
+    :param rules_path: question_drug_template.save_rules保存的规则文件，不给出时每个进程各自构造规则
+    :param cache_dir: 词典缓存目录，默认为系统临时目录
+    :param workers: 进程数，默认为CPU核数
+    :param chunksize: 每次交给子进程的问题数
+    :return: {'question', 'intent', 'entities', 'sparql'}
+    """
+    if dict_paths is None:
+        dict_paths = DICT_PATHS
+    if workers is None:
+        workers = os.cpu_count() or 1
+    _build_caches(dict_paths, cache_dir)
+
+    # 用spawn而不是fork：子进程不继承本进程已加载的词典和后台线程（如词典的watch线程）
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(dict_paths, rules_path, cache_dir)) as executor:
+        pending = deque()
+        for chunk in _chunks(questions, chunksize):
+            pending.append(executor.submit(_parse_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                for result in pending.popleft().result():
+                    yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='批量把问题转为SPARQL，每行一个问题，输出JSONL')
+    parser.add_argument('input', help="问题文件，每行一个问题，'-'为标准输入")
+    parser.add_argument('-o', '--output', default='-', help="输出的JSONL文件，'-'为标准输出")
+    parser.add_argument('--dict', nargs='+', dest='dict_paths', default=DICT_PATHS,
+                        help='外部词典文件')
+    parser.add_argument('--rules', dest='rules_path', help='save_rules保存的规则文件')
+    parser.add_argument('--cache-dir', help='词典缓存目录')
+    parser.add_argument('--workers', type=int, help='进程数，默认为CPU核数')
+    parser.add_argument('--chunksize', type=int, default=200)
+    cfg = parser.parse_args(argv)
+
+    fin = sys.stdin if cfg.input == '-' else open(cfg.input, encoding='utf-8')
+    fout = sys.stdout if cfg.output == '-' else open(cfg.output, 'w', encoding='utf-8')
+    try:
+        questions = (line.strip() for line in fin)
+        questions = (q for q in questions if q)
+        for result in parse_questions(questions, cfg.dict_paths, cfg.rules_path,
+                                      cfg.cache_dir, cfg.workers, cfg.chunksize):
+            fout.write(json.dumps(result, ensure_ascii=False) + '\n')
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
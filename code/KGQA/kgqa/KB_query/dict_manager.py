@@ -0,0 +1,175 @@
+# encoding=utf-8
+
+"""
+@desc: 可以热更新的实体词典。
+每一代词典是一个Tagger，有自己的jieba.Tokenizer和实体词典识别器。词典文件改动（或调用reload）后，
+在后台构造新的一代，构造完再整体替换；正在处理的问题拿到的是旧的一代，处理完之前不受影响。
+单个实体的增删（add_word/del_word）不必重新加载词典：复制当前这一代，在副本上增删后同样整体替换。
+
+每个Django进程各有一个DictionaryManager，让所有进程都更新词典的办法是修改词典文件，
+由watch启动的线程发现文件改动后各自重新加载。
+"""
+
+import os
+import threading
+import time
+
+import jieba
+
+from kgqa.KB_query import word_tagging
+
+
+class DictionaryManager(object):
+    def __init__(self, dict_paths, cache_dir=None):
+        """
+        :param dict_paths: 外部词典路径列表
+        :param cache_dir: 词典缓存目录，默认为系统临时目录
+        """
+        self.dict_paths = list(dict_paths)
+        self.cache_dir = cache_dir
+        self.lock = threading.RLock()
+        # add_word/del_word的改动：[(词语, 词性, 词频), ...]，词性为None表示删除。重新加载后再应用一遍
+        self.edits = []
+        self.error = None
+        self._reloading = None
+        self._watcher = None
+        self.signature = self._signature()
+        # (版本, Tagger)，一起替换，读到的版本号总是对应读到的Tagger。
+        # 版本在每次替换或增删词语时加1，问题解析结果的缓存以它区分词典的版本
+        self.current = (0, self._build([]))
+
+    @property
+    def generation(self):
+        return self.current[0]
+
+    @property
+    def tagger(self):
+        return self.current[1]
+
+    def _signature(self):
+        """
+        词典文件的(修改时间, 大小)，用来发现文件改动
+        """
+        signature = []
+        for p in self.dict_paths:
+            try:
+                st = os.stat(p)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def _build(self, edits):
+        tagger = word_tagging.Tagger(self.dict_paths, self.cache_dir,
+                                     tokenizer=jieba.Tokenizer())
+        _apply_edits(tagger, edits)
+        return tagger
+
+    def reload(self):
+        """
+        重新加载词典文件，构造新的一代后替换当前的一代
+        :return:
+        """
+        with self.lock:
+            signature = self._signature()
+            edits = list(self.edits)
+        tagger = self._build(edits)
+        with self.lock:
+            # 构造期间又增删的词语补上
+            _apply_edits(tagger, self.edits[len(edits):])
+            self.current = (self.generation + 1, tagger)
+            self.signature = signature
+            self.error = None
+
+    def reload_in_background(self):
+        """
+        在后台线程中重新加载，立即返回。已经在加载时不再启动新的线程
+        :return: 线程
+        """
+        with self.lock:
+            if self._reloading is not None and self._reloading.is_alive():
+                return self._reloading
+            thread = threading.Thread(target=self._reload_quietly,
+                                      name='kgqa-dict-reload')
+            thread.daemon = True
+            self._reloading = thread
+        thread.start()
+        return thread
+
+    def _reload_quietly(self):
+        try:
+            self.reload()
+        except Exception as e:
+            self.error = repr(e)  # 继续用当前的一代
+
+    def changed(self):
+        """
+        词典文件是否改动过
+        """
+        return self._signature() != self.signature
+
+    def watch(self, interval=60.0):
+        """
+        启动后台线程，每interval秒检查一次词典文件，改动后重新加载。
+        只检查文件的修改时间和大小，但每个进程各有一个线程，间隔不宜太短
+        :param interval: 秒
+        :return: 线程
+        """
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                             name='kgqa-dict-watch')
+            self._watcher.daemon = True
+            self._watcher.start()
+        return self._watcher
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            if self.changed():
+                self._reload_quietly()
+
+    def add_word(self, word, tag, freq=None):
+        """
+        增加一个实体（或改词性），立即生效，重新加载词典文件后仍然有效
+        :param word: 词语
+        :param tag: 词性，如'nz'
+        :param freq: 词频，默认为jieba能切分出这个词的词频
+        :return:
+        """
+        with self.lock:
+            tagger = self.tagger.copy()
+            tagger.add_word(word, tag, freq)
+            self.edits.append((word, tag, freq))
+            self.current = (self.generation + 1, tagger)
+
+    def del_word(self, word):
+        """
+        删除一个实体，立即生效，重新加载词典文件后仍然有效
+        :param word: 词语
+        :return:
+        """
+        with self.lock:
+            tagger = self.tagger.copy()
+            tagger.del_word(word)
+            self.edits.append((word, None, None))
+            self.current = (self.generation + 1, tagger)
+
+    def status(self):
+        """
+        就绪接口报告的词典状态
+        """
+        return {
+            'generation': self.generation,
+            'entities': len(self.tagger.gazetteer) if self.tagger.gazetteer is not None else None,
+            'edits': len(self.edits),
+            'reloading': self._reloading is not None and self._reloading.is_alive(),
+            'error': self.error,
+        }
+
+
+def _apply_edits(tagger, edits):
+    for word, tag, freq in edits:
+        if tag is None:
+            tagger.del_word(word)
+        else:
+            tagger.add_word(word, tag, freq)
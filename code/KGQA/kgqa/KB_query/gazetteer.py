@@ -0,0 +1,299 @@
+# encoding=utf-8
+
+"""
+@desc: 实体词典识别器（gazetteer）：用药品、疾病、症状词典构造Aho-Corasick自动机，
+一遍扫描问题就找出最左最长的实体及其类型（词性nd/nj/nz），不需要jieba的HMM词性标注。
+"""
+
+import re
+from collections import deque
+
+from kgqa.KB_query import userdict_cache
+
+# 与jieba.load_userdict相同的词典行格式：词 [词频] [词性]，词中可以有空格
+re_userdict = re.compile(r'^(.+?)( [0-9]+)?( [a-z]+)?$', re.U)
+
+# goto表的键：(状态 << CHAR_BITS) | 字符编码
+CHAR_BITS = 21
+
+
+class Gazetteer(object):
+    """
+    状态0为根。goto把(状态, 字符)映射到下一个状态，fail[s]为失配时转到的状态，
+    word[s]为以状态s结尾的词典词(长度, 词性)（没有时为None），
+    link[s]为沿fail链第一个有词的状态（没有时为0），用来列出在某个位置结束的所有词。
+    增删词语时还要用到fail的反向表（fail为s的状态），在第一次增删时构造
+    """
+    def __init__(self, words=()):
+        self.goto = {}
+        self.fail = [0]
+        self.word = [None]
+        self.link = [0]
+        self.size = 0
+        self._fail_tree = None
+        for w, tag in words:
+            self._insert(w, tag)
+        self._build()
+
+    @classmethod
+    def from_files(cls, dict_paths):
+        """
+        用jieba外部词典文件构造，没有词性的词不是实体，跳过
+        :param dict_paths: 外部词典路径列表
+        :return:
+        """
+        return cls(iter_dict_words(dict_paths))
+
+    @classmethod
+    def load(cls, dict_paths, cache_dir=None):
+        """
+        与from_files相同，但使用词典缓存（见userdict_cache），词典内容没变时不再构造自动机
+        :param dict_paths: 外部词典路径列表
+        :param cache_dir: 缓存目录，默认为系统临时目录
+        :return:
+        """
+        path = userdict_cache.cache_file(dict_paths, cache_dir, name="gazetteer")
+        data = userdict_cache.read_cache(path)
+        if data is not None:
+            gazetteer = cls.__new__(cls)
+            for attr in ("goto", "fail", "word", "link", "size"):
+                setattr(gazetteer, attr, data[attr])
+            gazetteer._fail_tree = None
+            return gazetteer
+        gazetteer = cls.from_files(dict_paths)
+        data = dict((attr, getattr(gazetteer, attr))
+                    for attr in ("goto", "fail", "word", "link", "size"))
+        data["version"] = userdict_cache.CACHE_VERSION
+        userdict_cache.write_cache(path, data)
+        return gazetteer
+
+    def __len__(self):
+        return self.size
+
+    def copy(self):
+        """
+        复制一份，可以在副本上增删词语，正在用原来的自动机的查询不受影响
+        """
+        gazetteer = self.__class__.__new__(self.__class__)
+        gazetteer.goto = dict(self.goto)
+        gazetteer.fail = list(self.fail)
+        gazetteer.word = list(self.word)
+        gazetteer.link = list(self.link)
+        gazetteer.size = self.size
+        # 反向表的元素是tuple，修改时整个替换，副本与原来的自动机可以共用没改过的部分
+        gazetteer._fail_tree = None if self._fail_tree is None else list(self._fail_tree)
+        return gazetteer
+
+    def add_word(self, w, tag):
+        """
+        增加一个词（已有时改为新的词性）。只计算新状态的fail、link，
+        并修改以新状态为最长后缀的状态的fail和受影响的link，不重新构造整个自动机
+        """
+        if not w:
+            return
+        goto = self.goto
+        fail = self.fail
+        link = self.link
+        tree = self._get_fail_tree()
+        s = 0
+        for ch in w:
+            c = ord(ch)
+            t = goto.get((s << CHAR_BITS) | c)
+            if t is None:
+                t = goto[(s << CHAR_BITS) | c] = len(fail)
+                fail.append(0)
+                self.word.append(None)
+                link.append(0)
+                tree.append(())
+                self._attach(s, t, c)
+            s = t
+        if self.word[s] is None:
+            self.size += 1
+            self.word[s] = (len(w), tag)
+            self._set_links(s, s)
+        else:
+            self.word[s] = (len(w), tag)
+
+    def del_word(self, w):
+        """
+        删除一个词，没有时什么也不做。只把词标为删除，状态仍留在goto表中
+        """
+        goto = self.goto
+        s = 0
+        for ch in w:
+            s = goto.get((s << CHAR_BITS) | ord(ch))
+            if s is None:
+                return
+        if self.word[s] is not None:
+            self._get_fail_tree()
+            self.word[s] = None
+            self.size -= 1
+            self._set_links(s, self.link[s])
+
+    def _get_fail_tree(self):
+        if self._fail_tree is None:
+            tree = [[] for _ in self.fail]
+            for s, f in enumerate(self.fail):
+                if s:
+                    tree[f].append(s)
+            self._fail_tree = [tuple(states) for states in tree]
+        return self._fail_tree
+
+    def _set_links(self, s, value):
+        # fail链经过s的状态中，s与它们之间没有词的，link改为value
+        word = self.word
+        link = self.link
+        tree = self._fail_tree
+        stack = list(tree[s])
+        while stack:
+            x = stack.pop()
+            link[x] = value
+            if word[x] is None:
+                stack.extend(tree[x])
+
+    def _attach(self, p, t, c):
+        """
+        新状态t（p经字符c转到t）：计算fail[t]、link[t]，
+        再把以t为最长后缀的已有状态的fail改为t
+        """
+        goto = self.goto
+        fail = self.fail
+        word = self.word
+        link = self.link
+        tree = self._fail_tree
+        f = 0
+        if p:
+            f = fail[p]
+            while f and ((f << CHAR_BITS) | c) not in goto:
+                f = fail[f]
+            f = goto.get((f << CHAR_BITS) | c, 0)
+        fail[t] = f
+        tree[f] = tree[f] + (t,)
+        link[t] = f if word[f] is not None else link[f]
+
+        # 以t为后缀的状态经c从以p为后缀的状态转来，即fail链经过p的状态。
+        # 其中原来的fail比t短（是t的后缀，在t的fail链上）的，fail改为t
+        suffixes = {0}
+        while f:
+            suffixes.add(f)
+            f = fail[f]
+        targets = []
+        stack = list(tree[p])
+        while stack:
+            q = stack.pop()
+            stack.extend(tree[q])
+            s = goto.get((q << CHAR_BITS) | c)
+            if s is not None and s != t and fail[s] in suffixes:
+                targets.append(s)
+        moved = {}
+        for s in targets:
+            moved.setdefault(fail[s], set()).add(s)
+            fail[s] = t
+        for f, states in moved.items():
+            tree[f] = tuple(x for x in tree[f] if x not in states)
+        tree[t] = tuple(targets)
+        value = link[t]
+        for s in targets:
+            link[s] = value
+            if word[s] is None:
+                self._set_links(s, value)
+
+    def _insert(self, w, tag):
+        goto = self.goto
+        s = 0
+        for ch in w:
+            key = (s << CHAR_BITS) | ord(ch)
+            t = goto.get(key)
+            if t is None:
+                t = goto[key] = len(self.fail)
+                self.fail.append(0)
+                self.word.append(None)
+                self.link.append(0)
+            s = t
+        if self.word[s] is None:
+            self.size += 1
+        # 同一个词出现多次时以后出现的词性为准（与jieba相同）
+        self.word[s] = (len(w), tag)
+
+    def _build(self):
+        # 按层（广度优先）计算fail和link
+        children = [[] for _ in self.fail]
+        mask = (1 << CHAR_BITS) - 1
+        for key, t in self.goto.items():
+            children[key >> CHAR_BITS].append((key & mask, t))
+        goto = self.goto
+        queue = deque()
+        for _, t in children[0]:
+            queue.append(t)
+        while queue:
+            s = queue.popleft()
+            for ch, t in children[s]:
+                f = self.fail[s]
+                while f and ((f << CHAR_BITS) | ch) not in goto:
+                    f = self.fail[f]
+                f = goto.get((f << CHAR_BITS) | ch, 0)
+                self.fail[t] = f
+                self.link[t] = f if self.word[f] is not None else self.link[f]
+                queue.append(t)
+
+    def iter_matches(self, text):
+        """
+        逐个产生text中出现的所有词典词
+        :param text: str
+        :return: (开始, 结束, 词性, 实体编号)，按结束位置排序
+        """
+        goto = self.goto
+        fail = self.fail
+        word = self.word
+        link = self.link
+        s = 0
+        for i, ch in enumerate(text):
+            c = ord(ch)
+            while s and ((s << CHAR_BITS) | c) not in goto:
+                s = fail[s]
+            s = goto.get((s << CHAR_BITS) | c, 0)
+            t = s if word[s] is not None else link[s]
+            while t:
+                n, tag = word[t]
+                yield i + 1 - n, i + 1, tag, t
+                t = link[t]
+
+    def find(self, text):
+        """
+        最左最长匹配：从左到右取每个位置开始的最长词典词，互不重叠
+        :param text: str
+        :return: [(开始, 结束, 词性, 实体编号), ...]，实体编号为词在自动机中的状态，同一个词编号相同
+        """
+        longest = {}
+        for start, end, tag, entity in self.iter_matches(text):
+            if end > longest.get(start, (0,))[0]:
+                longest[start] = (end, tag, entity)
+        spans = []
+        i = 0
+        while i < len(text):
+            found = longest.get(i)
+            if found is None:
+                i += 1
+            else:
+                spans.append((i,) + found)
+                i = found[0]
+        return spans
+
+
+def iter_dict_words(dict_paths):
+    """
+    逐个产生词典中有词性的词
+    :param dict_paths: 外部词典路径列表
+    :return: (词, 词性)
+    """
+    for p in dict_paths:
+        with open(p, 'rb') as f:
+            for ln in f:
+                line = ln.strip().decode('utf-8').lstrip(u'\ufeff')
+                if not line:
+                    continue
+                w, _, tag = re_userdict.match(line).groups()
+                # 词典中有的词末尾带空格，jieba切分时永远匹配不到
+                w = w.strip()
+                if tag is not None and w:
+                    yield w, tag.strip()
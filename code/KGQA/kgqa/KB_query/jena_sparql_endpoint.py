@@ -21,6 +21,17 @@ class JenaFuseki:
         self.sparql_conn.setReturnFormat(JSON)
         return self.sparql_conn.query().convert()
 
+    def ping(self):
+        """
+        发送一个空的ASK查询，检查Fuseki能否连接
+        :return: 能连接时为True
+        """
+        try:
+            self.get_sparql_result('ASK {}')
+        except Exception:
+            return False
+        return True
+
     @staticmethod
     def parse_result(query_result):
         """
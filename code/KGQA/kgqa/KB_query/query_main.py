@@ -3,9 +3,11 @@
 """
 @desc:main函数，整合整个处理流程。
 """
-from KGQA_Based_On_medicine.settings import fuseki,q2s
+from kgqa.pipeline import pipeline
 
 def query_function(question):
+        fuseki = pipeline.fuseki
+        q2s = pipeline.q2s
 
 
         while True:
@@ -40,6 +42,10 @@ def query_function(question):
             #print('#' * 100)
 
 if __name__ == '__main__':
+    import os
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KGQA_Based_On_medicine.settings')
+    fuseki = pipeline.fuseki
+    q2s = pipeline.q2s
     while True:
         question = input('请输入你的问题：')
         #print(question.encode('utf-8'))
@@ -4,14 +4,81 @@
 @desc: 将自然语言转为SPARQL查询语句
 """
 
+from collections import defaultdict
+
+from refo import MultiPattern
+from refo.analysis import literals, requirements
+
+from kgqa.KB_query import question_cache
 from kgqa.KB_query import question_drug_template
-from kgqa.KB_query import word_tagging
+from kgqa.KB_query.dict_manager import DictionaryManager
+
+
+class RuleIndex:
+    """
+    规则的倒排索引：特征(key函数, 取值)，如(word_pos_code, 疾病词性nj的编码)、(word_token, '症状') -> 需要该特征的规则。
+    每条规则的每个必要条件（如疾病实体、关键词之一）都要在问题里出现，规则才可能匹配。
+    """
+    def __init__(self, rules):
+        self.keys = set()
+        self.index = defaultdict(list)
+        self.counts = []
+        self.always = []
+        for i, rule in enumerate(rules):
+            count = 0
+            for requirement in requirements(rule.condition):
+                features = [literals(p) for p in requirement]
+                if None in features:
+                    # 不是字面条件，无法索引
+                    continue
+                for key, values in features:
+                    self.keys.add(key)
+                    for value in values:
+                        self.index[(key, value)].append((i, count))
+                count += 1
+            self.counts.append(count)
+            if count == 0:
+                self.always.append(i)
+
+    def candidates(self, word_objects):
+        """
+        返回必要条件都出现在word_objects中的规则编号
+        :param word_objects:
+        :return:
+        """
+        satisfied = defaultdict(set)
+        for w in word_objects:
+            for key in self.keys:
+                for i, requirement in self.index.get((key, key(w)), ()):
+                    satisfied[i].add(requirement)
+        found = set(self.always)
+        for i, requirements_met in satisfied.items():
+            if len(requirements_met) == self.counts[i]:
+                found.add(i)
+        return found
 
 
 class Question2Sparql:
-    def __init__(self, dict_paths):
-        self.tw = word_tagging.Tagger(dict_paths)
-        self.rules = question_drug_template.rules
+    def __init__(self, dict_paths, rules_path=None, cache_dir=None, cache_size=1024):
+        """
+        :param dict_paths: 外部词典路径列表
+        :param rules_path: question_drug_template.save_rules保存的规则文件，不给出时构造规则
+        :param cache_dir: 词典缓存目录，默认为系统临时目录
+        :param cache_size: 最多缓存多少个问题的解析结果，为0时不缓存
+        """
+        # 词典可以热更新，每个问题用当时的那一代Tagger
+        self.dictionaries = DictionaryManager(dict_paths, cache_dir)
+        self.rules = question_drug_template.get_rules(rules_path)
+        # 所有规则编译为一个程序，每个问题只扫描一遍
+        self.matcher = MultiPattern([rule.condition for rule in self.rules])
+        # 没有实体或关键词的问题不必运行refo
+        self.index = RuleIndex(self.rules)
+        # 按规范化后的问题缓存解析结果，没有匹配上的问题也缓存
+        self.cache = question_cache.QuestionCache(cache_size)
+
+    @property
+    def tw(self):
+        return self.dictionaries.tagger
 
     def get_sparql(self, question):
         """
@@ -19,25 +86,54 @@ class Question2Sparql:
         :param question:
         :return:
         """
-        word_objects = self.tw.get_word_objects(question)
+        return self.parse(question).sparql
+
+    def parse(self, question):
+        """
+        与get_sparql相同，但返回question_cache.ParsedQuestion（意图、实体和SPARQL），结果会被缓存
+        :param question: str或utf-8编码的bytes
+        :return:
+        """
+        # 解析的就是缓存的键中的问题，同一个键的问题不会有不同的解析结果。
+        # 键中有词典的版本，词典更新后旧的结果不再命中，逐渐被淘汰
+        question = question_cache.normalize(question)
+        generation, tagger = self.dictionaries.current
+        key = (generation, question)
+        parsed = self.cache.get(key)
+        if parsed is None:
+            parsed = self._parse(question, tagger)
+            self.cache.put(key, parsed)
+        return parsed
+
+    def _parse(self, question, tagger):
+        word_objects = tagger.get_word_objects(question)
+        entities = tuple((w.text, w.pos) for w in word_objects if w.entity is not None)
         queries_dict = dict()
 
-        for rule in self.rules:
+        candidates = self.index.candidates(word_objects)
+        if not candidates:
+            return question_cache.ParsedQuestion(None, entities, None)
+
+        # 只对匹配上的规则生成查询语句，直接用一遍扫描找到的匹配
+        matches = self.matcher.search(word_objects, candidates)
+        for index in sorted(matches):
+            rule = self.rules[index]
             #print(rule)
             # word_objects是一个列表，元素为是包含词语和词语对应词性的对象
-            query, num = rule.apply(word_objects)
+            query, num = rule.apply_match(word_objects, matches[index])
 
             if query is not None:
-                queries_dict[num] = query
+                queries_dict[num] = (rule.action.__name__, query)
 
         if len(queries_dict) == 0:
-            return None
+            return question_cache.ParsedQuestion(None, entities, None)
         elif len(queries_dict) == 1:
-            return list(queries_dict.values())[0]
+            intent, query = list(queries_dict.values())[0]
         else:
             # TODO 匹配多个语句，以匹配关键词最多的句子作为返回结果
-            sorted_dict = sorted(queries_dict.items(), key=lambda item: item[1])
-            return sorted_dict[0][1]
+            sorted_dict = sorted(queries_dict.items(), key=lambda item: item[1][1])
+            intent, query = sorted_dict[0][1]
+        return question_cache.ParsedQuestion(intent, entities, query)
 
 if __name__ == '__main__':
     q2s = Question2Sparql(['./external_dict/jibing_pos_name.txt', './external_dict/drug_pos_name.txt','./external_dict/symptom_pos.txt'])
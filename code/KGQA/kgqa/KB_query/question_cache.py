@@ -0,0 +1,90 @@
+# encoding=utf-8
+
+"""
+@desc: 问题解析结果的缓存。同样的问题（如“糖尿病有什么症状”）每天会被问很多次，
+分词、标注词性和规则匹配的结果只取决于问题文本，所以按规范化后的问题缓存匹配到的意图、实体和SPARQL，
+没有匹配上的问题也缓存（sparql为None）。缓存大小有上限，满了淘汰最久没用到的问题。
+解析的就是规范化后的问题（见Question2Sparql.parse），同一个键的问题解析结果总是相同。
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+# 解析结果：intent为匹配上的规则（QuestionSet的方法名），entities为问题中的词典实体[(词语, 词性), ...]，
+# sparql为查询语句。没有匹配上时intent和sparql为None
+ParsedQuestion = namedtuple('ParsedQuestion', ['intent', 'entities', 'sparql'])
+
+# 问题末尾可以去掉的空白和标点（半角、全角）。jieba把它们单独切为一个词，规则匹配也用不到。
+# 问题中间的全角字符不转为半角，句号、逗号等也不去掉：词典中有带全角字符的词，
+# 如“杞菊地黄丸（浓缩丸）”、“维生素Ｃ片”，还有以句号结尾的词
+TRAILING_PUNCTUATION = u' \t\r\n\u3000?!~？！～'
+
+
+def normalize(question):
+    """
+    规范化问题：去掉首尾空白和末尾的问号、叹号等（见TRAILING_PUNCTUATION）。
+    只做不影响分词和实体识别的改动，规范化后的问题可以直接解析
+    :param question: str或utf-8编码的bytes
+    :return: str
+    """
+    if isinstance(question, bytes):
+        question = question.decode('utf-8')
+    return question.strip().rstrip(TRAILING_PUNCTUATION)
+
+
+class QuestionCache(object):
+    """
+    (词典版本, 规范化后的问题) -> ParsedQuestion的LRU缓存，可以在多个线程中使用。maxsize为0时不缓存
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :param key: (词典版本, 规范化后的问题)
+        :return: ParsedQuestion，没有缓存时为None
+        """
+        with self.lock:
+            parsed = self.entries.get(key)
+            if parsed is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return parsed
+
+    def put(self, key, parsed):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = parsed
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        就绪接口报告的命中情况
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / total if total else None,
+            }
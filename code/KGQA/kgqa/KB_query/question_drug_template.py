@@ -1,10 +1,15 @@
 """
 @desc: 为每个问题设定语义模板
 """
-from refo import finditer, Predicate, Star, Any, Disjunction
+from refo import finditer, Predicate, Star, Any, Disjunction, optimize
+from refo import CodegenVM
+from refo import compile as compile_pattern
+from refo import serialize
+import json
 import re
 import random
 
+from kgqa.KB_query.word_tagging import pos_code, standard_pos_code
 
 
 
@@ -19,32 +24,119 @@ SPARQL_SELECT_TEM = u"{prefix}\n" + \
              u"{expression}\n" + \
              u"}}\n"
 
+# 正则表达式的特殊字符，不含这些字符的token/pos按字面匹配
+REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+
+
+def word_token(word):
+    return word.text
+
+
+def word_pos(word):
+    return word.pos
+
+
+def word_pos_code(word):
+    return word.pos_code
+
+
 class W(Predicate):
     def __init__(self, token=".*", pos=".*"):
         # 正则表达式
         self.token = re.compile(token + "$")
         self.pos = re.compile(pos + "$")
+        # 字面的标准词性（见word_tagging.STANDARD_POS）直接比较词性编码，不用正则
+        self.pos_code = None
+        if not REGEX_SPECIAL.intersection(pos):
+            self.pos_code = standard_pos_code(pos)
         super(W, self).__init__(self.match)
+        # 只限定字面token（或只限定字面pos）时，refo的优化器可以把多个W合并为集合查找
+        if pos == ".*" and not REGEX_SPECIAL.intersection(token):
+            self.literal = (word_token, token)
+        elif token == ".*" and self.pos_code is not None:
+            self.literal = (word_pos_code, self.pos_code)
+        elif token == ".*" and not REGEX_SPECIAL.intersection(pos):
+            self.literal = (word_pos, pos)
+
+    def __repr__(self):
+        return "W({0!r}, {1!r})".format(self.token.pattern[:-1],
+                                        self.pos.pattern[:-1])
+
+    def spec(self):
+        """
+        供refo.serialize保存规则使用：W按token、pos正则表达式保存
+        """
+        return {"token": self.token.pattern[:-1], "pos": self.pos.pattern[:-1]}
+
+    def bulk_terms(self):
+        """
+        供refo.bulk批量匹配使用：对每个不同的token/pos只运行一次正则
+        :return: [(取值函数, 判断函数), ...]
+        """
+        terms = []
+        if self.token.pattern != ".*$":
+            terms.append((word_token, self.token.match))
+        if self.pos_code is not None:
+            terms.append((word_pos_code, self.pos_code.__eq__))
+        elif self.pos.pattern != ".*$":
+            terms.append((word_pos, self.pos.match))
+        return terms
 
     def match(self, word):
-        m1 = self.token.match(word.token.decode('utf-8'))
-        m2 = self.pos.match(word.pos)
+        m1 = self.token.match(word.text)
+        if self.pos_code is None:
+            m2 = self.pos.match(word.pos)
+        else:
+            m2 = word.pos_code == self.pos_code
         return m1 and m2
+
+
+# 规则文件中按名字保存W和取值函数
+serialize.register(W)
+serialize.register(word_token)
+serialize.register(word_pos)
+serialize.register(word_pos_code)
 #
 class Rule(object):
-    def __init__(self, condition_num, condition=None, action=None):
-        assert condition and action
-        self.condition = condition
+    def __init__(self, condition_num, condition=None, action=None, program=None):
+        """
+        :param program: 已编译的条件（如load_rules从规则文件读入的），给出时不再优化、编译condition
+        """
+        assert (condition or program) and action
+        if program is None:
+            # 合并关键词的析取、去掉末尾多余的Star(Any(),greedy=False)
+            condition = optimize(condition)
+            # 规则只编译一次（生成专用的Python代码），之后匹配不再重新编译
+            program = compile_pattern(condition, CodegenVM)
+        self.condition = program.pattern
+        self.program = program
         self.action = action
         self.condition_num = random.random()
 
-    def apply(self, sentence):
+    def apply(self, sentence, stats=None):
+        """
+        :param sentence: 词语对象列表
+        :param stats: refo.MatchStats，传入时统计匹配开销（线程数、谓词耗时等），用于调优规则
+        :return:
+        """
         matches = []
-        for m in finditer(self.condition, sentence):
+        for m in finditer(self.program, sentence, stats):
             i, j = m.span()
             matches.extend(sentence[i:j])
 
         return self.action(matches), self.condition_num
+
+    def apply_match(self, sentence, match):
+        """
+        用已经找到的匹配（如MultiPattern.search的结果）生成查询语句，不再扫描sentence。
+        规则的动作取匹配中第一个对应词性的实体，而每条规则的第一个匹配里就有这个实体，
+        所以结果与apply（用所有匹配）相同
+        :param sentence: 词语对象列表
+        :param match: refo.Match
+        :return:
+        """
+        i, j = match.span()
+        return self.action(sentence[i:j]), self.condition_num
         
 
 #问题集合类
@@ -63,10 +155,10 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_disease:
+            if w.pos_code == pos_disease_code:
                 e = u"?s :jibingname '{person}'." \
                     u"?s :haszhengzhuang ?m." \
-                    u"?m :zzname ?x".format(person=w.token.decode('utf-8'))
+                    u"?m :zzname ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -85,9 +177,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_disease:
+            if w.pos_code == pos_disease_code:
                 e = u"?s :jibingname '{person}'." \
-                    u"?s :bingfazheng ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :bingfazheng ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -107,9 +199,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_disease:
+            if w.pos_code == pos_disease_code:
                 e = u"?s :jibingname '{person}'." \
-                    u"?s :yufang ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :yufang ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -129,9 +221,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_disease:
+            if w.pos_code == pos_disease_code:
                 e = u"?s :jibingname '{person}'." \
-                    u"?s :gaishu ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :gaishu ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -151,9 +243,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_disease:
+            if w.pos_code == pos_disease_code:
                 e = u"?s :jibingname '{person}'." \
-                    u"?s :zhiliao ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :zhiliao ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -174,9 +266,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_drug:
+            if w.pos_code == pos_drug_code:
                 e = u"?s :proname '{person}'." \
-                    u"?s :gazhzh ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :gazhzh ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -196,9 +288,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_drug:
+            if w.pos_code == pos_drug_code:
                 e = u"?s :proname '{person}'." \
-                    u"?s :pzwh ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :pzwh ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -219,9 +311,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_symptom:
+            if w.pos_code == pos_symptom_code:
                 e = u"?s :zzname '{person}'." \
-                    u"?s :zzgaishu ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :zzgaishu ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -241,9 +333,9 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_symptom:
+            if w.pos_code == pos_symptom_code:
                 e = u"?s :zzname '{person}'." \
-                    u"?s :zzyufang ?x".format(person=w.token.decode('utf-8'))
+                    u"?s :zzyufang ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -263,10 +355,10 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_disease:
+            if w.pos_code == pos_disease_code:
                 e = u"?s :jibingname '{person}'." \
                     u"?s :needcure ?m." \
-                    u"?m :proname ?x".format(person=w.token.decode('utf-8'))
+                    u"?m :proname ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -285,10 +377,10 @@ class QuestionSet:
 
         sparql = None
         for w in word_objects:
-            if w.pos == pos_symptom:
+            if w.pos_code == pos_symptom_code:
                 e = u"?s :zzname '{person}'." \
                     u"?s :relatedisease ?m." \
-                    u"?m :jibingname ?x".format(person=w.token.decode('utf-8'))
+                    u"?m :jibingname ?x".format(person=w.text)
 
                 sparql = SPARQL_SELECT_TEM.format(prefix=SPARQL_PREXIX,
                                                   select=select,
@@ -303,6 +395,9 @@ class QuestionSet:
 pos_drug = 'nd'
 pos_disease = 'nj'
 pos_symptom = 'nz'
+pos_drug_code = pos_code(pos_drug)
+pos_disease_code = pos_code(pos_disease)
+pos_symptom_code = pos_code(pos_symptom)
 drug_entity = (W(pos=pos_drug))
 disease_entity = (W(pos=pos_disease))
 symptom_entity = (W(pos=pos_symptom))
@@ -317,24 +412,78 @@ pzwh_keyword = (W('批准文号')|W('文号'))
 disease_drug_keyword = (W('药')|W('药品')|W('药治')|W('药治疗'))
 symptom_disease_keyword = (W('病')|W('疾病'))
 #规则集合
-rules = [
-    Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + zhengzhuang_keyword + Star(Any(),greedy=False),action=QuestionSet.has_zhengzhuang_question),
-    Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + bingfazheng_keyword + Star(Any(),greedy=False),action=QuestionSet.has_bingfazheng_question),
-    Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + yufang_keyword + Star(Any(),greedy=False),action=QuestionSet.has_yufang_question),
-    Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + gaishu_keyword + Star(Any(),greedy=False),action=QuestionSet.has_gaishu_question),
-    Rule(condition_num=2,condition=disease_entity + Star(Any(), greedy=False) +zhiliao_keyword,action=QuestionSet.has_zhiiao_question),
-    Rule(condition_num=2,condition=Star(Any(),greedy=False) + yufang_keyword + disease_entity,action=QuestionSet.has_yufang_question),
-    Rule(condition_num=2,condition=Star(Any(),greedy=False) + zhiliao_keyword + disease_entity,action=QuestionSet.has_zhiiao_question),
-
-    Rule(condition_num=2,condition=drug_entity + Star(Any(),greedy=False) + gnzhzh_keyword +  Star(Any(),greedy=False) ,action=QuestionSet.has_gnzhzh_question),
-    Rule(condition_num=2,condition=drug_entity + Star(Any(),greedy=False) + pzwh_keyword + Star(Any(),greedy=False),action=QuestionSet.has_pzwh_question),
-
-    Rule(condition_num=2,condition=symptom_entity + Star(Any(),greedy=False) + gaishu_keyword + Star(Any(),greedy=False),action=QuestionSet.has_sympotm_gaishu_question),
-    Rule(condition_num=2,condition=symptom_entity + Star(Any(),greedy=False) + yufang_keyword + Star(Any(),greedy=False),action=QuestionSet.has_sympotm_yufang_question),
-    Rule(condition_num=2,condition=Star(Any(),greedy=False) + yufang_keyword + symptom_entity,action=QuestionSet.has_sympotm_yufang_question),
-
-    Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False)  + disease_drug_keyword + (Star(Any(),greedy=False)|disease_entity),action=QuestionSet.has_disease_to_drug_question),
-    Rule(condition_num=2,condition=Star(Any(),greedy=False) + disease_drug_keyword + Star(Any(),greedy=False) + disease_entity,action=QuestionSet.has_disease_to_drug_question),
-    Rule(condition_num=2,condition=symptom_entity + Star(Any(),greedy=False) + symptom_disease_keyword,action=QuestionSet.has_symptom_to_disease_question),
-
-]
\ No newline at end of file
+def build_rules():
+    """
+    构造并编译规则集合
+    :return: Rule列表
+    """
+    return [
+        Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + zhengzhuang_keyword + Star(Any(),greedy=False),action=QuestionSet.has_zhengzhuang_question),
+        Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + bingfazheng_keyword + Star(Any(),greedy=False),action=QuestionSet.has_bingfazheng_question),
+        Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + yufang_keyword + Star(Any(),greedy=False),action=QuestionSet.has_yufang_question),
+        Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False) + gaishu_keyword + Star(Any(),greedy=False),action=QuestionSet.has_gaishu_question),
+        Rule(condition_num=2,condition=disease_entity + Star(Any(), greedy=False) +zhiliao_keyword,action=QuestionSet.has_zhiiao_question),
+        Rule(condition_num=2,condition=Star(Any(),greedy=False) + yufang_keyword + disease_entity,action=QuestionSet.has_yufang_question),
+        Rule(condition_num=2,condition=Star(Any(),greedy=False) + zhiliao_keyword + disease_entity,action=QuestionSet.has_zhiiao_question),
+
+        Rule(condition_num=2,condition=drug_entity + Star(Any(),greedy=False) + gnzhzh_keyword +  Star(Any(),greedy=False) ,action=QuestionSet.has_gnzhzh_question),
+        Rule(condition_num=2,condition=drug_entity + Star(Any(),greedy=False) + pzwh_keyword + Star(Any(),greedy=False),action=QuestionSet.has_pzwh_question),
+
+        Rule(condition_num=2,condition=symptom_entity + Star(Any(),greedy=False) + gaishu_keyword + Star(Any(),greedy=False),action=QuestionSet.has_sympotm_gaishu_question),
+        Rule(condition_num=2,condition=symptom_entity + Star(Any(),greedy=False) + yufang_keyword + Star(Any(),greedy=False),action=QuestionSet.has_sympotm_yufang_question),
+        Rule(condition_num=2,condition=Star(Any(),greedy=False) + yufang_keyword + symptom_entity,action=QuestionSet.has_sympotm_yufang_question),
+
+        Rule(condition_num=2,condition=disease_entity + Star(Any(),greedy=False)  + disease_drug_keyword + (Star(Any(),greedy=False)|disease_entity),action=QuestionSet.has_disease_to_drug_question),
+        Rule(condition_num=2,condition=Star(Any(),greedy=False) + disease_drug_keyword + Star(Any(),greedy=False) + disease_entity,action=QuestionSet.has_disease_to_drug_question),
+        Rule(condition_num=2,condition=symptom_entity + Star(Any(),greedy=False) + symptom_disease_keyword,action=QuestionSet.has_symptom_to_disease_question),
+
+]
+
+
+def save_rules(path, rules=None):
+    """
+    把规则（编译好的条件和对应的QuestionSet方法名）保存为JSON文件，
+    进程启动时用load_rules读入，不必重新构造、编译规则
+    :param path: 规则文件路径
+    :param rules: 默认为本模块的规则集合
+    :return:
+    """
+    if rules is None:
+        rules = get_rules()
+    data = {
+        "actions": [rule.action.__name__ for rule in rules],
+        "patterns": serialize.to_dict([rule.program for rule in rules]),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def load_rules(path):
+    """
+    读入save_rules保存的规则文件
+    :param path: 规则文件路径
+    :return: Rule列表
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    programs = serialize.from_dict(data["patterns"])
+    return [Rule(condition_num=2, program=program,
+                 action=getattr(QuestionSet, action))
+            for action, program in zip(data["actions"], programs)]
+
+
+_rules = None
+
+
+def get_rules(path=None):
+    """
+    返回规则集合：给出path时从规则文件读入，否则在第一次调用时构造
+    :param path: save_rules保存的规则文件路径
+    :return: Rule列表
+    """
+    global _rules
+    if path is not None:
+        return load_rules(path)
+    if _rules is None:
+        _rules = build_rules()
+    return _rules
@@ -0,0 +1,160 @@
+# encoding=utf-8
+
+"""
+@desc: jieba外部词典的二进制缓存。
+jieba.load_userdict逐行解析约10万行词典，并为没有词频的词调用suggest_freq，每次启动要花几秒；
+这里把加载词典对jieba词典的改动（FREQ、total、词性表、强制切分的词）用marshal保存下来，
+之后启动时直接套用。缓存以词典文件内容的哈希为键，词典文本仍是唯一的数据来源，修改后自动重建。
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import platform
+import sys
+import tempfile
+
+import jieba
+from jieba import finalseg
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式变化时加1，旧缓存自动失效
+CACHE_VERSION = 2
+
+
+def cache_key(dict_paths, tokenizer=None):
+    """
+    词典文件内容（按顺序）、jieba版本和Python版本的哈希。
+    marshal的格式随Python版本变化，一个版本的Python写的缓存不会被另一个版本读到。
+    给出tokenizer时还包括它的主词典和词频总和，缓存只会套用到与生成时相同的jieba词典上
+    :param dict_paths: 外部词典路径列表
+    :param tokenizer: jieba.Tokenizer，缓存的内容与jieba词典无关时（如gazetteer）不给出
+    :return: 十六进制字符串
+    """
+    h = hashlib.sha1()
+    h.update("{0}|{1}|{2}-{3}.{4}|{5}|".format(
+        CACHE_VERSION, jieba.__version__, platform.python_implementation(),
+        sys.version_info[0], sys.version_info[1], marshal.version).encode('utf-8'))
+    if tokenizer is not None:
+        tokenizer.check_initialized()
+        h.update("{0!r}|{1}|".format(tokenizer.dictionary, tokenizer.total).encode('utf-8'))
+    for p in dict_paths:
+        with open(p, 'rb') as f:
+            h.update(hashlib.sha1(f.read()).digest())
+    return h.hexdigest()
+
+
+def cache_file(dict_paths, cache_dir=None, tokenizer=None, name="userdict"):
+    """
+    :param tokenizer: 见cache_key
+    :param name: 缓存的内容，同一组词典可以有多个缓存（如gazetteer）
+    :return: 缓存文件路径，默认在系统临时目录下（与jieba.cache相同）
+    """
+    if cache_dir is None:
+        cache_dir = tempfile.gettempdir()
+    key = cache_key(dict_paths, tokenizer)
+    return os.path.join(cache_dir, "kgqa.{0}.{1}.cache".format(name, key[:20]))
+
+
+def read_cache(path):
+    """
+    :return: marshal保存的内容，没有缓存或缓存不完整、格式不对时为None
+    """
+    try:
+        with open(path, 'rb') as f:
+            # 一次读入再解析，marshal.load直接读文件要慢得多
+            data = marshal.loads(f.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+        return data
+    return None
+
+
+def write_cache(path, data):
+    """
+    用marshal保存data（带version的dict）。先写临时文件再改名，其他进程不会读到写了一半的缓存。
+    缓存目录不存在时创建；不能写缓存时记录警告（下次启动仍要加载词典），不影响本次加载
+    """
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(tmp, path)
+    except (IOError, OSError) as e:
+        logger.warning('不能写词典缓存%s: %s', path, e)
+
+
+def build(dict_paths, tokenizer=None):
+    """
+    用jieba.load_userdict加载词典，返回加载对jieba词典的改动
+    :param dict_paths: 外部词典路径列表
+    :param tokenizer: jieba.Tokenizer，默认为jieba.dt
+    :return: 可以用marshal保存、用apply套用的dict
+    """
+    if tokenizer is None:
+        tokenizer = jieba.dt
+    tokenizer.check_initialized()
+    freq = dict(tokenizer.FREQ)
+    total = tokenizer.total
+    tags = dict(tokenizer.user_word_tag_tab)
+    force_split = set(finalseg.Force_Split_Words)
+    for p in dict_paths:
+        tokenizer.load_userdict(p)
+    changed = [(w, f) for w, f in tokenizer.FREQ.items() if freq.get(w) != f]
+    return {
+        "version": CACHE_VERSION,
+        "base_total": total,
+        "words": [w for w, _ in changed],
+        "freqs": [f for _, f in changed],
+        "total": tokenizer.total - total,
+        "tags": dict((w, t) for w, t in tokenizer.user_word_tag_tab.items()
+                     if tags.get(w) != t),
+        "force_split": sorted(finalseg.Force_Split_Words - force_split),
+    }
+
+
+def apply(changes, tokenizer=None):
+    """
+    把build返回的改动套用到jieba词典上。改动（包括total的增量）是相对于生成缓存时的jieba词典算出来的，
+    只有tokenizer与它相同（词频总和相同）时，效果才与load_userdict相同，否则抛出ValueError
+    :param changes: build的返回值
+    :param tokenizer: jieba.Tokenizer，默认为jieba.dt
+    :return:
+    """
+    if tokenizer is None:
+        tokenizer = jieba.dt
+    tokenizer.check_initialized()
+    if tokenizer.total != changes["base_total"]:
+        raise ValueError('jieba词典已被改动过，不能套用词典缓存')
+    tokenizer.FREQ.update(zip(changes["words"], changes["freqs"]))
+    tokenizer.total += changes["total"]
+    tokenizer.user_word_tag_tab.update(changes["tags"])
+    for word in changes["force_split"]:
+        finalseg.add_force_split(word)
+
+
+def load_userdicts(dict_paths, cache_dir=None, tokenizer=None):
+    """
+    加载外部词典：有对应的缓存时直接套用，否则加载词典并写入缓存。
+    缓存以加载前的jieba词典区分（见cache_key），tokenizer已被改动过时（如同一个jieba.dt上构造第二个Tagger）
+    用的是另一个缓存
+    :param dict_paths: 外部词典路径列表
+    :param cache_dir: 缓存目录，默认为系统临时目录
+    :param tokenizer: jieba.Tokenizer，默认为jieba.dt
+    :return: 是否用了缓存
+    """
+    if tokenizer is None:
+        tokenizer = jieba.dt
+    path = cache_file(dict_paths, cache_dir, tokenizer)
+    changes = read_cache(path)
+    if changes is not None and changes["base_total"] == tokenizer.total:
+        apply(changes, tokenizer)
+        return True
+    changes = build(dict_paths, tokenizer)
+    write_cache(path, changes)
+    return False
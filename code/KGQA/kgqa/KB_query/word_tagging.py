@@ -4,30 +4,193 @@
 @desc: 定义Word类的结构；定义Tagger类，实现自然语言转为Word对象的方法。
 """
 
+import sys
+import threading
+
 import jieba
 import jieba.posseg as pseg
+
+from kgqa.KB_query import userdict_cache
+from kgqa.KB_query.gazetteer import Gazetteer
+
+
+# jieba的词性（词典、HMM标注和非汉字的eng/m/x）和词典实体的词性（药品nd、疾病nj、症状nz）
+STANDARD_POS = (
+    'a ad ag an b bg c d df dg e eng f g h i in j jn k l ln m mg mq n nd ng nj nr nrfg nrt '
+    'ns nt nz o p q qe qg r rg rr rz s t tg u ud ug uj ul uv uz v vd vg vi vn vq x y yg z zg'
+).split()
+
+# 词性与小整数编码。STANDARD_POS的编码是固定的，在各个进程中都相同，
+# 规则中的词性条件可以按编码保存（见question_drug_template.W）；出现其他词性时再分配新的编码
+POS_NAMES = list(STANDARD_POS)
+POS_CODES = dict((pos, code) for code, pos in enumerate(POS_NAMES))
+_pos_lock = threading.Lock()
+
+
+def pos_code(pos):
+    """
+    :param pos: 词性，如'nd'
+    :return: 词性的编码
+    """
+    code = POS_CODES.get(pos)
+    if code is None:
+        with _pos_lock:
+            code = POS_CODES.get(pos)
+            if code is None:
+                code = POS_CODES[pos] = len(POS_NAMES)
+                POS_NAMES.append(pos)
+    return code
+
+
+def standard_pos_code(pos):
+    """
+    :param pos: 词性
+    :return: STANDARD_POS中词性的编码，其他词性为None
+    """
+    code = POS_CODES.get(pos)
+    return code if code is not None and code < len(STANDARD_POS) else None
+
+
 class Word(object):
-    def __init__(self, token, pos):
-        self.token = token
-        self.pos = pos
+    """
+    词语：text为词语（驻留的str），pos_code为词性编码，entity为词典实体的编号（不是实体时为None）。
+    token（utf-8 bytes）只为兼容旧代码保留，规则和SPARQL模板都直接用text
+    """
+    __slots__ = ('text', 'pos_code', 'entity')
+
+    def __init__(self, text, pos, entity=None):
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        self.text = sys.intern(text)
+        self.pos_code = pos_code(pos)
+        self.entity = entity
+
+    @property
+    def pos(self):
+        return POS_NAMES[self.pos_code]
+
+    @property
+    def token(self):
+        return self.text.encode('utf-8')
+
+    def __repr__(self):
+        return 'Word({0!r}, {1!r})'.format(self.text, self.pos)
+
+
 class Tagger:
-    def __init__(self, dict_paths):
-        # TODO 加载外部词典
-        for p in dict_paths:
-            jieba.load_userdict(p)
+    def __init__(self, dict_paths, cache_dir=None, use_cache=True, use_gazetteer=True,
+                 tokenizer=None):
+        """
+        :param dict_paths: 外部词典路径列表
+        :param cache_dir: 词典缓存目录，默认为系统临时目录
+        :param use_cache: 为False时每次都用jieba.load_userdict加载词典
+        :param use_gazetteer: 为True时先用实体词典识别器找出实体，只对实体之间的部分分词、标注词性
+        :param tokenizer: 新的jieba.Tokenizer（见dict_manager），默认用全局的jieba.dt
+        """
+        if tokenizer is None:
+            self.tokenizer = jieba.dt
+            self.pos_tokenizer = pseg.dt
+        else:
+            self.tokenizer = tokenizer
+            self.pos_tokenizer = pseg.POSTokenizer(tokenizer)
+        # 加载外部词典，词典内容没变时直接用上次生成的二进制缓存
+        if use_cache:
+            userdict_cache.load_userdicts(dict_paths, cache_dir, self.tokenizer)
+        else:
+            for p in dict_paths:
+                self.tokenizer.load_userdict(p)
+        self.gazetteer = None
+        if use_gazetteer:
+            if use_cache:
+                self.gazetteer = Gazetteer.load(dict_paths, cache_dir)
+            else:
+                self.gazetteer = Gazetteer.from_files(dict_paths)
 
         # TODO jieba不能正确切分的词语，我们人工调整其频率。
-        jieba.suggest_freq(('特征','症状','症候'),True)
+        self.tokenizer.suggest_freq(('特征','症状','症候'),True)
+
+    def copy(self):
+        """
+        复制一份：jieba词典（词频、词性表）和实体词典识别器都是副本，
+        在副本上增删词语，正在用这个Tagger的问题不受影响（见dict_manager）
+        :return: Tagger
+        """
+        self.tokenizer.check_initialized()
+        tokenizer = jieba.Tokenizer(self.tokenizer.dictionary)
+        tokenizer.FREQ = dict(self.tokenizer.FREQ)
+        tokenizer.total = self.tokenizer.total
+        tokenizer.initialized = True
+        # 不用pseg.POSTokenizer(tokenizer)构造，它要重新读一遍jieba主词典的词性。
+        # 第一次分词时jieba才把新词的词性并入word_tag_tab，这里先读新词再读word_tag_tab，不会漏掉
+        user_word_tag_tab = dict(self.tokenizer.user_word_tag_tab)
+        pos_tokenizer = pseg.POSTokenizer.__new__(pseg.POSTokenizer)
+        pos_tokenizer.tokenizer = tokenizer
+        pos_tokenizer.word_tag_tab = dict(self.pos_tokenizer.word_tag_tab)
+        pos_tokenizer.word_tag_tab.update(user_word_tag_tab)
+
+        tagger = self.__class__.__new__(self.__class__)
+        tagger.tokenizer = tokenizer
+        tagger.pos_tokenizer = pos_tokenizer
+        tagger.gazetteer = None if self.gazetteer is None else self.gazetteer.copy()
+        return tagger
+
+    def add_word(self, word, tag, freq=None):
+        """
+        增加一个实体（或改词性），不必重新加载词典。
+        直接修改这个Tagger，正在使用的Tagger应先复制（见copy）
+        :param word: 词语
+        :param tag: 词性，如'nz'
+        :param freq: 词频，默认为jieba能切分出这个词的词频
+        :return:
+        """
+        self.tokenizer.add_word(word, freq, tag)
+        if self.gazetteer is not None:
+            self.gazetteer.add_word(word, tag)
+
+    def del_word(self, word):
+        """
+        删除一个实体，与add_word一样直接修改这个Tagger
+        :param word: 词语
+        :return:
+        """
+        self.tokenizer.del_word(word)
+        if self.gazetteer is not None:
+            self.gazetteer.del_word(word)
+
+    def iter_word_objects(self, sentence):
+        """
+        逐个产生Word对象，可以边分词边用refo.StreamMatcher匹配。
+        词典中的实体（最左最长匹配）直接作为一个词，词性为词典中的词性；其余部分用jieba分词、标注词性
+        :param sentence:
+        :return:
+        """
+        gazetteer = self.gazetteer
+        cut = self.pos_tokenizer.cut
+        if gazetteer is None:
+            spans = []
+        else:
+            if isinstance(sentence, bytes):
+                sentence = sentence.decode('utf-8')
+            spans = gazetteer.find(sentence)
+        i = 0
+        for start, end, tag, entity in spans:
+            if i < start:
+                for word, flag in cut(sentence[i:start]):
+                    yield Word(word, flag)
+            yield Word(sentence[start:end], tag, entity)
+            i = end
+        if not spans or i < len(sentence):
+            for word, flag in cut(sentence[i:]):
+                yield Word(word, flag)
 
-    @staticmethod
-    def get_word_objects(sentence):
+    def get_word_objects(self, sentence):
         # type: (str) -> list
         """
         把自然语言转为Word对象
         :param sentence:
         :return:
         """
-        return [Word(word.encode('utf-8'), tag) for word, tag in pseg.cut(sentence)]
+        return list(self.iter_word_objects(sentence))
 
 # TODO 用于测试
 if __name__ == '__main__':
@@ -35,4 +198,4 @@ if __name__ == '__main__':
     #while True:
     s = '喉插管损伤需要什么药治疗？'
     for i in tagger.get_word_objects(s):
-        print(i.token.decode('utf-8'), i.pos)
+        print(i.text, i.pos)
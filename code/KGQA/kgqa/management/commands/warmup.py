@@ -0,0 +1,29 @@
+# encoding=utf-8
+
+"""
+@desc: 预热问答流水线：加载词典（生成词典缓存）、编译规则、连接Fuseki。
+python manage.py warmup --save-rules rules.json 还会保存编译好的规则，设置KGQA_RULES_PATH后启动时直接读入。
+"""
+
+from django.core.management.base import BaseCommand
+
+from kgqa.pipeline import pipeline
+
+
+class Command(BaseCommand):
+    help = '预热问答流水线：加载词典、编译规则、连接Fuseki'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--save-rules', metavar='PATH',
+                            help='把编译好的规则保存到PATH')
+
+    def handle(self, *args, **options):
+        timings = pipeline.warm_up()
+        for step, seconds in sorted(timings.items()):
+            self.stdout.write('{0}: {1:.3f}s'.format(step, seconds))
+        if not pipeline.fuseki_reachable:
+            self.stderr.write('Fuseki不能连接: {0}'.format(pipeline.fuseki.sparql_conn.endpoint))
+        if options['save_rules']:
+            from kgqa.KB_query import question_drug_template
+            question_drug_template.save_rules(options['save_rules'], pipeline.q2s.rules)
+            self.stdout.write('规则已保存到{0}'.format(options['save_rules']))
@@ -0,0 +1,123 @@
+# encoding=utf-8
+
+"""
+@desc: 问答流水线（Fuseki连接、自然语言转SPARQL模块）的惰性注册表。
+导入时不做任何加载，第一次使用时才按settings中的配置构造；
+warm_up在接受请求之前预先加载词典、编译规则、连接Fuseki，ready表示预热是否完成。
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+# 预热时跑一遍的问题，让jieba、规则匹配的惰性初始化都在接受请求之前完成
+WARM_UP_QUESTION = '糖尿病有什么症状？'
+
+
+class Pipeline(object):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._fuseki = None
+        self._q2s = None
+        self.ready = False
+        self.warming_up = False
+        # 预热各步骤耗时（秒）和错误信息
+        self.timings = {}
+        self.error = None
+        self.fuseki_reachable = None
+
+    @property
+    def fuseki(self):
+        """
+        JenaFuseki，连接settings.KGQA_FUSEKI_ENDPOINT
+        """
+        if self._fuseki is None:
+            with self.lock:
+                if self._fuseki is None:
+                    from kgqa.KB_query import jena_sparql_endpoint
+                    self._fuseki = jena_sparql_endpoint.JenaFuseki(
+                        settings.KGQA_FUSEKI_ENDPOINT)
+        return self._fuseki
+
+    @property
+    def q2s(self):
+        """
+        Question2Sparql，使用settings.KGQA_DICT_PATHS中的词典、settings.KGQA_RULES_PATH中的规则
+        """
+        if self._q2s is None:
+            with self.lock:
+                if self._q2s is None:
+                    from kgqa.KB_query import question2sparql
+                    self._q2s = question2sparql.Question2Sparql(
+                        settings.KGQA_DICT_PATHS,
+                        rules_path=settings.KGQA_RULES_PATH,
+                        cache_dir=settings.KGQA_DICT_CACHE_DIR,
+                        cache_size=settings.KGQA_QUESTION_CACHE_SIZE)
+                    if settings.KGQA_DICT_WATCH_INTERVAL > 0:
+                        self._q2s.dictionaries.watch(settings.KGQA_DICT_WATCH_INTERVAL)
+        return self._q2s
+
+    def warm_up(self):
+        """
+        加载词典、编译规则、连接Fuseki，完成后ready为True。
+        Fuseki连不上不影响ready（查询时再报错），结果记在fuseki_reachable中
+        :return: 各步骤耗时
+        """
+        with self.lock:
+            if self.ready:
+                return self.timings
+            self.warming_up = True
+            try:
+                start = time.time()
+                q2s = self.q2s
+                self.timings['q2s'] = time.time() - start
+
+                start = time.time()
+                q2s.get_sparql(WARM_UP_QUESTION.encode('utf-8'))
+                self.timings['first_question'] = time.time() - start
+
+                start = time.time()
+                self.fuseki_reachable = self.fuseki.ping()
+                self.timings['fuseki'] = time.time() - start
+                self.ready = True
+            except Exception as e:
+                self.error = repr(e)
+                raise
+            finally:
+                self.warming_up = False
+        return self.timings
+
+    def warm_up_in_background(self):
+        """
+        在后台线程中预热，立即返回
+        :return: 线程
+        """
+        thread = threading.Thread(target=self._warm_up_quietly,
+                                  name='kgqa-warm-up')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _warm_up_quietly(self):
+        try:
+            self.warm_up()
+        except Exception:
+            pass  # 错误记在self.error中，由就绪接口报告
+
+    def status(self):
+        """
+        就绪接口返回的内容
+        """
+        return {
+            'ready': self.ready,
+            'warming_up': self.warming_up,
+            'timings': dict(self.timings),
+            'fuseki_reachable': self.fuseki_reachable,
+            'error': self.error,
+            'question_cache': self._q2s.cache.stats() if self._q2s is not None else None,
+            'dictionaries': self._q2s.dictionaries.status() if self._q2s is not None else None,
+        }
+
+
+pipeline = Pipeline()
@@ -0,0 +1,56 @@
+# encoding=utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from kgqa.KB_query import batch
+
+QUESTIONS = [
+    u'糖尿病有什么症状',
+    u'今天天气不错',
+    u'坎离砂有什么用',
+    u'糖尿病的并发症',
+    u'怎么预防糖尿病',
+    u'头晕眼花概述',
+    u'糖尿病用什么药治疗',
+]
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dict_path = os.path.join(self.tmp, 'dict.txt')
+        with open(self.dict_path, 'w', encoding='utf-8') as f:
+            f.write(u'糖尿病 nj\n坎离砂 nd\n头晕眼花 nz\n')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_results_in_input_order(self):
+        questions = [u'{0}{1}'.format(q, u'？' * i) for i in range(5) for q in QUESTIONS]
+        results = list(batch.parse_questions(iter(questions), [self.dict_path],
+                                             cache_dir=self.cache_dir, workers=2, chunksize=3))
+        self.assertEqual([r['question'] for r in results], questions)
+
+        intents = dict((r['question'], r['intent']) for r in results)
+        self.assertEqual(intents[u'糖尿病有什么症状'], 'has_zhengzhuang_question')
+        self.assertEqual(intents[u'坎离砂有什么用？？'], 'has_gnzhzh_question')
+        self.assertIsNone(intents[u'今天天气不错'])
+        entities = dict((r['question'], r['entities']) for r in results)
+        self.assertEqual(entities[u'头晕眼花概述？'], [[u'头晕眼花', 'nz']])
+
+    def test_main(self):
+        input_path = os.path.join(self.tmp, 'questions.txt')
+        output_path = os.path.join(self.tmp, 'parsed.jsonl')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.write(u'\n'.join(QUESTIONS) + u'\n\n')
+        self.assertEqual(batch.main([input_path, '-o', output_path, '--dict', self.dict_path,
+                                     '--cache-dir', self.cache_dir, '--workers', '2',
+                                     '--chunksize', '2']), 0)
+        with open(output_path, encoding='utf-8') as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual([r['question'] for r in results], QUESTIONS)
@@ -0,0 +1,78 @@
+# encoding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from kgqa.KB_query.dict_manager import DictionaryManager
+
+
+def entities(tagger, sentence):
+    return [(w.text, w.pos) for w in tagger.get_word_objects(sentence) if w.entity is not None]
+
+
+class DictionaryManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dict_path = os.path.join(self.tmp, 'dict.txt')
+        with open(self.dict_path, 'w', encoding='utf-8') as f:
+            f.write(u'糖尿病 nj\n坎离砂 nd\n')
+        self.manager = DictionaryManager([self.dict_path], os.path.join(self.tmp, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_add_word_swaps_generation(self):
+        generation, old = self.manager.current
+        self.manager.add_word(u'新药颗粒', 'nd')
+        new_generation, new = self.manager.current
+
+        self.assertEqual(new_generation, generation + 1)
+        self.assertIsNot(new, old)
+        sentence = u'新药颗粒有什么用'
+        self.assertEqual(entities(new, sentence), [(u'新药颗粒', 'nd')])
+        # 正在用旧的一代的问题不受影响
+        self.assertEqual(entities(old, sentence), [])
+        self.assertNotIn(u'新药颗粒', old.tokenizer.FREQ)
+        self.assertEqual(self.manager.status()['entities'], 3)
+
+    def test_del_word_swaps_generation(self):
+        generation, old = self.manager.current
+        self.manager.del_word(u'坎离砂')
+        new_generation, new = self.manager.current
+
+        self.assertEqual(new_generation, generation + 1)
+        self.assertEqual(entities(new, u'坎离砂有什么用'), [])
+        self.assertEqual(entities(old, u'坎离砂有什么用'), [(u'坎离砂', 'nd')])
+
+    def test_edits_survive_reload(self):
+        self.manager.add_word(u'新药颗粒', 'nd')
+        self.manager.del_word(u'坎离砂')
+        with open(self.dict_path, 'a', encoding='utf-8') as f:
+            f.write(u'头晕眼花 nz\n')
+        self.assertTrue(self.manager.changed())
+
+        self.manager.reload()
+        self.assertFalse(self.manager.changed())
+        generation, tagger = self.manager.current
+        self.assertEqual(generation, 3)
+        self.assertEqual(entities(tagger, u'坎离砂、新药颗粒能治头晕眼花吗'),
+                         [(u'新药颗粒', 'nd'), (u'头晕眼花', 'nz')])
+        self.assertEqual(self.manager.status()['edits'], 2)
+
+    def test_reload_in_background(self):
+        generation, old = self.manager.current
+        self.manager.reload_in_background().join()
+        status = self.manager.status()
+        self.assertEqual(status['generation'], generation + 1)
+        self.assertFalse(status['reloading'])
+        self.assertIsNone(status['error'])
+        self.assertIsNot(self.manager.tagger, old)
+
+    def test_reload_error_keeps_current(self):
+        generation, old = self.manager.current
+        os.remove(self.dict_path)
+        self.manager.reload_in_background().join()
+        self.assertEqual(self.manager.current, (generation, old))
+        self.assertIn('FileNotFoundError', self.manager.status()['error'])
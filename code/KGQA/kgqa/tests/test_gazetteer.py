@@ -0,0 +1,137 @@
+# encoding=utf-8
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from kgqa.KB_query.gazetteer import Gazetteer
+
+WORDS = [
+    (u'地黄', 'nz'),
+    (u'六味地黄丸', 'nd'),
+    (u'黄丸', 'nz'),
+    (u'头晕', 'nz'),
+    (u'头晕眼花', 'nz'),
+    (u'眼花', 'nz'),
+    (u'杞菊地黄丸（浓缩丸）', 'nd'),
+]
+
+
+def brute_force_matches(words, text):
+    return sorted((i, i + len(w), tag) for w, tag in words.items()
+                  for i in range(len(text)) if text.startswith(w, i))
+
+
+def matches(gazetteer, text):
+    return sorted((start, end, tag) for start, end, tag, _ in gazetteer.iter_matches(text))
+
+
+class GazetteerTest(unittest.TestCase):
+    def test_overlapping_matches(self):
+        gazetteer = Gazetteer(WORDS)
+        self.assertEqual(len(gazetteer), len(WORDS))
+        text = u'六味地黄丸能治头晕眼花吗'
+        self.assertEqual(matches(gazetteer, text), brute_force_matches(dict(WORDS), text))
+
+    def test_leftmost_longest(self):
+        gazetteer = Gazetteer(WORDS)
+        text = u'六味地黄丸能治头晕眼花吗'
+        self.assertEqual([text[start:end] for start, end, _, _ in gazetteer.find(text)],
+                         [u'六味地黄丸', u'头晕眼花'])
+        text = u'杞菊地黄丸（浓缩丸）和地黄丸'
+        self.assertEqual([(text[start:end], tag) for start, end, tag, _ in gazetteer.find(text)],
+                         [(u'杞菊地黄丸（浓缩丸）', 'nd'), (u'地黄', 'nz')])
+
+    def test_same_word_same_entity(self):
+        gazetteer = Gazetteer(WORDS)
+        spans = gazetteer.find(u'头晕眼花，头晕眼花')
+        self.assertEqual(len(spans), 2)
+        self.assertEqual(spans[0][3], spans[1][3])
+
+    def test_random_against_brute_force(self):
+        rng = random.Random(0)
+        alphabet = u'地黄丸头晕眼花'
+        for _ in range(200):
+            words = dict((u''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))),
+                          rng.choice(['nd', 'nz'])) for _ in range(rng.randint(1, 8)))
+            gazetteer = Gazetteer(words.items())
+            text = u''.join(rng.choice(alphabet) for _ in range(20))
+            self.assertEqual(matches(gazetteer, text), brute_force_matches(words, text))
+
+    def test_add_del_word(self):
+        gazetteer = Gazetteer(WORDS)
+        words = dict(WORDS)
+        text = u'六味地黄丸能治头晕眼花吗'
+
+        gazetteer.add_word(u'味地', 'nz')
+        words[u'味地'] = 'nz'
+        self.assertEqual(matches(gazetteer, text), brute_force_matches(words, text))
+
+        gazetteer.add_word(u'地黄', 'nd')
+        words[u'地黄'] = 'nd'
+        self.assertEqual(matches(gazetteer, text), brute_force_matches(words, text))
+        self.assertEqual(len(gazetteer), len(words))
+
+        gazetteer.del_word(u'六味地黄丸')
+        del words[u'六味地黄丸']
+        gazetteer.del_word(u'不存在的词')
+        self.assertEqual(matches(gazetteer, text), brute_force_matches(words, text))
+        self.assertEqual(len(gazetteer), len(words))
+        self.assertEqual([text[start:end] for start, end, _, _ in gazetteer.find(text)],
+                         [u'味地', u'黄丸', u'头晕眼花'])
+
+    def test_incremental_edits_match_rebuild(self):
+        rng = random.Random(1)
+        for _ in range(100):
+            alphabet = u'地黄丸头'[:rng.randint(1, 4)]
+            words = dict((u''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))), 'nd')
+                         for _ in range(rng.randint(0, 6)))
+            gazetteer = Gazetteer(words.items())
+            for _ in range(10):
+                gazetteer = gazetteer.copy()
+                w = u''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 6)))
+                if rng.random() < 0.6:
+                    gazetteer.add_word(w, rng.choice(['nd', 'nz']))
+                else:
+                    gazetteer.del_word(rng.choice(list(words) + [w]))
+                rebuilt = gazetteer.copy()
+                rebuilt._build()
+                self.assertEqual(gazetteer.fail, rebuilt.fail)
+                self.assertEqual(gazetteer.link, rebuilt.link)
+
+    def test_copy_is_independent(self):
+        gazetteer = Gazetteer(WORDS)
+        text = u'六味地黄丸能治头晕眼花吗'
+        before = matches(gazetteer, text)
+        edited = gazetteer.copy()
+        edited.add_word(u'能治', 'nz')
+        edited.del_word(u'眼花')
+        self.assertEqual(matches(gazetteer, text), before)
+        self.assertNotEqual(matches(edited, text), before)
+
+
+class GazetteerFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dict_path = os.path.join(self.tmp, 'dict.txt')
+        with open(self.dict_path, 'w', encoding='utf-8') as f:
+            f.write(u'\ufeff六味地黄丸 nd\n头晕 3 nz\n眼花\n\n头晕眼花 10 nz\n')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_from_files_skips_untagged_words(self):
+        gazetteer = Gazetteer.from_files([self.dict_path])
+        self.assertEqual(len(gazetteer), 3)
+        text = u'六味地黄丸能治头晕眼花吗'
+        self.assertEqual(matches(gazetteer, text), [(0, 5, 'nd'), (7, 9, 'nz'), (7, 11, 'nz')])
+
+    def test_load_uses_cache(self):
+        built = Gazetteer.load([self.dict_path], self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        cached = Gazetteer.load([self.dict_path], self.cache_dir)
+        for attr in ('goto', 'fail', 'word', 'link', 'size'):
+            self.assertEqual(getattr(cached, attr), getattr(built, attr))
@@ -0,0 +1,86 @@
+# encoding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from kgqa import pipeline as pipeline_module
+
+
+class FakeFuseki(object):
+    def __init__(self, reachable=True):
+        self.reachable = reachable
+        self.pings = 0
+
+    def ping(self):
+        self.pings += 1
+        return self.reachable
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        dict_path = os.path.join(self.tmp, 'dict.txt')
+        with open(dict_path, 'w', encoding='utf-8') as f:
+            f.write(u'糖尿病 nd\n头晕眼花 nz\n')
+        settings = SimpleNamespace(
+            KGQA_FUSEKI_ENDPOINT='http://localhost:3030/kgdrug/query',
+            KGQA_DICT_PATHS=[dict_path],
+            KGQA_RULES_PATH=None,
+            KGQA_DICT_CACHE_DIR=os.path.join(self.tmp, 'cache'),
+            KGQA_DICT_WATCH_INTERVAL=0,
+            KGQA_QUESTION_CACHE_SIZE=16)
+        patcher = mock.patch.object(pipeline_module, 'settings', settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_lazy(self):
+        pipeline = pipeline_module.Pipeline()
+        status = pipeline.status()
+        self.assertFalse(status['ready'])
+        self.assertFalse(status['warming_up'])
+        self.assertIsNone(status['question_cache'])
+        self.assertIsNone(status['dictionaries'])
+        self.assertIsNone(pipeline._q2s)
+
+    def test_warm_up(self):
+        pipeline = pipeline_module.Pipeline()
+        pipeline._fuseki = FakeFuseki()
+        timings = pipeline.warm_up()
+
+        self.assertEqual(set(timings), {'q2s', 'first_question', 'fuseki'})
+        status = pipeline.status()
+        self.assertTrue(status['ready'])
+        self.assertFalse(status['warming_up'])
+        self.assertTrue(status['fuseki_reachable'])
+        self.assertIsNone(status['error'])
+        self.assertEqual(status['question_cache']['size'], 1)
+        self.assertEqual(status['dictionaries']['generation'], 0)
+
+        # 再次调用不重复预热
+        self.assertEqual(pipeline.warm_up(), timings)
+        self.assertEqual(pipeline._fuseki.pings, 1)
+
+    def test_unreachable_fuseki_is_still_ready(self):
+        pipeline = pipeline_module.Pipeline()
+        pipeline._fuseki = FakeFuseki(reachable=False)
+        pipeline.warm_up()
+        self.assertTrue(pipeline.ready)
+        self.assertFalse(pipeline.status()['fuseki_reachable'])
+
+    def test_warm_up_error(self):
+        pipeline_module.settings.KGQA_DICT_PATHS = [os.path.join(self.tmp, 'missing.txt')]
+        pipeline = pipeline_module.Pipeline()
+        pipeline._fuseki = FakeFuseki()
+        pipeline.warm_up_in_background().join()
+
+        status = pipeline.status()
+        self.assertFalse(status['ready'])
+        self.assertFalse(status['warming_up'])
+        self.assertIn('FileNotFoundError', status['error'])
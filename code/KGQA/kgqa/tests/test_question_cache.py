@@ -0,0 +1,102 @@
+# encoding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from kgqa.KB_query.question2sparql import Question2Sparql
+from kgqa.KB_query.question_cache import ParsedQuestion, QuestionCache, normalize
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize(u'  糖尿病有什么症状？ '), u'糖尿病有什么症状')
+        self.assertEqual(normalize(u'糖尿病有什么症状?！ ～\u3000'), u'糖尿病有什么症状')
+        self.assertEqual(normalize(u'糖尿病有什么症状'.encode('utf-8')), u'糖尿病有什么症状')
+
+    def test_keeps_what_tagging_depends_on(self):
+        # 全角字符和句号可以是词典中的词的一部分
+        self.assertEqual(normalize(u'维生素Ｃ片（浓缩丸）'), u'维生素Ｃ片（浓缩丸）')
+        self.assertEqual(normalize(u'舌无力且不能随意伸缩回旋。'), u'舌无力且不能随意伸缩回旋。')
+        self.assertEqual(normalize(u'糖尿病　有什么症状'), u'糖尿病　有什么症状')
+
+
+class QuestionCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = QuestionCache(maxsize=2)
+        a, b, c = (ParsedQuestion(None, (), str(i)) for i in range(3))
+        cache.put((0, u'a'), a)
+        cache.put((0, u'b'), b)
+        self.assertIs(cache.get((0, u'a')), a)  # a比b新
+        cache.put((0, u'c'), c)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get((0, u'b')))
+        self.assertIs(cache.get((0, u'a')), a)
+        self.assertIs(cache.get((0, u'c')), c)
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (3, 1, 2))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+    def test_disabled(self):
+        cache = QuestionCache(maxsize=0)
+        cache.put((0, u'a'), ParsedQuestion(None, (), None))
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get((0, u'a')))
+        self.assertIsNone(QuestionCache().stats()['hit_rate'])
+
+
+class ParseCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        dict_path = os.path.join(cls.tmp, 'dict.txt')
+        with open(dict_path, 'w', encoding='utf-8') as f:
+            f.write(u'糖尿病 nj\n杞菊地黄丸（浓缩丸） nd\n山菊降压颗粒（无蔗糖） nd\n')
+        cls.q2s = Question2Sparql([dict_path], cache_dir=os.path.join(cls.tmp, 'cache'),
+                                  cache_size=16)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        self.q2s.cache.clear()
+
+    def test_full_width_entity(self):
+        for question, drug in [(u'山菊降压颗粒（无蔗糖）有什么用', u'山菊降压颗粒（无蔗糖）'),
+                               (u'杞菊地黄丸（浓缩丸）有什么用？', u'杞菊地黄丸（浓缩丸）')]:
+            parsed = self.q2s.parse(question)
+            self.assertEqual(parsed.entities, ((drug, 'nd'),))
+            self.assertEqual(parsed.intent, 'has_gnzhzh_question')
+            self.assertIn(u"'{0}'".format(drug), parsed.sparql)
+
+    def test_width_variants_parse_separately(self):
+        # 先问半角括号的问题，不能让全角括号的问题命中它的（没有匹配上的）结果
+        half = self.q2s.parse(u'杞菊地黄丸(浓缩丸)有什么用')
+        self.assertEqual(half, ParsedQuestion(None, (), None))
+        full = self.q2s.parse(u'杞菊地黄丸（浓缩丸）有什么用')
+        self.assertEqual(full.intent, 'has_gnzhzh_question')
+        self.assertEqual(full.entities, ((u'杞菊地黄丸（浓缩丸）', 'nd'),))
+        self.assertEqual(len(self.q2s.cache), 2)
+
+    def test_variants_share_an_entry(self):
+        parsed = self.q2s.parse(u'糖尿病有什么症状')
+        self.assertEqual(parsed.intent, 'has_zhengzhuang_question')
+        self.assertIs(self.q2s.parse(u' 糖尿病有什么症状？'.encode('utf-8')), parsed)
+        self.assertIs(self.q2s.parse(u'糖尿病有什么症状?'), parsed)
+        self.assertEqual(self.q2s.cache.stats()['hits'], 2)
+
+    def test_unmatched_question_is_cached(self):
+        parsed = self.q2s.parse(u'今天天气不错')
+        self.assertEqual(parsed, ParsedQuestion(None, (), None))
+        self.assertIs(self.q2s.parse(u'今天天气不错！'), parsed)
+        self.assertEqual(len(self.q2s.cache), 1)
+
+    def test_new_generation_misses(self):
+        parsed = self.q2s.parse(u'糖尿病有什么症状')
+        generation, tagger = self.q2s.dictionaries.current
+        self.q2s.dictionaries.current = (generation + 1, tagger)
+        self.assertIsNot(self.q2s.parse(u'糖尿病有什么症状'), parsed)
+        self.assertEqual(self.q2s.cache.stats()['misses'], 2)
@@ -0,0 +1,81 @@
+# encoding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import jieba
+
+from kgqa.KB_query import userdict_cache
+
+
+class UserdictCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dict_path = os.path.join(self.tmp, 'dict.txt')
+        with open(self.dict_path, 'w', encoding='utf-8') as f:
+            f.write(u'杞菊地黄丸（浓缩丸） nd\n乌鸡白凤丸 nd\n头晕眼花 nz\n')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        loaded = jieba.Tokenizer()
+        self.assertFalse(userdict_cache.load_userdicts([self.dict_path], self.cache_dir, loaded))
+        cached = jieba.Tokenizer()
+        self.assertTrue(userdict_cache.load_userdicts([self.dict_path], self.cache_dir, cached))
+
+        self.assertEqual(cached.total, loaded.total)
+        self.assertEqual(cached.FREQ, loaded.FREQ)
+        self.assertEqual(cached.user_word_tag_tab, loaded.user_word_tag_tab)
+        self.assertEqual(cached.user_word_tag_tab[u'乌鸡白凤丸'], 'nd')
+        self.assertEqual(list(cached.cut(u'乌鸡白凤丸能治头晕眼花吗')),
+                         list(loaded.cut(u'乌鸡白凤丸能治头晕眼花吗')))
+
+    def test_dictionary_change_invalidates_cache(self):
+        userdict_cache.load_userdicts([self.dict_path], self.cache_dir, jieba.Tokenizer())
+        with open(self.dict_path, 'a', encoding='utf-8') as f:
+            f.write(u'六味地黄丸 nd\n')
+        tokenizer = jieba.Tokenizer()
+        self.assertFalse(userdict_cache.load_userdicts([self.dict_path], self.cache_dir, tokenizer))
+        self.assertEqual(tokenizer.user_word_tag_tab[u'六味地黄丸'], 'nd')
+
+    def test_modified_tokenizer_uses_its_own_cache(self):
+        userdict_cache.load_userdicts([self.dict_path], self.cache_dir, jieba.Tokenizer())
+        tokenizer = jieba.Tokenizer()
+        tokenizer.add_word(u'六味地黄丸', tag='nd')
+        total = tokenizer.total
+        self.assertFalse(userdict_cache.load_userdicts([self.dict_path], self.cache_dir, tokenizer))
+        self.assertGreater(tokenizer.total, total)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_key_depends_on_python_version(self):
+        key = userdict_cache.cache_key([self.dict_path])
+        with mock.patch.object(userdict_cache.sys, 'version_info', (2, 7, 18)):
+            self.assertNotEqual(userdict_cache.cache_key([self.dict_path]), key)
+        with mock.patch.object(userdict_cache.marshal, 'version', -1):
+            self.assertNotEqual(userdict_cache.cache_key([self.dict_path]), key)
+        self.assertEqual(userdict_cache.cache_key([self.dict_path]), key)
+
+    def test_apply_requires_unmodified_tokenizer(self):
+        changes = userdict_cache.build([self.dict_path], jieba.Tokenizer())
+        tokenizer = jieba.Tokenizer()
+        tokenizer.add_word(u'六味地黄丸', tag='nd')
+        with self.assertRaises(ValueError):
+            userdict_cache.apply(changes, tokenizer)
+
+    def test_write_cache_creates_directory(self):
+        path = os.path.join(self.cache_dir, 'a', 'b', 'test.cache')
+        data = {'version': userdict_cache.CACHE_VERSION, 'words': [u'坎离砂']}
+        userdict_cache.write_cache(path, data)
+        self.assertEqual(userdict_cache.read_cache(path), data)
+
+    def test_write_cache_failure_is_logged(self):
+        # 缓存目录的位置上是一个文件，不能创建目录
+        path = os.path.join(self.dict_path, 'test.cache')
+        with self.assertLogs(userdict_cache.logger, 'WARNING'):
+            userdict_cache.write_cache(path, {'version': userdict_cache.CACHE_VERSION})
+        self.assertIsNone(userdict_cache.read_cache(path))
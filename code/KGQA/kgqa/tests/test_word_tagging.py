@@ -0,0 +1,92 @@
+# encoding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from refo import MultiPattern, finditer
+
+from kgqa.KB_query import question_drug_template
+from kgqa.KB_query import word_tagging
+from kgqa.KB_query.question_drug_template import W, word_pos, word_pos_code
+from kgqa.KB_query.word_tagging import Word
+
+
+class WordTest(unittest.TestCase):
+    def test_pos_code(self):
+        word = Word(u'糖尿病'.encode('utf-8'), 'nj', entity=3)
+        self.assertEqual(word.text, u'糖尿病')
+        self.assertEqual(word.token, u'糖尿病'.encode('utf-8'))
+        self.assertEqual(word.pos, 'nj')
+        self.assertEqual(word.pos_code, word_tagging.pos_code('nj'))
+        self.assertEqual(word.entity, 3)
+        self.assertIs(word.text, Word(u'糖尿' + u'病', 'nj').text)
+
+    def test_standard_codes_are_fixed(self):
+        for code, pos in enumerate(word_tagging.STANDARD_POS):
+            self.assertEqual(word_tagging.pos_code(pos), code)
+            self.assertEqual(word_tagging.standard_pos_code(pos), code)
+
+    def test_new_pos(self):
+        code = word_tagging.pos_code('kgqa_test')
+        self.assertGreaterEqual(code, len(word_tagging.STANDARD_POS))
+        self.assertEqual(word_tagging.pos_code('kgqa_test'), code)
+        self.assertEqual(Word(u'词', 'kgqa_test').pos, 'kgqa_test')
+        self.assertIsNone(word_tagging.standard_pos_code('kgqa_test'))
+
+
+class WTest(unittest.TestCase):
+    def test_literal_pos_uses_code(self):
+        w = W(pos='nd')
+        self.assertEqual(w.literal, (word_pos_code, word_tagging.pos_code('nd')))
+        self.assertTrue(w.match(Word(u'坎离砂', 'nd')))
+        self.assertFalse(w.match(Word(u'糖尿病', 'nj')))
+
+    def test_regex_and_unknown_pos(self):
+        w = W(pos='n.*')
+        self.assertIsNone(w.pos_code)
+        self.assertTrue(w.match(Word(u'糖尿病', 'nj')))
+        self.assertFalse(w.match(Word(u'有', 'v')))
+        w = W(pos='kgqa_other')
+        self.assertEqual(w.literal, (word_pos, 'kgqa_other'))
+        self.assertTrue(w.match(Word(u'词', 'kgqa_other')))
+
+    def test_token_and_pos(self):
+        w = W(u'用', 'v')
+        self.assertIsNone(w.literal)
+        self.assertTrue(w.match(Word(u'用', 'v')))
+        self.assertFalse(w.match(Word(u'用', 'n')))
+        self.assertFalse(w.match(Word(u'药', 'v')))
+
+
+class RulesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_saved_rules_match_the_same(self):
+        words = [Word(u'糖尿病', 'nj', entity=1), Word(u'有', 'v'), Word(u'什么', 'r'),
+                 Word(u'症状', 'n')]
+        rules = question_drug_template.get_rules()
+        path = os.path.join(self.tmp, 'rules.json')
+        question_drug_template.save_rules(path, rules)
+        loaded = question_drug_template.load_rules(path)
+
+        for rule, rule2 in zip(rules, loaded):
+            self.assertEqual([m.span() for m in finditer(rule.program, words)],
+                             [m.span() for m in finditer(rule2.program, words)])
+        self.assertIn(u'糖尿病', rules[0].apply(words)[0])
+        self.assertIn(u'糖尿病', loaded[0].apply(words)[0])
+
+    def test_apply_match_same_as_apply(self):
+        words = [Word(u'糖尿病', 'nj', entity=1), Word(u'有', 'v'), Word(u'什么', 'r'),
+                 Word(u'症状', 'n'), Word(u'，', 'x'), Word(u'高血压', 'nj', entity=2),
+                 Word(u'症状', 'n')]
+        rules = question_drug_template.get_rules()
+        matches = MultiPattern([rule.condition for rule in rules]).search(words)
+        self.assertIn(0, matches)
+        for index, match in matches.items():
+            self.assertEqual(rules[index].apply_match(words, match), rules[index].apply(words))
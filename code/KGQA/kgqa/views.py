@@ -1,6 +1,9 @@
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_POST
 import sys
 from kgqa.KB_query import query_main
+from kgqa.pipeline import pipeline
 
 # Create your views here.
 
@@ -11,3 +14,24 @@ def search_post(request):
         ctx['result'] = query_main.query_function(question)
         print(ctx['result'])
     return render(request, "post.html", ctx)
+
+
+def ready(request):
+    """
+    就绪接口：预热完成时返回200，否则返回503，内容为各步骤耗时、Fuseki能否连接等
+    """
+    status = pipeline.status()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
+@require_POST
+def reload_dictionaries(request):
+    """
+    管理员触发重新加载词典：立即返回202，新的一代在后台构造好后替换。
+    只对处理这个请求的进程有效，要让所有进程都更新请修改词典文件（见settings.KGQA_DICT_WATCH_INTERVAL）
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    dictionaries = pipeline.q2s.dictionaries
+    dictionaries.reload_in_background()
+    return JsonResponse(dictionaries.status(), status=202)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+"""
+Benchmarks for the refo engines.
+
+Runs every pattern shape over synthetic sequences of words and measures
+compile time, load time of the compiled patterns saved with
+`refo.serialize`, `match`/`search`/`finditer` throughput (objects per
+second) and peak memory of `finditer`, for each engine. Results are written as
+JSON:
+
+    python benchmarks/bench_refo.py --output results.json
+
+To check a build against a stored baseline (exits with status 1 if any
+benchmark got slower than the tolerance allows):
+
+    python benchmarks/bench_refo.py --compare baseline.json --tolerance 0.2
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+import tracemalloc
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+
+import refo  # noqa: E402
+from refo import Predicate, Star, Plus, Question, Any, Group  # noqa: E402
+from refo import serialize  # noqa: E402
+
+
+class Word(object):
+    def __init__(self, token, pos):
+        self.token = token
+        self.pos = pos
+
+
+class W(Predicate):
+    """
+    Same as the `W` predicate of `examples/words.py`.
+    """
+    def __init__(self, token=".*", pos=".*"):
+        self.token = re.compile(token + "$")
+        self.pos = re.compile(pos + "$")
+        super(W, self).__init__(self.match)
+
+    def match(self, word):
+        m1 = self.token.match(word.token)
+        m2 = self.pos.match(word.pos)
+        return m1 and m2
+
+    def spec(self):
+        return {"token": self.token.pattern[:-1], "pos": self.pos.pattern[:-1]}
+
+
+serialize.register(W)
+
+
+POS = ["n", "v", "r", "x", "a", "nd", "nj", "nz"]
+KEYWORDS = ["k{0}".format(i) for i in range(40)]
+TOKENS = ["t{0}".format(i) for i in range(200)] + KEYWORDS
+
+
+def lazy_any():
+    return Star(Any(), greedy=False)
+
+
+def rule_patterns():
+    """
+    The shapes of the question rules: an entity and a keyword with anything
+    in between, in both orders.
+    """
+    patterns = []
+    for i, pos in enumerate(["nd", "nj", "nz"]):
+        entity = W(pos=pos)
+        for j in range(5):
+            words = KEYWORDS[(i * 5 + j) * 2:(i * 5 + j) * 2 + 3]
+            keyword = W(words[0])
+            for word in words[1:]:
+                keyword = keyword | W(word)
+            patterns.append(entity + lazy_any() + keyword + lazy_any())
+            patterns.append(lazy_any() + keyword + entity)
+    return patterns
+
+
+def nested_patterns():
+    noun = W(pos="n")
+    verb = W(pos="v")
+    return [
+        Star(Plus(noun) + Question(verb)) + W(pos="x"),
+        Group(Star(noun | verb) * (1, 4), "g") + W(pos="x"),
+        (Star(noun, greedy=False) + verb) * (2, 6),
+    ]
+
+
+def wide_patterns():
+    alternatives = W(TOKENS[0])
+    for token in TOKENS[1:100]:
+        alternatives = alternatives | W(token)
+    return [alternatives + W(pos="nj")]
+
+
+SHAPES = {
+    "rules": rule_patterns,
+    "nested": nested_patterns,
+    "wide": wide_patterns,
+}
+
+ENGINES = {
+    "vm": refo.VirtualMachine,
+    "pike": refo.PikeVM,
+    "codegen": refo.CodegenVM,
+}
+
+
+def sequence(n, rng):
+    return [Word(rng.choice(TOKENS), rng.choice(POS)) for _ in range(n)]
+
+
+def best_time(f, repeat):
+    """
+    Minimum wall time of `repeat` calls to `f`.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        f()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_compile(shape, engine, repeat):
+    # Compiled patterns are cached, so every run needs new patterns
+    batches = [SHAPES[shape]() for _ in range(repeat)]
+
+    def f():
+        for pattern in batches.pop():
+            refo.compile(pattern, engine)
+    return {"seconds": best_time(f, repeat)}
+
+
+def bench_load(shape, engine, repeat):
+    text = serialize.dumps(SHAPES[shape](), engine)
+    return {"seconds": best_time(lambda: serialize.loads(text), repeat),
+            "bytes": len(text)}
+
+
+def bench_run(shape, engine, length, repeat, rng):
+    patterns = [refo.compile(p, engine) for p in SHAPES[shape]()]
+    seq = sequence(length, rng)
+    results = {}
+    calls = {
+        "match": lambda c: c.match(seq),
+        "search": lambda c: c.search(seq),
+        "finditer": lambda c: list(c.finditer(seq)),
+    }
+    for name, call in sorted(calls.items()):
+        seconds = best_time(lambda: [call(c) for c in patterns], repeat)
+        results[name] = {
+            "seconds": seconds,
+            "throughput": len(patterns) * length / max(seconds, 1e-9),
+        }
+    tracemalloc.start()
+    for c in patterns:
+        list(c.finditer(seq))
+    results["finditer"]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return results
+
+
+def run(lengths, repeat, seed):
+    results = {}
+    for shape in sorted(SHAPES):
+        for name, engine in sorted(ENGINES.items()):
+            key = "{0}/{1}/compile".format(shape, name)
+            results[key] = bench_compile(shape, engine, repeat)
+            key = "{0}/{1}/load".format(shape, name)
+            results[key] = bench_load(shape, engine, repeat)
+            for length in lengths:
+                rng = random.Random(seed)
+                runs = bench_run(shape, engine, length, repeat, rng)
+                for call, result in runs.items():
+                    key = "{0}/{1}/{2}/{3}".format(shape, name, call, length)
+                    results[key] = result
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of messages, one for each benchmark in both `results`
+    and `baseline` that is slower than the baseline by more than
+    `tolerance` (a fraction).
+    """
+    failures = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        old = baseline[key]["seconds"]
+        new = results[key]["seconds"]
+        if new > old * (1 + tolerance):
+            failures.append("{0}: {1:.6f}s -> {2:.6f}s (+{3:.0%})".format(
+                key, old, new, new / old - 1))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks refo engines")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="fail if slower than this JSON results file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown in --compare (default 0.2)")
+    parser.add_argument("--lengths", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    cfg = parser.parse_args(argv)
+
+    results = run(cfg.lengths, cfg.repeat, cfg.seed)
+    for key in sorted(results):
+        print("{0:40} {1:.6f}s".format(key, results[key]["seconds"]))
+    if cfg.output:
+        with open(cfg.output, "w") as f:
+            json.dump({"results": results}, f, indent=2, sort_keys=True)
+    if cfg.compare:
+        with open(cfg.compare) as f:
+            baseline = json.load(f)["results"]
+        failures = compare(results, baseline, cfg.tolerance)
+        for failure in failures:
+            print("SLOWER " + failure)
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,18 +5,40 @@
 #  This file is part of REfO and is distributed under the Modified BSD License.
 #  You should have received a copy of license in the LICENSE.txt file.
 
-from .match import match, search, finditer
+from .match import match, search, finditer, compile, CompiledPattern
+from .match import StreamMatcher
+from .multi import MultiPattern
+from .virtualmachine import VirtualMachine
+from .pikevm import PikeVM
+from .codegen import CodegenVM
+from .dfa import DFAPattern
+from .optimize import optimize
+from .stats import MatchStats
+from .bulk import finditer_many, Corpus
 from .patterns import (
-    Predicate, Any, Literal, Disjunction, Concatenation,
+    Predicate, Any, Literal, OneOf, Disjunction, Concatenation,
     Star, Plus, Question, Group, Repetition
 )
 # tedious means of satisfying flake8
 assert match
 assert search
 assert finditer
+assert compile
+assert CompiledPattern
+assert StreamMatcher
+assert MultiPattern
+assert VirtualMachine
+assert PikeVM
+assert CodegenVM
+assert DFAPattern
+assert optimize
+assert MatchStats
+assert finditer_many
+assert Corpus
 assert Predicate
 assert Any
 assert Literal
+assert OneOf
 assert Disjunction
 assert Concatenation
 assert Star
@@ -0,0 +1,145 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+from .patterns import (
+    Predicate, Any, OneOf, Disjunction, Concatenation, Star, Plus, Question,
+    Group, Repetition
+)
+
+# Disjunctions whose requirements would combine into more than this many are
+# given up on (it's always safe to require less).
+MAX_REQUIREMENTS = 64
+
+
+def literals(pattern):
+    """
+    Returns `(key, values)` if `pattern` is a predicate that holds exactly
+    for the objects `x` with `key(x)` in `values` (`x` itself if `key` is
+    None), None otherwise.
+    """
+    if isinstance(pattern, OneOf):
+        return pattern.key, pattern.values
+    if isinstance(pattern, Predicate) and pattern.literal is not None:
+        key, value = pattern.literal
+        return key, frozenset([value])
+    return None
+
+
+def requirements(pattern):
+    """
+    Returns a list of requirements of `pattern`, each one a list of
+    predicates: every match of `pattern` has, for each requirement, an
+    object for which one of its predicates holds.
+    It's useful to rule out patterns quickly. Requirements are necessary but
+    not sufficient, and not every one is found (`Any` makes none, for
+    example).
+    """
+    from .match import CompiledPattern  # match.py uses this module
+    if isinstance(pattern, CompiledPattern):
+        pattern = pattern.pattern
+    if isinstance(pattern, Any):
+        return []
+    if isinstance(pattern, Predicate):
+        return [[pattern]]
+    if isinstance(pattern, Concatenation):
+        reqs = []
+        for x in pattern.xs:
+            reqs.extend(requirements(x))
+        return reqs
+    if isinstance(pattern, Disjunction):
+        a = requirements(pattern.a)
+        b = requirements(pattern.b)
+        if len(a) * len(b) > MAX_REQUIREMENTS:
+            return []
+        return [x + y for x in a for y in b]
+    if isinstance(pattern, (Plus, Group)):
+        return requirements(pattern.x)
+    if isinstance(pattern, Repetition) and pattern.mn > 0:
+        return requirements(pattern.x)
+    # Star, Question and Repetition can match nothing
+    return []
+
+
+def first_predicates(pattern):
+    """
+    Returns a list of predicates such that every match of `pattern` starts
+    with an object for which one of them holds, or None if there is no such
+    list (the pattern can match an empty sequence or start with `Any`).
+    Searches skip the objects for which none holds, no match starts there.
+    """
+    predicates, nullable = _first(pattern)
+    if nullable:
+        return None
+    return predicates
+
+
+def _first(pattern):
+    """
+    Returns the predicates that can hold for the first object of a match of
+    `pattern` (None for anything) and whether `pattern` can match an empty
+    sequence.
+    """
+    if isinstance(pattern, Any):
+        return None, False
+    if isinstance(pattern, Predicate):
+        return [pattern], False
+    if isinstance(pattern, (Plus, Group)):
+        return _first(pattern.x)
+    if isinstance(pattern, Repetition):
+        predicates, nullable = _first(pattern.x)
+        return predicates, nullable or pattern.mn == 0
+    if isinstance(pattern, (Star, Question)):
+        return _first(pattern.x)[0], True
+    if isinstance(pattern, Disjunction):
+        a, a_nullable = _first(pattern.a)
+        b, b_nullable = _first(pattern.b)
+        return _union(a, b), a_nullable or b_nullable
+    if isinstance(pattern, Concatenation):
+        predicates = []
+        for x in pattern.xs:
+            first, nullable = _first(x)
+            predicates = _union(predicates, first)
+            if not nullable:
+                return predicates, False
+        return predicates, True
+    return None, True
+
+
+def _union(a, b):
+    if a is None or b is None:
+        return None
+    return a + [x for x in b if not any(x is y for y in a)]
+
+
+def any_of(predicates):
+    """
+    Returns a function of an object that is True if one of `predicates`
+    holds for it. Literal predicates with the same key are tested with a
+    single set lookup.
+    """
+    keys = []
+    values = {}
+    tests = []
+    for predicate in predicates:
+        found = literals(predicate)
+        if found is None:
+            tests.append(predicate.f)
+            continue
+        key, xs = found
+        if key not in values:
+            keys.append(key)
+            values[key] = set()
+        values[key].update(xs)
+    tests = [OneOf(values[key], key).f for key in keys] + tests
+    if len(tests) == 1:
+        return tests[0]
+
+    def f(x):
+        for test in tests:
+            if test(x):
+                return True
+        return False
+    return f
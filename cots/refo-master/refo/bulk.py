@@ -0,0 +1,227 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+try:
+    import numpy
+except ImportError:  # Only needed for bulk matching
+    numpy = None
+
+from .patterns import (
+    Predicate, Any, Disjunction, Concatenation, Star, Plus, Question, Group,
+    Repetition
+)
+from .match import CompiledPattern, compile, finditer
+from .analysis import literals, requirements, first_predicates
+from .codegen import CodegenVM
+
+
+def bulk_terms(predicate):
+    """
+    Returns a list of `(key, test)` pairs such that `predicate` holds for an
+    object `x` exactly when `test(key(x))` holds for every pair (`key` None
+    stands for `x` itself), or None if `predicate` can't be put like that.
+    Predicates say it with a `bulk_terms()` method, literal predicates (see
+    `Predicate.literal`) and `Any` don't need one.
+    Tests are run once for each distinct value of their key in a corpus.
+    """
+    method = getattr(predicate, "bulk_terms", None)
+    if method is not None:
+        return method()
+    if isinstance(predicate, Any):
+        return []
+    found = literals(predicate)
+    if found is not None:
+        key, values = found
+        return [(key, values.__contains__)]
+    return None
+
+
+class Corpus(object):
+    """
+    A list of sequences of objects laid end to end, for `finditer_many`.
+    The values of each key are interned into an array of ids (one per
+    object) the first time the key is used, and the truth values of each
+    predicate are kept as a boolean array over every object of the corpus.
+    Sequence `k` spans `starts[k]:ends[k]` in those arrays.
+    Needs NumPy.
+    """
+    def __init__(self, sequences):
+        if numpy is None:
+            raise ImportError("Bulk matching needs NumPy")
+        self.sequences = [list(sequence) for sequence in sequences]
+        self.objects = [x for sequence in self.sequences for x in sequence]
+        lengths = numpy.array([len(s) for s in self.sequences], dtype=int)
+        self.ends = numpy.cumsum(lengths)
+        self.starts = self.ends - lengths
+        self.vocabularies = {}
+        self.masks = {}
+
+    def __len__(self):
+        return len(self.sequences)
+
+    def ids(self, key):
+        """
+        Returns the distinct values of `key` and the array with the id of
+        the value of each object (its index in the list of values).
+        Returns None if the values can't be interned (are not hashable).
+        """
+        if key not in self.vocabularies:
+            index = {}
+            if key is None:
+                values = self.objects
+            else:
+                values = [key(x) for x in self.objects]
+            try:
+                ids = numpy.fromiter(
+                    (index.setdefault(v, len(index)) for v in values),
+                    dtype=numpy.int32, count=len(values))
+            except TypeError:  # Unhashable
+                self.vocabularies[key] = None
+            else:
+                vocabulary = [None] * len(index)
+                for v, i in index.items():
+                    vocabulary[i] = v
+                self.vocabularies[key] = vocabulary, ids
+        return self.vocabularies[key]
+
+    def mask(self, predicate):
+        """
+        Returns the boolean array of the objects for which `predicate`
+        holds.
+        """
+        mask = self.masks.get(predicate)
+        if mask is not None:
+            return mask
+        n = len(self.objects)
+        terms = bulk_terms(predicate)
+        if terms is None:
+            mask = self._evaluate(predicate.f, None)
+        else:
+            mask = numpy.ones(n, dtype=bool)
+            for key, test in terms:
+                interned = self.ids(key)
+                if interned is None:
+                    mask &= self._evaluate(test, key)
+                    continue
+                vocabulary, ids = interned
+                holds = numpy.fromiter((bool(test(v)) for v in vocabulary),
+                                       dtype=bool, count=len(vocabulary))
+                mask &= holds[ids]
+        self.masks[predicate] = mask
+        return mask
+
+    def _evaluate(self, f, key):
+        # The slow way: once for every object
+        if key is None:
+            values = self.objects
+        else:
+            values = (key(x) for x in self.objects)
+        return numpy.fromiter((bool(f(v)) for v in values), dtype=bool,
+                              count=len(self.objects))
+
+    def any(self, mask):
+        """
+        Returns the boolean array of the sequences with an object in `mask`.
+        """
+        counts = numpy.concatenate(([0], numpy.cumsum(mask)))
+        return counts[self.ends] > counts[self.starts]
+
+
+class _Bit(Predicate):
+    """
+    The predicate that stands for `predicate` when objects are replaced by
+    bitmasks of the predicates that hold for them.
+    """
+    def __init__(self, predicate, bit):
+        self.predicate = predicate
+        self.bit = bit
+        super(_Bit, self).__init__(lambda x: x & bit)
+
+    def __repr__(self):
+        return "_Bit({0!r})".format(self.predicate)
+
+
+def _predicates(pattern, found):
+    if isinstance(pattern, Any):
+        return
+    if isinstance(pattern, Predicate):
+        if not any(pattern is x for x in found):
+            found.append(pattern)
+    elif isinstance(pattern, Disjunction):
+        _predicates(pattern.a, found)
+        _predicates(pattern.b, found)
+    elif isinstance(pattern, Concatenation):
+        for x in pattern.xs:
+            _predicates(x, found)
+    else:
+        _predicates(pattern.x, found)
+
+
+def _replace(pattern, bits):
+    """
+    Returns `pattern` with its predicates replaced by `bits[id(predicate)]`.
+    """
+    if isinstance(pattern, Any):
+        return pattern
+    if isinstance(pattern, Predicate):
+        return bits[id(pattern)]
+    if isinstance(pattern, Disjunction):
+        return Disjunction(_replace(pattern.a, bits),
+                           _replace(pattern.b, bits))
+    if isinstance(pattern, Concatenation):
+        return Concatenation(*[_replace(x, bits) for x in pattern.xs])
+    if isinstance(pattern, (Star, Plus, Question)):
+        return pattern.__class__(_replace(pattern.x, bits),
+                                 greedy=pattern.greedy)
+    if isinstance(pattern, Group):
+        return Group(_replace(pattern.x, bits), pattern.key)
+    assert isinstance(pattern, Repetition), "Unknown pattern"
+    return Repetition(_replace(pattern.x, bits), pattern.mn, pattern.mx,
+                      pattern.greedy)
+
+
+def finditer_many(pattern, corpus, engine=CodegenVM):
+    """
+    Returns, for each sequence of `corpus` (a list of sequences or a
+    `Corpus`), the list of matches `finditer` finds in it.
+    The predicates of `pattern` are evaluated for the whole corpus at once
+    (see `Corpus.mask`), sequences without the objects every match needs
+    (see `requirements`) are ruled out with array operations and the rest
+    are matched by `engine` over bitmasks of the predicates that hold.
+    Matches have spans and groups only, not paths. Needs NumPy.
+    """
+    if not isinstance(corpus, Corpus):
+        corpus = Corpus(corpus)
+    if isinstance(pattern, CompiledPattern):
+        pattern = pattern.pattern
+    predicates = []
+    _predicates(pattern, predicates)
+    # Python ints hold any number of bits, NumPy's only 64
+    dtype = numpy.uint64 if len(predicates) <= 64 else object
+    bitmasks = numpy.zeros(len(corpus.objects), dtype=dtype)
+    bits = {}
+    for k, predicate in enumerate(predicates):
+        bit = 1 << k
+        bits[id(predicate)] = _Bit(predicate, bit)
+        bitmasks[corpus.mask(predicate)] |= bit
+    compiled = compile(_replace(pattern, bits), engine)
+
+    candidates = numpy.ones(len(corpus), dtype=bool)
+    needed = requirements(pattern)
+    first = first_predicates(pattern)
+    if first is not None:
+        needed.append(first)
+    for requirement in needed:
+        mask = numpy.zeros(len(corpus.objects), dtype=bool)
+        for predicate in requirement:
+            mask |= corpus.mask(predicate)
+        candidates &= corpus.any(mask)
+
+    results = [[] for _ in range(len(corpus))]
+    for k in numpy.flatnonzero(candidates):
+        xs = bitmasks[corpus.starts[k]:corpus.ends[k]].tolist()
+        results[k] = list(finditer(compiled, xs))
+    return results
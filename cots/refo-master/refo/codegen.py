@@ -0,0 +1,248 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+import threading
+from .pikevm import Program, PikeVM, ATOM, ACCEPT, SPLIT, SAVE
+
+
+class GeneratedProgram(Program):
+    """
+    A `Program` that also has Python functions generated for it:
+    `step(x, pcs, caps, paths, i)` feeds `x` to the threads `pcs`, `caps`,
+    `paths` and returns the idle threads that follow, `start()` returns the
+    idle threads of a VM that has not consumed anything. Both also return
+    the index of the first accepting thread (-1 if there is none).
+    Both are specialized for the program: the predicates are bound as
+    local variables, the program counter of each thread is dispatched with
+    integer comparisons and epsilon transitions are unrolled.
+    The functions are built the first time they are used and then kept, the
+    source is in `source[keep_path]` and the compiled code object in
+    `code[keep_path]`. They keep no state between calls.
+    """
+    lock = threading.Lock()
+
+    def __init__(self, code):
+        super(GeneratedProgram, self).__init__(code)
+        self.source = {}
+        self.code = {}
+        self.functions = {}
+
+    def get_functions(self, keep_path):
+        functions = self.functions.get(keep_path)
+        if functions is None:
+            with self.lock:
+                functions = self.functions.get(keep_path)
+                if functions is None:
+                    functions = self._build(keep_path)
+                    self.functions[keep_path] = functions
+        return functions
+
+    def get_source(self, keep_path):
+        source = self.source.get(keep_path)
+        if source is None:
+            source = self.source[keep_path] = _generate(self, keep_path)
+        return source
+
+    def get_code(self, keep_path):
+        code = self.code.get(keep_path)
+        if code is None:
+            code = self.code[keep_path] = compile(
+                self.get_source(keep_path), "<refo codegen>", "exec")
+        return code
+
+    def _build(self, keep_path):
+        # The code may have been set already (see `refo.serialize`)
+        namespace = {}
+        exec(self.get_code(keep_path), namespace)
+        return namespace["make"](self.args)
+
+
+class CodegenVM(PikeVM):
+    """
+    A drop-in replacement for `VirtualMachine` that runs Python code
+    generated for each pattern (see `GeneratedProgram`).
+    Threads and captures are kept as in `PikeVM` and the matches found are
+    the same.
+    Programs with counted loops are run by a `PikeVM` instead: how threads
+    go through a loop depends on their counts, so it can't be unrolled.
+    """
+    def __new__(cls, code, keep_path=False):
+        if not isinstance(code, Program):
+            code = GeneratedProgram(code)
+        if code.counters:
+            return PikeVM(code, keep_path)
+        return super(CodegenVM, cls).__new__(cls)
+
+    def __init__(self, code, keep_path=False):
+        if not isinstance(code, GeneratedProgram):
+            code = GeneratedProgram(code)
+        self.program = code
+        self.path = keep_path
+        self.step, self.start = code.get_functions(keep_path)
+        self.reset()
+
+    @classmethod
+    def prepare(cls, code):
+        """
+        Turns code into what this VM runs, so it can be done only once.
+        """
+        program = GeneratedProgram(code)
+        if not program.counters:
+            program.get_functions(False)
+        return program
+
+    def reset(self):
+        super(CodegenVM, self).reset()
+        self.accept = -1
+
+    def do_epsilon_transitions(self):
+        """
+        Takes epsilon transitions until all threads are idle (waiting to
+        consume a symbol).
+        """
+        if not self.closed:
+            self.pcs, self.caps, self.paths, self.accept = self.start()
+            self.closed = True
+
+    def feed(self, x):
+        """
+        Feeds a symbol to every thread in the VM and takes the epsilon
+        transitions that follow.
+        It's requiered that every thread is in idle state to call this method.
+        """
+        assert self.closed
+        self.i += 1
+        self.pcs, self.caps, self.paths, self.accept = self.step(
+            x, self.pcs, self.caps, self.paths, self.i)
+
+    def accepting_state(self, default):
+        """
+        Returns the state (affected by `Save` for example) of the accepting
+        thread with highest priority or `default` if there is not such thread.
+        """
+        if self.accept < 0:
+            return default
+        return self._state(self.accept)
+
+    def cutoff(self):
+        """
+        Looks for an accepting thread and then cuts-off threads of lower
+        priority than that (including itself).
+        If there are no accepting threads then it does nothing.
+        """
+        k = self.accept
+        if k >= 0:
+            del self.pcs[k:]
+            del self.caps[k:]
+            del self.paths[k:]
+            self.accept = -1
+
+
+def _closure(program, pc, cap, lines, indent, names):
+    """
+    Appends to `lines` the code that follows the epsilon transitions from
+    `pc` with captures in the variable `cap`, in the order `PikeVM` does.
+    Every pc reached is tested against the bitmask `seen` of pcs already
+    visited by threads of higher priority. It doesn't need to nest: once a
+    pc is visited so is every pc reachable from it, so the code for those
+    is skipped as well.
+    Each pc is visited at most once, later visits would be no-ops.
+    """
+    pad = " " * indent
+    stack = [(pc, cap)]
+    visited = set()
+    while stack:
+        pc, cap = stack.pop()
+        if pc in visited:
+            continue
+        visited.add(pc)
+        bit = 1 << pc
+        lines.append("{0}if not seen & {1}:".format(pad, bit))
+        lines.append("{0}    seen |= {1}".format(pad, bit))
+        op = program.opcodes[pc]
+        if op == SPLIT:
+            stack.append((program.split[pc], cap))
+            stack.append((program.succ[pc], cap))
+        elif op == SAVE:
+            s = program.args[pc]
+            new = "c{0}".format(len(names))
+            names.append(new)
+            lines.append("{0}    {1} = {2}[:{3}] + (i,) + {2}[{4}:]".format(
+                pad, new, cap, s, s + 1))
+            stack.append((program.succ[pc], new))
+        else:
+            assert op in (ATOM, ACCEPT)
+            if op == ACCEPT:
+                lines.append("{0}    if accept < 0:".format(pad))
+                lines.append("{0}        accept = len(new_pcs)".format(pad))
+            lines.append("{0}    new_pcs.append({1})".format(pad, pc))
+            lines.append("{0}    new_caps.append({1})".format(pad, cap))
+            lines.append("{0}    new_paths.append(path)".format(pad))
+
+
+def _dispatch(program, atoms, lines, indent, keep_path, names):
+    """
+    Appends the code that feeds `x` to a thread at one of `atoms` (sorted
+    pcs of ATOM instructions), as a binary search on the pc.
+    """
+    pad = " " * indent
+    if len(atoms) > 1:
+        middle = len(atoms) // 2
+        lines.append("{0}if pc < {1}:".format(pad, atoms[middle]))
+        _dispatch(program, atoms[:middle], lines, indent + 4, keep_path,
+                  names)
+        lines.append("{0}else:".format(pad))
+        _dispatch(program, atoms[middle:], lines, indent + 4, keep_path,
+                  names)
+        return
+    pc = atoms[0]
+    # Threads at ACCEPT instructions fall through every test
+    lines.append("{0}if pc == {1}:".format(pad, pc))
+    lines.append("{0}    y = p{1}(x)".format(pad, pc))
+    lines.append("{0}    if y:".format(pad))
+    lines.append("{0}        cap = caps[k]".format(pad))
+    if keep_path:
+        lines.append("{0}        path = (y, paths[k])".format(pad))
+    _closure(program, program.succ[pc], "cap", lines, indent + 8, names)
+
+
+def _generate(program, keep_path):
+    """
+    Returns the source of a function `make(args)` that returns the `step`
+    and `start` functions of `program` (see `GeneratedProgram`).
+    """
+    atoms = [pc for pc, op in enumerate(program.opcodes) if op == ATOM]
+    lines = ["def make(args):"]
+    for pc in atoms:
+        lines.append("    p{0} = args[{0}]".format(pc))
+    lines.append("    empty = {0!r}".format((None,) * len(program.slots)))
+    lines.append("")
+    lines.append("    def step(x, pcs, caps, paths, i):")
+    lines.append("        seen = 0")
+    lines.append("        accept = -1")
+    lines.append("        new_pcs = []")
+    lines.append("        new_caps = []")
+    lines.append("        new_paths = []")
+    lines.append("        path = None")
+    if atoms:
+        lines.append("        for k in range(len(pcs)):")
+        lines.append("            pc = pcs[k]")
+        _dispatch(program, atoms, lines, 12, keep_path, [])
+    lines.append("        return new_pcs, new_caps, new_paths, accept")
+    lines.append("")
+    lines.append("    def start():")
+    lines.append("        seen = 0")
+    lines.append("        accept = -1")
+    lines.append("        i = 0")
+    lines.append("        new_pcs = []")
+    lines.append("        new_caps = []")
+    lines.append("        new_paths = []")
+    lines.append("        path = None")
+    _closure(program, 0, "empty", lines, 8, [])
+    lines.append("        return new_pcs, new_caps, new_paths, accept")
+    lines.append("")
+    lines.append("    return step, start")
+    return "\n".join(lines) + "\n"
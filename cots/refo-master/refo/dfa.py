@@ -0,0 +1,290 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+import threading
+from .pikevm import PikeVM, ATOM, ACCEPT, SPLIT, SAVE, REPEAT, INCREMENT
+from .match import Match, compile, finditer_onepass, _skip
+from .patterns import _start, _end
+
+DEFAULT_MAX_STATES = 10000
+
+
+class DFAState(object):
+    """
+    A state of a `LazyDFA`: the idle threads of the VM as `(pc, counts)`
+    pairs, in priority order, with the threads of lower priority than an
+    accepting one already cut-off.
+    `tests` are the `(bit, predicate)` pairs needed to leave the state and
+    `next` caches the transitions, keyed by the bitmask of the predicates that
+    held for the symbol.
+    """
+    __slots__ = ("threads", "tests", "next")
+
+    def __init__(self, threads, tests):
+        self.threads = threads
+        self.tests = tests
+        self.next = {}
+
+
+class LazyDFA(object):
+    """
+    A DFA built on demand from a `Program`, for patterns where only the end
+    of the match is needed.
+    Every distinct predicate of the program is assigned a bit. For each
+    symbol the predicates of the current state are evaluated once (instead
+    of once per thread) and the transition is looked up by the resulting
+    bitmask, it's only computed the first time it is taken.
+    It matches like a VM without captures would: same thread priority and
+    cut-offs. States are dropped when there are more than `max_states`.
+    Counted loops make a state for each combination of counts reached.
+    It can be shared by threads: transitions already built are followed
+    without locking, building new ones takes `lock`.
+    """
+    def __init__(self, program, max_states=DEFAULT_MAX_STATES):
+        self.program = program
+        self.max_states = max_states
+        self.lock = threading.Lock()
+        self.predicates = []
+        self.bits = [0] * len(program)
+        index = {}
+        for pc, op in enumerate(program.opcodes):
+            if op != ATOM:
+                continue
+            f = program.args[pc]
+            try:
+                hash(f)
+                key = f
+            except TypeError:
+                key = id(f)
+            if key not in index:
+                index[key] = len(self.predicates)
+                self.predicates.append(f)
+            self.bits[pc] = 1 << index[key]
+        self.clear()
+
+    def clear(self):
+        """
+        Drops every state built so far.
+        """
+        with self.lock:
+            self.states = {}
+            counts = (0,) * len(self.program.counters)
+            self.start, self.start_accepts = self._closure([(0, counts)])
+
+    def _state(self, threads):
+        state = self.states.get(threads)
+        if state is None:
+            if len(self.states) >= self.max_states:
+                # Start over, states in use just lose their transitions
+                for old in self.states.values():
+                    old.next.clear()
+                self.states = {}
+            tests = {}
+            for pc, _ in threads:
+                bit = self.bits[pc]
+                tests[bit] = self.program.args[pc]
+            state = DFAState(threads, tuple(sorted(tests.items())))
+            self.states[threads] = state
+        return state
+
+    def _closure(self, threads):
+        """
+        Follows epsilon transitions from `threads`, `(pc, counts)` pairs
+        (highest priority first).
+        Returns the resulting state and whether a thread accepted.
+        """
+        opcodes = self.program.opcodes
+        args = self.program.args
+        succ = self.program.succ
+        split = self.program.split
+        seen = set()
+        atoms = []
+        for thread in threads:
+            stack = [thread]
+            while stack:
+                thread = stack.pop()
+                if thread in seen:
+                    continue
+                seen.add(thread)
+                pc, counts = thread
+                op = opcodes[pc]
+                if op == SPLIT:
+                    stack.append((split[pc], counts))
+                    stack.append((succ[pc], counts))
+                elif op == SAVE:
+                    stack.append((succ[pc], counts))
+                elif op == REPEAT:
+                    c, mn, mx, greedy = args[pc]
+                    out = counts[:c] + (0,) + counts[c + 1:]
+                    if counts[c] < mn:
+                        stack.append((split[pc], counts))
+                    elif mx is not None and counts[c] >= mx:
+                        stack.append((succ[pc], out))
+                    elif greedy:
+                        stack.append((succ[pc], out))
+                        stack.append((split[pc], counts))
+                    else:
+                        stack.append((split[pc], counts))
+                        stack.append((succ[pc], out))
+                elif op == INCREMENT:
+                    c, limit = args[pc]
+                    count = min(counts[c] + 1, limit)
+                    counts = counts[:c] + (count,) + counts[c + 1:]
+                    stack.append((succ[pc], counts))
+                elif op == ACCEPT:
+                    # Lower priority threads are cut-off
+                    return self._state(tuple(atoms)), True
+                else:
+                    atoms.append(thread)
+        return self._state(tuple(atoms)), False
+
+    def step(self, state, x):
+        """
+        Feeds `x` to `state`.
+        Returns the next state and whether a thread accepted.
+        """
+        mask = 0
+        for bit, f in state.tests:
+            if f(x):
+                mask |= bit
+        try:
+            return state.next[mask]
+        except KeyError:
+            pass
+        with self.lock:
+            # Another thread may have built it meanwhile
+            result = state.next.get(mask)
+            if result is None:
+                bits = self.bits
+                succ = self.program.succ
+                threads = [(succ[pc], counts) for pc, counts in state.threads
+                           if bits[pc] & mask]
+                result = self._closure(threads)
+                state.next[mask] = result
+        return result
+
+    def run(self, iterable, consumed=None):
+        """
+        Runs the DFA over `iterable` until it ends or no thread is left.
+        Returns the end of the match of highest priority (`None` if there is
+        no match). If `consumed` is a list, the symbols read are appended to
+        it.
+        """
+        state = self.start
+        end = 0 if self.start_accepts else None
+        i = 0
+        for x in iterable:
+            if not state.threads:
+                break
+            if consumed is not None:
+                consumed.append(x)
+            state, accepted = self.step(state, x)
+            i += 1
+            if accepted:
+                end = i
+        return end
+
+
+class DFAPattern(object):
+    """
+    Matches a pattern with a `LazyDFA` and falls back to a `PikeVM` only to
+    recover captures (groups other than the whole match, the start of a
+    `search` match or paths).
+    The VM is run only on the symbols up to the end of the match the DFA
+    found, so patterns that don't match never reach it.
+    It finds the same matches as `match`, `search` and `finditer`.
+    """
+    def __init__(self, pattern, max_states=DEFAULT_MAX_STATES):
+        self.compiled = compile(pattern, PikeVM)
+        self.pattern = self.compiled.pattern
+        self.match_dfa = LazyDFA(self.compiled.match_code, max_states)
+        self.search_dfa = LazyDFA(self.compiled.search_code, max_states)
+        slots = self.compiled.match_code.slots
+        self.captures = any(key != _start(None) and key != _end(None)
+                            for key in slots)
+
+    def match(self, iterable, keep_path=False):
+        if keep_path:
+            return self.compiled.match(iterable, keep_path)
+        if not self.captures:
+            end = self.match_dfa.run(iterable)
+            if end is None:
+                return None
+            return Match({_start(None): 0, _end(None): end})
+        consumed = []
+        end = self.match_dfa.run(iterable, consumed)
+        if end is None:
+            return None
+        return self.compiled.match(consumed[:end])
+
+    def search(self, iterable):
+        skipped = 0
+        if self.compiled.first is not None:
+            skipped, iterable = _skip(self.compiled.first, iterable)
+            if iterable is None:
+                return None
+        consumed = []
+        end = self.search_dfa.run(iterable, consumed)
+        if end is None:
+            return None
+        m = self.compiled.search(consumed[:end])
+        if skipped:
+            m.offset(skipped)
+        return m
+
+    def finditer(self, iterable):
+        """
+        Finds the same matches as `finditer`, reading each symbol once.
+        The searches are run by the search DFA the way a `StreamMatcher`
+        runs them: while a match can still grow, the search for the next
+        one runs speculatively from its current end. Only the symbols since
+        the start of the oldest pending search are kept, to recover the
+        start and captures of each match with the VM.
+        Patterns that match the empty sequence need the start of a match to
+        know where the next search begins, which the DFA doesn't track, so
+        they are run by `finditer_onepass` on the VM instead.
+        """
+        if self.match_dfa.start_accepts:
+            for m in finditer_onepass(self.compiled, iterable):
+                yield m
+            return
+        dfa = self.search_dfa
+        # `[offset, state, end]` of every pending search, oldest first
+        searches = [[0, dfa.start, None]]
+        buffered = []  # the symbols from `base` on
+        base = 0
+        position = 0
+        for x in iterable:
+            buffered.append(x)
+            position += 1
+            for k, search in enumerate(searches):
+                if not search[1].threads:
+                    continue
+                search[1], accepted = dfa.step(search[1], x)
+                if accepted:
+                    # Searches after this one started at its previous end
+                    search[2] = position
+                    del searches[k + 1:]
+                    searches.append([position, dfa.start, None])
+                    break
+            while searches and not searches[0][1].threads:
+                offset, _, end = searches.pop(0)
+                if end is None:
+                    return
+                yield self._found(buffered, base, offset, end)
+            if not searches:
+                return
+            del buffered[:searches[0][0] - base]
+            base = searches[0][0]
+        for offset, _, end in searches:
+            if end is None:
+                break
+            yield self._found(buffered, base, offset, end)
+
+    def _found(self, buffered, base, offset, end):
+        m = self.compiled.search(buffered[offset - base:end - base])
+        m.offset(offset)
+        return m
@@ -16,6 +16,9 @@ class Instruction(object):
 
 
 class Atom(Instruction):
+    # The `Predicate` the instruction was compiled from, if any
+    predicate = None
+
     def __init__(self, comparison_function, succ=None):
         self.comparison_function = comparison_function
         if succ is not None:
@@ -28,8 +31,14 @@ class Atom(Instruction):
 class Accept(Instruction):
     succ = None
 
+    def __init__(self, tag=None):
+        # `tag` tells apart the patterns of a multi-pattern program
+        self.tag = tag
+
     def __repr__(self):
-        return "Accept"
+        if self.tag is None:
+            return "Accept"
+        return "Accept({0!r})".format(self.tag)
 
 
 class Split(Instruction):
@@ -51,3 +60,45 @@ class Save(Instruction):
 
     def __repr__(self):
         return "Save({0})".format(repr(self.record))
+
+
+class Repeat(Instruction):
+    """
+    Head of a counted loop: the body (starting at `body`) must run between
+    `mn` and `mx` times (`mx` None means no limit) before going on to
+    `succ`. Threads count the iterations themselves, the count is reset when
+    they leave the loop.
+    """
+    def __init__(self, mn, mx, greedy=True, body=None, succ=None):
+        self.mn = mn
+        self.mx = mx
+        self.greedy = greedy
+        if body is not None:
+            self.body = body
+        if succ is not None:
+            self.succ = succ
+
+    def limit(self):
+        """
+        Largest count that makes a difference: counting stops there.
+        """
+        if self.mx is None:
+            return self.mn
+        return self.mx
+
+    def __repr__(self):
+        return "Repeat({0}, {1}, {2!r})".format(self.mn, self.mx,
+                                                self.body)
+
+
+class Increment(Instruction):
+    """
+    End of the body of a counted loop, counts one iteration and goes back to
+    the `Repeat` instruction `succ`.
+    """
+    def __init__(self, succ=None):
+        if succ is not None:
+            self.succ = succ
+
+    def __repr__(self):
+        return "Increment"
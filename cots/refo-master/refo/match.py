@@ -5,8 +5,12 @@
 #  This file is part of REfO and is distributed under the Modified BSD License.
 #  You should have received a copy of license in the LICENSE.txt file.
 
+import itertools
+import threading
 from .virtualmachine import VirtualMachine
 from .patterns import Pattern, Any, Star, Group, _start, _end
+from .analysis import first_predicates, any_of
+from .stats import MatchStats
 
 
 class Match(object):
@@ -44,17 +48,101 @@ class Match(object):
         self.state = dict((key, i + amount) for key, i in self.state.items())
 
     def get_path(self):
-        return self.state["path"]
+        """
+        The values returned by the predicates of the match, in order.
+        Only for matches made with `keep_path=True`.
+        """
+        path = []
+        node = self.state["path"]
+        while node is not None:
+            path.append(node[0])
+            node = node[1]
+        path.reverse()
+        return path
 
     def __iter__(self):
         for key in set(x[0] for x in self.state):
             yield key
 
 
-def _match(pattern, iterable, keep_path=False):
+class CompiledPattern(object):
+    """
+    A pattern compiled for `match`, `search` and `finditer`.
+    Build them with `compile`, they can be used as many times as needed
+    without compiling the pattern again.
+    `engine` is the VM class that runs the code, `VirtualMachine` by default.
+    `first` is a function that holds for the first object of every match
+    (see `first_predicates`), searches skip the objects where it doesn't.
+    It's None if the pattern can start with anything.
+    `match_code` and `search_code` are the code prepared by `engine`, they
+    are built from the pattern if not given.
+    """
+    def __init__(self, pattern, engine=None, match_code=None,
+                 search_code=None):
+        assert isinstance(pattern, Pattern)
+        if engine is None:
+            engine = VirtualMachine
+        self.pattern = pattern
+        self.engine = engine
+        if match_code is None:
+            match_code = engine.prepare(Group(pattern, None).compile())
+        self.match_code = match_code
+        if search_code is None:
+            search = Star(Any(), greedy=False) + Group(pattern, None)
+            search_code = engine.prepare(search.compile())
+        self.search_code = search_code
+        predicates = first_predicates(self.pattern)
+        self.first = None if predicates is None else any_of(predicates)
+
+    def match(self, iterable, keep_path=False, stats=None):
+        return match(self, iterable, keep_path, stats)
+
+    def search(self, iterable, stats=None):
+        return search(self, iterable, stats)
+
+    def finditer(self, iterable, stats=None):
+        return finditer(self, iterable, stats)
+
+    def __repr__(self):
+        return "compile({0!r})".format(self.pattern)
+
+
+# Taken only to compile a pattern that is not in the cache yet
+_compile_lock = threading.Lock()
+
+
+def compile(pattern, engine=None):
+    """
+    Returns the `CompiledPattern` for `pattern` run by `engine` (a VM class,
+    `VirtualMachine` by default).
+    Compiled patterns are cached in the pattern itself, so compiling the same
+    pattern object again is free. Each pattern is compiled once for each
+    engine even if several threads ask for it at the same time.
+    Compiled patterns are never modified by matching (every call keeps its
+    state in VM objects of its own), so one can be shared by every thread.
+    """
+    if isinstance(pattern, CompiledPattern):
+        if engine is None or engine is pattern.engine:
+            return pattern
+        pattern = pattern.pattern
     assert isinstance(pattern, Pattern)
-    code = pattern.compile()
-    vm = VirtualMachine(code, keep_path)
+    if engine is None:
+        engine = VirtualMachine
+    cache = pattern.__dict__.get("_compiled")
+    compiled = None if cache is None else cache.get(engine)
+    if compiled is None:
+        with _compile_lock:
+            cache = pattern.__dict__.get("_compiled")
+            if cache is None:
+                cache = pattern._compiled = {}
+            compiled = cache.get(engine)
+            if compiled is None:
+                compiled = cache[engine] = CompiledPattern(pattern, engine)
+    return compiled
+
+
+def _match(code, iterable, keep_path=False, engine=VirtualMachine):
+    vm = engine(code, keep_path)
     m = Match()
     # Start VM
     vm.do_epsilon_transitions()
@@ -72,15 +160,51 @@ def _match(pattern, iterable, keep_path=False):
     return m
 
 
-def match(pattern, iterable, keep_path=False):
-    pattern = Group(pattern, None)
-    return _match(pattern, iterable, keep_path)
+def _instrument(pattern, stats):
+    """
+    Returns the compiled pattern and engine a call with `stats` (a
+    `MatchStats` or None) runs with: the pattern's own if it's None, a
+    `VirtualMachine` counting on `stats` otherwise.
+    """
+    if stats is None:
+        compiled = compile(pattern)
+        return compiled, compiled.engine
+    assert isinstance(stats, MatchStats)
+    stats.calls += 1
+    return compile(pattern, VirtualMachine), stats.engine
 
 
-def search(pattern, iterable):
-    assert isinstance(pattern, Pattern)
-    pattern = Star(Any(), greedy=False) + Group(pattern, None)
-    return _match(pattern, iterable)
+def match(pattern, iterable, keep_path=False, stats=None):
+    compiled, engine = _instrument(pattern, stats)
+    return _match(compiled.match_code, iterable, keep_path, engine)
+
+
+def search(pattern, iterable, stats=None):
+    compiled, engine = _instrument(pattern, stats)
+    skipped = 0
+    if compiled.first is not None:
+        skipped, iterable = _skip(compiled.first, iterable)
+        if iterable is None:
+            return None
+    m = _match(compiled.search_code, iterable, engine=engine)
+    if m is not None and skipped:
+        m.offset(skipped)
+    return m
+
+
+def _skip(test, iterable):
+    """
+    Skips the leading objects of `iterable` for which `test` doesn't hold.
+    Returns how many were skipped and the rest of `iterable` (None if
+    nothing is left).
+    """
+    iterator = iter(iterable)
+    skipped = 0
+    for x in iterator:
+        if test(x):
+            return skipped, itertools.chain((x,), iterator)
+        skipped += 1
+    return skipped, None
 
 
 def finditer_lame(pattern, sequence):
@@ -100,6 +224,141 @@ def finditer_lame(pattern, sequence):
             offset += 1
 
 
+class _Search(object):
+    """
+    A `search` that started at `offset` and is fed one symbol at a time.
+    Until it's fed a symbol for which `first` holds (if it's not None) it
+    just moves `offset` forward.
+    """
+    def __init__(self, code, offset, engine=VirtualMachine, first=None):
+        self.offset = offset
+        self.first = first
+        self.vm = engine(code)
+        self.vm.do_epsilon_transitions()
+        self.state = self.vm.accepting_state(None)
+        self.vm.cutoff()
+
+    def feed(self, x):
+        """
+        Feeds `x` to the search.
+        Returns True if a match of higher priority than the current one was
+        found, False otherwise.
+        """
+        if self.first is not None:
+            if not self.first(x):
+                self.offset += 1
+                return False
+            self.first = None
+        if not self.vm.is_alive():
+            return False
+        self.vm.feed(x)
+        self.vm.do_epsilon_transitions()
+        state = self.vm.accepting_state(None)
+        self.vm.cutoff()
+        if state is None:
+            return False
+        self.state = state
+        return True
+
+    def next_offset(self):
+        """
+        Offset where the search for the next match starts, `finditer_lame`
+        style: at the end of this match, or one past it if it is empty.
+        """
+        i, j = self.state[_start(None)], self.state[_end(None)]
+        if i == j:
+            j += 1
+        return self.offset + j
+
+    def match(self):
+        m = Match(self.state)
+        m.offset(self.offset)
+        return m
+
+
+class StreamMatcher(object):
+    """
+    Finds the matches `finditer` would find, in a stream of objects fed one
+    at a time with `feed`.
+    Each match is returned as soon as no match of higher priority is
+    possible, and objects are not kept, so memory depends on the program
+    and not on the length of the stream.
+    While a match can still grow, the search for the next match runs
+    speculatively from its current end and is dropped if the match grows.
+    If `stats` is given the work done is counted on it (see `MatchStats`).
+    """
+    def __init__(self, pattern, stats=None):
+        compiled, engine = _instrument(pattern, stats)
+        self.code = compiled.search_code
+        self.engine = engine
+        self.first = compiled.first
+        self.position = 0
+        self.tail = _Search(self.code, 0, self.engine, self.first)
+        self.searches = [self.tail]
+
+    def feed(self, x):
+        """
+        Feeds `x` to the matcher.
+        Returns a list with the matches that became final, in order.
+        """
+        self.position += 1
+        for k, search in enumerate(self.searches):
+            if search.feed(x):
+                # Searches after this one started at the previous end
+                del self.searches[k + 1:]
+                self.tail = search
+                break
+        tail = self.tail
+        if tail.state is not None and tail.next_offset() == self.position:
+            self.tail = _Search(self.code, self.position, self.engine,
+                                self.first)
+            self.searches.append(self.tail)
+        found = []
+        while self.searches and not self.searches[0].vm.is_alive():
+            search = self.searches.pop(0)
+            if search.state is None:
+                self.searches = []
+                break
+            found.append(search.match())
+        return found
+
+    def done(self):
+        """
+        Returns True if feeding more objects can't find more matches.
+        """
+        return not self.searches and self.tail.state is None
+
+    def close(self):
+        """
+        Signals the end of the stream.
+        Returns a list with the matches that were still pending, in order.
+        """
+        found = []
+        for search in self.searches:
+            if search.state is None:
+                break
+            found.append(search.match())
+        self.searches = []
+        return found
+
+
+def finditer_onepass(pattern, iterable, stats=None):
+    """
+    Finds the same leftmost, non-overlapping matches as `finditer_lame` but
+    feeds each element only once (with a `StreamMatcher`), so it works with
+    any iterable and the pattern is compiled only once.
+    Matches are yielded as soon as no higher priority match is possible.
+    """
+    matcher = StreamMatcher(pattern, stats)
+    for x in iterable:
+        for m in matcher.feed(x):
+            yield m
+        if matcher.done():
+            return
+    for m in matcher.close():
+        yield m
+
+
 def finditer_alt(pattern, iterable):
     """
     An experimental implementation of finditer.
@@ -108,7 +367,7 @@ def finditer_alt(pattern, iterable):
     This implies (among other things) that each element is feeded only once and
     then discarded.
     """
-    assert isinstance(pattern, Pattern)
+    pattern = compile(pattern).pattern
     pattern = Star(Star(Any(), greedy=False) + Group(pattern, None))
     code = pattern.compile()
     vm = VirtualMachine(code)
@@ -137,4 +396,4 @@ def finditer_alt(pattern, iterable):
         yield m
 
 
-finditer = finditer_lame
+finditer = finditer_onepass
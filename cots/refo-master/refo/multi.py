@@ -0,0 +1,118 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+from .instructions import Accept
+from .virtualmachine import RefoThread, VirtualMachine
+from .patterns import Pattern, Any, Star, Group
+from .match import Match, CompiledPattern
+
+
+def _owners(roots):
+    """
+    Maps every instruction reachable from `roots[tag]` to `tag`.
+    """
+    owner = {}
+    for tag, root in enumerate(roots):
+        pending = [root]
+        while pending:
+            x = pending.pop()
+            if x is None or x in owner:
+                continue
+            owner[x] = tag
+            pending.append(getattr(x, "succ", None))
+            pending.append(getattr(x, "split", None))
+            pending.append(getattr(x, "body", None))
+    return owner
+
+
+class MultiVirtualMachine(VirtualMachine):
+    """
+    A virtual machine running several programs side by side.
+    Each program ends in an `Accept` tagged with the program's index and
+    priority and cut-offs are handled per program, so each one matches
+    exactly as it would in a `VirtualMachine` of its own.
+    """
+    def __init__(self, roots, owner):
+        self.roots = roots
+        self.owner = owner
+        super(MultiVirtualMachine, self).__init__(None)
+
+    def reset(self):
+        self.threads = [RefoThread(root) for root in self.roots]
+
+    def accepting_states(self):
+        """
+        Returns a dict from tag to the state of the accepting thread with
+        highest priority of that program.
+        """
+        states = {}
+        for t in self.threads:
+            if t.accepts() and t.pc.tag not in states:
+                states[t.pc.tag] = t.state
+        return states
+
+    def cutoff(self):
+        """
+        Cuts-off, for every program with an accepting thread, the threads of
+        that program with lower priority than it (including itself).
+        """
+        accepted = set()
+        new = []
+        for t in self.threads:
+            tag = self.owner[t.pc]
+            if tag in accepted:
+                continue
+            if t.accepts():
+                accepted.add(tag)
+            else:
+                new.append(t)
+        self.threads = new
+
+
+class MultiPattern(object):
+    """
+    Compiles a sequence of patterns into a single program so all of them can
+    be searched for feeding each symbol only once.
+    Patterns (or compiled patterns) are identified by their index in the
+    sequence.
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.roots = []
+        for tag, pattern in enumerate(self.patterns):
+            if isinstance(pattern, CompiledPattern):
+                pattern = pattern.pattern
+            assert isinstance(pattern, Pattern)
+            pattern = Star(Any(), greedy=False) + Group(pattern, None)
+            self.roots.append(pattern._compile(Accept(tag)))
+        self.owner = _owners(self.roots)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def search(self, iterable, tags=None):
+        """
+        Searches for every pattern (or only those in `tags`) at once.
+        Returns a dict from the index of every pattern that matched to its
+        `Match`, the same one `search` would return for it.
+        """
+        if tags is None:
+            roots = self.roots
+        else:
+            roots = [self.roots[tag] for tag in sorted(tags)]
+        vm = MultiVirtualMachine(roots, self.owner)
+        # Start VM
+        vm.do_epsilon_transitions()
+        states = vm.accepting_states()
+        vm.cutoff()
+        for x in iterable:
+            if not vm.is_alive():
+                break
+            vm.feed(x)
+            vm.do_epsilon_transitions()
+            states.update(vm.accepting_states())
+            vm.cutoff()
+        return dict((tag, Match(state)) for tag, state in states.items())
@@ -0,0 +1,178 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+from .patterns import (
+    OneOf, Disjunction, Concatenation, Star, Plus, Question, Group,
+    Repetition
+)
+from .match import match, search, finditer
+from .analysis import literals
+
+
+def optimize(pattern, verify=None):
+    """
+    Returns a pattern equivalent to `pattern` that is cheaper to run:
+
+     - Disjunctions of adjacent literal predicates with the same key (see
+       `Predicate.literal`) become a single `OneOf` set lookup.
+     - Nested concatenations are flattened.
+     - Trailing sub-patterns whose preferred choice is to match nothing
+       (lazy `Star`, lazy `Question`, ...) are dropped.
+
+    Matches have the same spans and groups as those of `pattern` when the
+    pattern is used on its own, as `match`, `search` and `finditer` do (it
+    may not be so if the result is embedded in a larger pattern). Paths are
+    not kept: merged predicates return True instead of their own values.
+    Leading wildcards are kept because they change where matches start.
+
+    If `verify` is given, it must be an iterable of sequences, and both
+    patterns are checked to match the same on each of them (see
+    `check_equivalent`).
+    """
+    optimized = _optimize(pattern)
+    tail = _strip_tail(optimized)
+    if tail is not None:
+        optimized = tail
+    if verify is not None:
+        check_equivalent(pattern, optimized, verify)
+    return optimized
+
+
+def check_equivalent(pattern, other, sequences):
+    """
+    Checks that `match`, `search` and `finditer` give the same spans and
+    groups with `pattern` and `other` on every sequence of `sequences`.
+    Raises `AssertionError` on the first difference.
+    """
+    for sequence in sequences:
+        sequence = list(sequence)
+        for name, f in (("match", match), ("search", search)):
+            a = _summary(f(pattern, sequence))
+            b = _summary(f(other, sequence))
+            assert a == b, "{0} differs on {1!r}: {2} != {3}".format(
+                name, sequence, a, b)
+        a = [_summary(m) for m in finditer(pattern, sequence)]
+        b = [_summary(m) for m in finditer(other, sequence)]
+        assert a == b, "finditer differs on {0!r}: {1} != {2}".format(
+            sequence, a, b)
+
+
+def _summary(m):
+    if m is None:
+        return None
+    return sorted(((key, m[key]) for key in set(m)), key=repr)
+
+
+def _alternatives(pattern):
+    """
+    The alternatives of a tree of disjunctions, in priority order.
+    """
+    if isinstance(pattern, Disjunction):
+        return _alternatives(pattern.a) + _alternatives(pattern.b)
+    return [pattern]
+
+
+def _merge_literals(alternatives):
+    # Alternatives that consume a single object and continue at the same
+    # place can be merged if they are adjacent: their threads would be
+    # consecutive and all but the first one dropped as duplicates.
+    merged = []
+    run = []
+    key = None
+    for x in alternatives + [None]:
+        found = None if x is None else literals(x)
+        if run and (found is None or found[0] is not key):
+            if len(run) == 1:
+                merged.append(run[0])
+            else:
+                values = set()
+                for y in run:
+                    values.update(literals(y)[1])
+                merged.append(OneOf(values, key))
+            run = []
+        if found is not None:
+            key = found[0]
+            run.append(x)
+        elif x is not None:
+            merged.append(x)
+    return merged
+
+
+def _optimize(pattern):
+    if isinstance(pattern, Disjunction):
+        xs = [_optimize(x) for x in _alternatives(pattern)]
+        xs = _merge_literals(xs)
+        result = xs[-1]
+        for x in reversed(xs[:-1]):
+            result = Disjunction(x, result)
+        return result
+    if isinstance(pattern, Concatenation):
+        xs = []
+        for x in pattern.xs:
+            x = _optimize(x)
+            if isinstance(x, Concatenation):
+                xs.extend(x.xs)
+            else:
+                xs.append(x)
+        if len(xs) == 1:
+            return xs[0]
+        return Concatenation(*xs)
+    if isinstance(pattern, (Star, Plus, Question)):
+        return pattern.__class__(_optimize(pattern.x), greedy=pattern.greedy)
+    if isinstance(pattern, Group):
+        return Group(_optimize(pattern.x), pattern.key)
+    if isinstance(pattern, Repetition):
+        return Repetition(_optimize(pattern.x), pattern.mn, pattern.mx,
+                          pattern.greedy)
+    return pattern
+
+
+def _prefers_nothing(pattern):
+    """
+    True if the choice of highest priority of `pattern` is to consume
+    nothing and save nothing.
+    """
+    if isinstance(pattern, (Star, Question)):
+        return not pattern.greedy
+    if isinstance(pattern, Repetition):
+        return pattern.mn == 0 and not pattern.greedy
+    if isinstance(pattern, Concatenation):
+        return all(_prefers_nothing(x) for x in pattern.xs)
+    if isinstance(pattern, Disjunction):
+        return _prefers_nothing(pattern.a)
+    return False
+
+
+def _strip_tail(pattern):
+    """
+    Drops what does nothing at the end of `pattern`: once the thread of
+    highest priority reaches the end of the whole pattern it accepts and
+    every thread of lower priority is cut-off.
+    Returns None if all of `pattern` does nothing.
+    """
+    if _prefers_nothing(pattern):
+        return None
+    if isinstance(pattern, Concatenation):
+        xs = list(pattern.xs)
+        while _prefers_nothing(xs[-1]):
+            xs.pop()
+        last = _strip_tail(xs[-1])
+        if last is not None:
+            xs[-1] = last
+        if len(xs) == 1:
+            return xs[0]
+        return Concatenation(*xs)
+    if isinstance(pattern, Group):
+        x = _strip_tail(pattern.x)
+        if x is None:
+            return pattern
+        return Group(x, pattern.key)
+    if isinstance(pattern, Disjunction):
+        a = _strip_tail(pattern.a)
+        b = _strip_tail(pattern.b)
+        return Disjunction(pattern.a if a is None else a,
+                           pattern.b if b is None else b)
+    return pattern
@@ -5,7 +5,7 @@
 #  This file is part of REfO and is distributed under the Modified BSD License.
 #  You should have received a copy of license in the LICENSE.txt file.
 
-from .instructions import Atom, Accept, Split, Save
+from .instructions import Atom, Accept, Split, Save, Repeat, Increment
 
 
 class Pattern(object):
@@ -13,7 +13,14 @@ class Pattern(object):
         raise NotImplementedError
 
     def compile(self):
-        return self._compile(Accept())
+        """
+        Returns the code for this pattern.
+        The code is built only once, later calls return the same code.
+        """
+        code = self.__dict__.get("_code")
+        if code is None:
+            code = self._code = self._compile(Accept())
+        return code
 
     def __or__(self, other):
         return Disjunction(self, other)
@@ -46,12 +53,18 @@ class Pattern(object):
 
 
 class Predicate(Pattern):
+    # `(key, value)` if the predicate holds exactly for the objects `x` with
+    # `key(x) == value` (`x == value` if `key` is None), None otherwise.
+    # The optimizer uses it to merge disjunctions into a single `OneOf`.
+    literal = None
+
     def __init__(self, f):
         self.f = f
         self.arg = f
 
     def _compile(self, cont):
         x = Atom(self.f, succ=cont)
+        x.predicate = self
         return x
 
 
@@ -71,6 +84,34 @@ class Literal(Predicate):
         super(Literal, self).__init__(lambda y: x == y)
         self.x = x
         self.arg = x
+        try:
+            hash(x)
+        except TypeError:
+            pass
+        else:
+            self.literal = (None, x)
+
+
+class OneOf(Predicate):
+    """
+    Matches the objects `x` such that `key(x)` is in `values` (or `x` itself,
+    if `key` is None) with a single set lookup.
+    """
+    def __init__(self, values, key=None):
+        self.values = frozenset(values)
+        self.key = key
+        values = self.values
+        if key is None:
+            def f(x):
+                try:
+                    return x in values
+                except TypeError:  # Unhashable
+                    return False
+        else:
+            def f(x):
+                return key(x) in values
+        super(OneOf, self).__init__(f)
+        self.arg = sorted(self.values, key=repr)
 
 
 class Disjunction(Pattern):
@@ -200,6 +241,14 @@ class Repetition(Pattern):
         self.greedy = greedy
 
     def _compile(self, cont):
+        copies = self.mn + (1 if self.mx is None else self.mx - self.mn)
+        if copies > 1 and not _nullable(self.x):
+            # A counted loop instead of a copy of `x` per iteration. Not for
+            # `x` that can match nothing: the unrolled code lets iterations
+            # match nothing in ways the loop doesn't.
+            repeat = Repeat(self.mn, self.mx, self.greedy, succ=cont)
+            repeat.body = self.x._compile(Increment(repeat))
+            return repeat
         code = cont
         if self.mx is not None:
             q = Question(self.x, self.greedy)
@@ -226,6 +275,23 @@ class Repetition(Pattern):
         return (base + "*({1},{2})").format(self.x, self.mn, self.mx)
 
 
+def _nullable(pattern):
+    """
+    True if `pattern` may match an empty sequence (or it can't be told).
+    """
+    if isinstance(pattern, Predicate):
+        return False
+    if isinstance(pattern, (Plus, Group)):
+        return _nullable(pattern.x)
+    if isinstance(pattern, Repetition):
+        return pattern.mn == 0 or _nullable(pattern.x)
+    if isinstance(pattern, Disjunction):
+        return _nullable(pattern.a) or _nullable(pattern.b)
+    if isinstance(pattern, Concatenation):
+        return all(_nullable(x) for x in pattern.xs)
+    return True
+
+
 def _start(key):
     return (key, 0)
 
@@ -0,0 +1,355 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+from .instructions import Atom, Accept, Split, Save, Repeat, Increment
+
+# Opcodes
+ATOM = 0
+ACCEPT = 1
+SPLIT = 2
+SAVE = 3
+REPEAT = 4
+INCREMENT = 5
+
+
+class Program(object):
+    """
+    The code of a pattern flattened into arrays indexed by program counter.
+    For each pc `opcodes[pc]` is one of ATOM, ACCEPT, SPLIT, SAVE, REPEAT
+    or INCREMENT, `succ[pc]` and `split[pc]` are the pcs of the following
+    instructions (-1 if there is none, `split[pc]` is the body of a REPEAT)
+    and `args[pc]` is the comparison function of an ATOM, the slot of a
+    SAVE, the tag of an ACCEPT, `(counter, mn, mx, greedy)` for a REPEAT and
+    `(counter, limit)` for an INCREMENT.
+    Save records are numbered in `slots`, their position in that list is the
+    slot where threads keep them. Counted loops are numbered in `counters`
+    (the pcs of their REPEAT instructions), threads keep their counts after
+    the slots. `start_caps` are the captures and counts of a new thread.
+    Instruction 0 is the entry point.
+    The arrays are tuples: programs don't change once built, so threads can
+    share them.
+    """
+    def __init__(self, code):
+        self.opcodes = []
+        self.args = []
+        self.succ = []
+        self.split = []
+        self.slots = []
+        self.counters = []
+        pcs = {}
+        slots = {}
+        order = []
+        pending = [code]
+        while pending:
+            x = pending.pop()
+            if x in pcs:
+                continue
+            pcs[x] = len(order)
+            order.append(x)
+            for y in (getattr(x, "split", None), getattr(x, "body", None),
+                      getattr(x, "succ", None)):
+                if y is not None:
+                    pending.append(y)
+        counters = {}
+        for x in order:
+            if isinstance(x, Repeat):
+                counters[x] = len(self.counters)
+                self.counters.append(pcs[x])
+        for x in order:
+            if isinstance(x, Atom):
+                self.opcodes.append(ATOM)
+                self.args.append(x.comparison_function)
+            elif isinstance(x, Accept):
+                self.opcodes.append(ACCEPT)
+                self.args.append(getattr(x, "tag", None))
+            elif isinstance(x, Split):
+                self.opcodes.append(SPLIT)
+                self.args.append(None)
+            elif isinstance(x, Repeat):
+                self.opcodes.append(REPEAT)
+                self.args.append((counters[x], x.mn, x.mx, x.greedy))
+            elif isinstance(x, Increment):
+                self.opcodes.append(INCREMENT)
+                self.args.append((counters[x.succ], x.succ.limit()))
+            else:
+                assert isinstance(x, Save), "Unknown instruction"
+                if x.record not in slots:
+                    slots[x.record] = len(self.slots)
+                    self.slots.append(x.record)
+                self.opcodes.append(SAVE)
+                self.args.append(slots[x.record])
+            self.succ.append(pcs.get(getattr(x, "succ", None), -1))
+            if isinstance(x, Repeat):
+                self.split.append(pcs[x.body])
+            else:
+                self.split.append(pcs.get(getattr(x, "split", None), -1))
+        self.opcodes = tuple(self.opcodes)
+        self.args = tuple(self.args)
+        self.succ = tuple(self.succ)
+        self.split = tuple(self.split)
+        self.slots = tuple(self.slots)
+        self.counters = tuple(self.counters)
+        self.start_caps = ((None,) * len(self.slots) +
+                           (0,) * len(self.counters))
+
+    def __len__(self):
+        return len(self.opcodes)
+
+
+class SparseSet(object):
+    """
+    A set of integers in range(n) with constant time insertion, membership
+    test and clear (Briggs & Torczon).
+    """
+    __slots__ = ("dense", "sparse", "size")
+
+    def __init__(self, n):
+        self.dense = [0] * n
+        self.sparse = [0] * n
+        self.size = 0
+
+    def __contains__(self, x):
+        i = self.sparse[x]
+        return i < self.size and self.dense[i] == x
+
+    def add(self, x):
+        i = self.sparse[x]
+        if i < self.size and self.dense[i] == x:
+            return
+        self.dense[self.size] = x
+        self.sparse[x] = self.size
+        self.size += 1
+
+    def clear(self):
+        self.size = 0
+
+
+class PikeVM(object):
+    """
+    A drop-in replacement for `VirtualMachine` that runs a flattened
+    `Program`.
+    Threads are kept as parallel lists (pc, captures and path) in priority
+    order. Captures are tuples with one item per slot that threads share
+    until a Save writes on them, paths are persistent `(item, parent)`
+    pairs, and duplicated threads are detected with a `SparseSet` of pcs
+    (of pcs and counts if the program has counted loops).
+    It finds the same matches as `VirtualMachine`, with the same thread
+    priority.
+    """
+    def __init__(self, code, keep_path=False):
+        if not isinstance(code, Program):
+            code = Program(code)
+        self.program = code
+        self.path = keep_path
+        self.seen = SparseSet(len(code))
+        if code.counters:
+            self._close = self._close_counted
+        self.reset()
+
+    @classmethod
+    def prepare(cls, code):
+        """
+        Turns code into what this VM runs, so it can be done only once.
+        """
+        return Program(code)
+
+    def reset(self):
+        self.i = 0
+        self.pcs = [0]
+        self.caps = [self.program.start_caps]
+        self.paths = [None]
+        self.closed = False
+
+    def _close(self, pcs, caps, paths):
+        """
+        Follows the epsilon transitions of the threads `pcs`, `caps`,
+        `paths` (highest priority first) and keeps the resulting idle
+        threads.
+        """
+        program = self.program
+        opcodes = program.opcodes
+        args = program.args
+        succ = program.succ
+        split = program.split
+        dense = self.seen.dense
+        sparse = self.seen.sparse
+        size = 0
+        i = self.i
+        new_pcs = []
+        new_caps = []
+        new_paths = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for k in range(len(pcs)):
+            pc = pcs[k]
+            cap = caps[k]
+            path = paths[k]
+            while True:
+                j = sparse[pc]
+                if j >= size or dense[j] != pc:
+                    dense[size] = pc
+                    sparse[pc] = size
+                    size += 1
+                    op = opcodes[pc]
+                    if op == SPLIT:
+                        push((split[pc], cap))
+                        pc = succ[pc]
+                        continue
+                    elif op == SAVE:
+                        s = args[pc]
+                        cap = cap[:s] + (i,) + cap[s + 1:]
+                        pc = succ[pc]
+                        continue
+                    new_pcs.append(pc)
+                    new_caps.append(cap)
+                    new_paths.append(path)
+                if not stack:
+                    break
+                pc, cap = pop()
+        self.seen.size = 0
+        self.pcs = new_pcs
+        self.caps = new_caps
+        self.paths = new_paths
+        self.closed = True
+
+    def _close_counted(self, pcs, caps, paths):
+        """
+        Same as `_close`, for programs with counted loops: threads at the
+        same pc are duplicated only if their counts are the same too.
+        """
+        program = self.program
+        opcodes = program.opcodes
+        args = program.args
+        succ = program.succ
+        split = program.split
+        n = len(program.slots)
+        i = self.i
+        seen = set()
+        new_pcs = []
+        new_caps = []
+        new_paths = []
+        for k in range(len(pcs)):
+            path = paths[k]
+            stack = [(pcs[k], caps[k])]
+            while stack:
+                pc, cap = stack.pop()
+                key = (pc, cap[n:])
+                if key in seen:
+                    continue
+                seen.add(key)
+                op = opcodes[pc]
+                if op == SPLIT:
+                    stack.append((split[pc], cap))
+                    stack.append((succ[pc], cap))
+                elif op == SAVE:
+                    s = args[pc]
+                    stack.append((succ[pc], cap[:s] + (i,) + cap[s + 1:]))
+                elif op == REPEAT:
+                    c, mn, mx, greedy = args[pc]
+                    s = n + c
+                    count = cap[s]
+                    out = cap[:s] + (0,) + cap[s + 1:]
+                    if count < mn:
+                        stack.append((split[pc], cap))
+                    elif mx is not None and count >= mx:
+                        stack.append((succ[pc], out))
+                    elif greedy:
+                        stack.append((succ[pc], out))
+                        stack.append((split[pc], cap))
+                    else:
+                        stack.append((split[pc], cap))
+                        stack.append((succ[pc], out))
+                elif op == INCREMENT:
+                    c, limit = args[pc]
+                    s = n + c
+                    count = min(cap[s] + 1, limit)
+                    stack.append((succ[pc], cap[:s] + (count,) + cap[s + 1:]))
+                else:
+                    new_pcs.append(pc)
+                    new_caps.append(cap)
+                    new_paths.append(path)
+        self.pcs = new_pcs
+        self.caps = new_caps
+        self.paths = new_paths
+        self.closed = True
+
+    def do_epsilon_transitions(self):
+        """
+        Takes epsilon transitions until all threads are idle (waiting to
+        consume a symbol).
+        """
+        if not self.closed:
+            self._close(self.pcs, self.caps, self.paths)
+
+    def feed(self, x):
+        """
+        Feeds a symbol to every thread in the VM and takes the epsilon
+        transitions that follow.
+        It's requiered that every thread is in idle state to call this method.
+        """
+        assert self.closed
+        opcodes = self.program.opcodes
+        args = self.program.args
+        succ = self.program.succ
+        keep_path = self.path
+        pcs = []
+        caps = []
+        paths = []
+        for k, pc in enumerate(self.pcs):
+            if opcodes[pc] != ATOM:
+                continue
+            y = args[pc](x)
+            if y:
+                pcs.append(succ[pc])
+                caps.append(self.caps[k])
+                if keep_path:
+                    paths.append((y, self.paths[k]))
+                else:
+                    paths.append(None)
+        self.i += 1
+        self._close(pcs, caps, paths)
+
+    def _state(self, k):
+        slots = self.program.slots
+        # Counts come after the slots, zip leaves them out
+        state = dict((key, v) for key, v in zip(slots, self.caps[k])
+                     if v is not None)
+        if self.path:
+            state["path"] = self.paths[k]
+        return state
+
+    def accepting_state(self, default):
+        """
+        Returns the state (affected by `Save` for example) of the accepting
+        thread with highest priority or `default` if there is not such thread.
+        """
+        opcodes = self.program.opcodes
+        for k, pc in enumerate(self.pcs):
+            if opcodes[pc] == ACCEPT:
+                return self._state(k)
+        return default
+
+    def cutoff(self):
+        """
+        Looks for an accepting thread and then cuts-off threads of lower
+        priority than that (including itself).
+        If there are no accepting threads then it does nothing.
+        """
+        opcodes = self.program.opcodes
+        for k, pc in enumerate(self.pcs):
+            if opcodes[pc] == ACCEPT:
+                del self.pcs[k:]
+                del self.caps[k:]
+                del self.paths[k:]
+                return
+
+    def is_alive(self):
+        """
+        Returns True if it is still possible to make a higher priority match by
+        feeding more symbols. If not, it returns False.
+        """
+        return len(self.pcs) != 0
@@ -0,0 +1,287 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+"""
+Saving compiled patterns as JSON, so a set of patterns can be loaded from a
+file instead of being built and compiled again by every process.
+
+Patterns are stored as trees and predicates as specs: the name their class
+was registered with (see `register`) and the arguments to build them again.
+Key functions (of `OneOf` for example) are stored by registered name too.
+Code generated by `CodegenVM` is stored as well and reused when loading if
+the program it was generated for is still the same, both as source and as
+bytecode (used only by the same Python version). Loading bytecode is much
+faster than compiling the source.
+Only load files you trust: the generated code is run as it is.
+"""
+
+import base64
+import hashlib
+import json
+import marshal
+import sys
+
+from .patterns import (
+    Pattern, Predicate, Any, Literal, OneOf, Disjunction, Concatenation,
+    Star, Plus, Question, Group, Repetition
+)
+from .match import CompiledPattern, compile
+from .virtualmachine import VirtualMachine
+from .pikevm import PikeVM, ATOM
+from .codegen import GeneratedProgram, CodegenVM
+
+VERSION = 1
+
+# Bytecode is only loaded by the Python it was made by. Pythons without a
+# cache tag (Python 2 has no `sys.implementation`) store only the source
+BYTECODE_TAG = getattr(getattr(sys, "implementation", None), "cache_tag",
+                       None)
+
+ENGINES = {
+    "VirtualMachine": VirtualMachine,
+    "PikeVM": PikeVM,
+    "CodegenVM": CodegenVM,
+}
+
+# name -> (predicate class, to_spec, from_spec) or key function
+_registry = {}
+_names = {}
+
+
+def register(obj, name=None, to_spec=None, from_spec=None):
+    """
+    Makes `obj`, a `Predicate` subclass or a key function, serializable under
+    `name` (its `__name__` by default). Returns `obj`, so it can be used as
+    a class decorator.
+    Predicates are stored as `to_spec(predicate)`, a dict of JSON values, and
+    built again with `from_spec(spec)`. By default those are the predicate's
+    `spec()` method and calling the class with the spec as keyword arguments.
+    Registering another object under the same name replaces the old one.
+    """
+    if name is None:
+        name = obj.__name__
+    if isinstance(obj, type) and issubclass(obj, Predicate):
+        if to_spec is None:
+            to_spec = obj.spec
+        if from_spec is None:
+            def from_spec(spec):
+                return obj(**spec)
+        entry = (obj, to_spec, from_spec)
+    else:
+        entry = obj
+    _registry[name] = entry
+    _names[id(obj)] = name
+    return obj
+
+
+def _name(obj):
+    name = _names.get(id(obj))
+    if name is None:
+        raise ValueError("{0!r} is not registered".format(obj))
+    return name
+
+
+def _oneof_spec(predicate):
+    key = None if predicate.key is None else _name(predicate.key)
+    return {"values": sorted(predicate.values, key=repr), "key": key}
+
+
+def _oneof(spec):
+    key = spec["key"]
+    return OneOf(spec["values"], None if key is None else _registry[key])
+
+
+register(Any, to_spec=lambda predicate: {}, from_spec=lambda spec: Any())
+register(Literal, to_spec=lambda predicate: {"x": predicate.x})
+register(OneOf, to_spec=_oneof_spec, from_spec=_oneof)
+
+
+def _dump_pattern(pattern, predicates, table):
+    if isinstance(pattern, Predicate):
+        k = table.get(id(pattern))
+        if k is None:
+            entry = _registry.get(_names.get(id(type(pattern))))
+            if entry is None:
+                raise ValueError("Can't serialize {0!r}, register its "
+                                 "class".format(pattern))
+            k = table[id(pattern)] = len(predicates)
+            predicates.append({"class": _name(type(pattern)),
+                               "spec": entry[1](pattern)})
+        return k
+    if isinstance(pattern, Disjunction):
+        return {"type": "Disjunction",
+                "a": _dump_pattern(pattern.a, predicates, table),
+                "b": _dump_pattern(pattern.b, predicates, table)}
+    if isinstance(pattern, Concatenation):
+        return {"type": "Concatenation",
+                "xs": [_dump_pattern(x, predicates, table)
+                       for x in pattern.xs]}
+    node = {"type": pattern.__class__.__name__,
+            "x": _dump_pattern(pattern.x, predicates, table)}
+    if isinstance(pattern, (Star, Plus, Question)):
+        node["greedy"] = pattern.greedy
+    elif isinstance(pattern, Group):
+        if not (pattern.key is None or isinstance(pattern.key, (str, int))):
+            raise ValueError("Can't serialize group key {0!r}".format(
+                pattern.key))
+        node["key"] = pattern.key
+    else:
+        assert isinstance(pattern, Repetition), "Unknown pattern"
+        node["mn"] = pattern.mn
+        node["mx"] = pattern.mx
+        node["greedy"] = pattern.greedy
+    return node
+
+
+def _load_pattern(node, predicates):
+    if isinstance(node, int):
+        return predicates[node]
+    kind = node["type"]
+    if kind == "Disjunction":
+        return Disjunction(_load_pattern(node["a"], predicates),
+                           _load_pattern(node["b"], predicates))
+    if kind == "Concatenation":
+        return Concatenation(*[_load_pattern(x, predicates)
+                               for x in node["xs"]])
+    x = _load_pattern(node["x"], predicates)
+    if kind == "Star":
+        return Star(x, greedy=node["greedy"])
+    if kind == "Plus":
+        return Plus(x, greedy=node["greedy"])
+    if kind == "Question":
+        return Question(x, greedy=node["greedy"])
+    if kind == "Group":
+        return Group(x, node["key"])
+    assert kind == "Repetition", "Unknown pattern"
+    return Repetition(x, node["mn"], node["mx"], node["greedy"])
+
+
+def _fingerprint(program):
+    """
+    Everything the code generated for `program` depends on but the
+    predicates.
+    """
+    args = [None if op == ATOM else arg
+            for op, arg in zip(program.opcodes, program.args)]
+    shape = repr((program.opcodes, program.succ, program.split, args,
+                  len(program.slots)))
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()
+
+
+def _dump_code(code):
+    if not isinstance(code, GeneratedProgram) or code.counters:
+        # Programs with counted loops are run by `PikeVM`, no code for them
+        return None
+    stored = {"fingerprint": _fingerprint(code),
+              "source": code.get_source(False)}
+    if BYTECODE_TAG is not None:
+        data = marshal.dumps(code.get_code(False))
+        stored["bytecode"] = {"tag": BYTECODE_TAG,
+                              "data": base64.b64encode(data).decode("ascii")}
+    return stored
+
+
+def _load_code(engine, code, stored):
+    if engine is not CodegenVM:
+        return engine.prepare(code)
+    program = GeneratedProgram(code)
+    if stored is not None and stored["fingerprint"] == _fingerprint(program):
+        program.source[False] = stored["source"]
+        bytecode = stored.get("bytecode")
+        if bytecode is not None and bytecode["tag"] == BYTECODE_TAG:
+            try:
+                program.code[False] = marshal.loads(
+                    base64.b64decode(bytecode["data"]))
+            except (ValueError, EOFError, TypeError):
+                pass  # Compiled from the source instead
+    if not program.counters:
+        program.get_functions(False)
+    return program
+
+
+def to_dict(patterns, engine=None):
+    """
+    Returns the JSON-ready form of `patterns`, a list of compiled patterns
+    or patterns (compiled with `engine` first).
+    """
+    predicates = []
+    table = {}
+    items = []
+    for pattern in patterns:
+        if isinstance(pattern, Pattern) or engine is not None:
+            pattern = compile(pattern, engine)
+        names = [name for name, x in ENGINES.items() if x is pattern.engine]
+        if not names:
+            raise ValueError("Can't serialize engine {0!r}".format(
+                pattern.engine))
+        items.append({
+            "engine": names[0],
+            "pattern": _dump_pattern(pattern.pattern, predicates, table),
+            "match_code": _dump_code(pattern.match_code),
+            "search_code": _dump_code(pattern.search_code),
+        })
+    return {"version": VERSION, "predicates": predicates, "patterns": items}
+
+
+def from_dict(data):
+    """
+    Returns the list of compiled patterns stored by `to_dict`.
+    Predicates shared by patterns when saved are shared when loaded.
+    """
+    if data.get("version") != VERSION:
+        raise ValueError("Unknown version {0!r}".format(data.get("version")))
+    predicates = []
+    for item in data["predicates"]:
+        entry = _registry.get(item["class"])
+        if not isinstance(entry, tuple):
+            raise ValueError("Unknown predicate class {0!r}".format(
+                item["class"]))
+        predicates.append(entry[2](item["spec"]))
+    compiled = []
+    for item in data["patterns"]:
+        engine = ENGINES[item["engine"]]
+        pattern = _load_pattern(item["pattern"], predicates)
+        match_code = _load_code(engine, Group(pattern, None).compile(),
+                                item["match_code"])
+        search = Star(Any(), greedy=False) + Group(pattern, None)
+        search_code = _load_code(engine, search.compile(),
+                                 item["search_code"])
+        x = CompiledPattern(pattern, engine, match_code, search_code)
+        # So that `compile(pattern, engine)` finds it
+        pattern._compiled = {engine: x}
+        compiled.append(x)
+    return compiled
+
+
+def dumps(patterns, engine=None):
+    """
+    Returns `patterns` (see `to_dict`) as a JSON string.
+    """
+    return json.dumps(to_dict(patterns, engine), sort_keys=True)
+
+
+def loads(text):
+    """
+    Returns the list of compiled patterns stored in the string `text`.
+    """
+    return from_dict(json.loads(text))
+
+
+def dump(patterns, path, engine=None):
+    """
+    Saves `patterns` (see `to_dict`) to the file `path`.
+    """
+    with open(path, "w") as f:
+        f.write(dumps(patterns, engine))
+
+
+def load(path):
+    """
+    Returns the list of compiled patterns saved to the file `path`.
+    """
+    with open(path) as f:
+        return loads(f.read())
+
@@ -0,0 +1,140 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+import time
+from .virtualmachine import RefoThread, RefoThreadWithPath, VirtualMachine
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+class MatchStats(object):
+    """
+    Counts the work done by `match`, `search` and `finditer` when given as
+    their `stats` argument. The same object can be passed to several calls
+    to add up their counts:
+
+     - `calls`: calls made with it.
+     - `threads`: threads spawned (the initial ones and one per split).
+     - `epsilon_steps`: epsilon transitions taken.
+     - `peak_threads`: most threads alive at once.
+     - `evaluations`: predicates evaluated.
+     - `predicate_calls` and `predicate_time`: evaluations and seconds spent
+       in each predicate, keyed by the `Predicate` (by its function for code
+       that wasn't compiled from a pattern).
+
+    Counting is not thread-safe, use an object per thread.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.threads = 0
+        self.epsilon_steps = 0
+        self.peak_threads = 0
+        self.evaluations = 0
+        self.predicate_calls = {}
+        self.predicate_time = {}
+
+    def engine(self, code, keep_path=False):
+        """
+        Makes a VM that counts on this object, it can be used as the
+        `engine` that runs instruction code.
+        """
+        return InstrumentedVirtualMachine(code, keep_path, self)
+
+    def report(self):
+        """
+        Returns a summary as text, predicates ordered by time spent.
+        """
+        lines = [
+            "calls: {0}".format(self.calls),
+            "threads: {0}".format(self.threads),
+            "epsilon steps: {0}".format(self.epsilon_steps),
+            "peak threads: {0}".format(self.peak_threads),
+            "evaluations: {0}".format(self.evaluations),
+        ]
+        items = sorted(self.predicate_time.items(), key=lambda item: -item[1])
+        for predicate, seconds in items:
+            lines.append("  {0:.6f}s {1:8d} {2!r}".format(
+                seconds, self.predicate_calls[predicate], predicate))
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return ("MatchStats(calls={0}, threads={1}, epsilon_steps={2}, "
+                "peak_threads={3}, evaluations={4})").format(
+                    self.calls, self.threads, self.epsilon_steps,
+                    self.peak_threads, self.evaluations)
+
+
+class _Counting(object):
+    """
+    Mixin for threads that count on `stats` (a `MatchStats`) the steps
+    they take, the threads they split into and the predicates they
+    evaluate, around the thread's own methods.
+    """
+    stats = None
+
+    def step(self):
+        ret = super(_Counting, self).step()
+        self.stats.epsilon_steps += 1
+        self.stats.threads += len(ret)
+        return ret
+
+    def feed(self, x):
+        key = getattr(self.pc, "predicate", None)
+        if key is None:
+            key = getattr(self.pc, "comparison_function", None)
+        start = timer()
+        super(_Counting, self).feed(x)
+        if key is not None:
+            stats = self.stats
+            stats.evaluations += 1
+            stats.predicate_calls[key] = stats.predicate_calls.get(key, 0) + 1
+            stats.predicate_time[key] = (stats.predicate_time.get(key, 0.0) +
+                                         timer() - start)
+
+    def copy(self, pc):
+        c = super(_Counting, self).copy(pc)
+        c.stats = self.stats
+        return c
+
+
+class CountingThread(_Counting, RefoThread):
+    pass
+
+
+class CountingThreadWithPath(_Counting, RefoThreadWithPath):
+    pass
+
+
+class InstrumentedVirtualMachine(VirtualMachine):
+    """
+    A `VirtualMachine` that counts what it does on a `MatchStats`.
+    It runs counting threads and otherwise matches exactly like
+    `VirtualMachine`, which has no counting code so it runs at full speed
+    when no stats are asked for.
+    """
+    thread_class = CountingThread
+    path_thread_class = CountingThreadWithPath
+
+    def __init__(self, code, keep_path=False, stats=None):
+        if stats is None:
+            stats = MatchStats()
+        self.stats = stats
+        super(InstrumentedVirtualMachine, self).__init__(code, keep_path)
+
+    def reset(self):
+        super(InstrumentedVirtualMachine, self).reset()
+        for thread in self.threads:
+            thread.stats = self.stats
+        self.stats.threads += len(self.threads)
+        self._peak()
+
+    def _peak(self):
+        if len(self.threads) > self.stats.peak_threads:
+            self.stats.peak_threads = len(self.threads)
+
+    def do_epsilon_transitions(self):
+        super(InstrumentedVirtualMachine, self).do_epsilon_transitions()
+        self._peak()
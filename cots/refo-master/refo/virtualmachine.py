@@ -5,8 +5,28 @@
 #  This file is part of REfO and is distributed under the Modified BSD License.
 #  You should have received a copy of license in the LICENSE.txt file.
 
-import copy
-from .instructions import Atom, Accept, Split, Save
+from .instructions import Atom, Accept, Split, Save, Repeat, Increment
+
+
+def _save(saves, record, i):
+    """
+    Returns the persistent list `saves` with `record` set to `i`.
+    Only the entries newer than the previous one of `record` are rebuilt,
+    the rest is shared. A thread saves a bounded set of records (two per
+    group) so this is bounded too, however long the input.
+    """
+    newer = []
+    node = saves
+    while node is not None and node[0] != record:
+        newer.append(node)
+        node = node[2]
+    if node is not None:
+        node = node[2]
+        for r, j, _ in reversed(newer):
+            node = (r, j, node)
+    else:
+        node = saves
+    return (record, i, node)
 
 
 class RefoThread(object):
@@ -17,8 +37,14 @@ class RefoThread(object):
     """
     def __init__(self, pc):
         self.pc = pc
-        self.state = {}
+        # The `Save`s taken, as a persistent `(record, i, parent)` list
+        # (newest first) holding each record once, so copies of the thread
+        # share it instead of copying it; `state` turns it into a dict
+        self.saves = None
         self.i = 0    # FIXME: `i` is the same for every thread
+        # `(Repeat, count)` pairs of the counted loops the thread is in,
+        # innermost last
+        self.counters = ()
 
     def step(self):
         """
@@ -28,18 +54,59 @@ class RefoThread(object):
         the instruction is Split then [self, other] is returned.
         """
         assert not isinstance(self.pc, (Atom, Accept))
-        assert isinstance(self.pc, (Split, Save)), "Unknown instruction"
+        assert isinstance(self.pc, (Split, Save, Repeat, Increment)), \
+            "Unknown instruction"
         ret = []
         if isinstance(self.pc, Split):
             s1 = self.pc.succ
             s2 = self.pc.split
             self.pc = s1
             ret.append(self.copy(s2))
-        else:  # Is a Save instruction
-            self.state[self.pc.record] = self.i
+        elif isinstance(self.pc, Save):
+            self.saves = _save(self.saves, self.pc.record, self.i)
+            self.pc = self.pc.succ
+        elif isinstance(self.pc, Repeat):
+            ret.extend(self._repeat())
+        else:  # Is an Increment instruction
+            repeat, count = self.counters[-1]
+            count = min(count + 1, repeat.limit())
+            self.counters = self.counters[:-1] + ((repeat, count),)
             self.pc = self.pc.succ
         return ret
 
+    def _repeat(self):
+        """
+        Takes the `Repeat` instruction: goes on with the loop, leaves it or
+        both (splitting as `Split` does).
+        """
+        repeat = self.pc
+        outside = self.counters
+        if outside and outside[-1][0] is repeat:
+            count = outside[-1][1]
+            outside = outside[:-1]
+        else:
+            count = 0
+        inside = outside + ((repeat, count),)
+        if count < repeat.mn:
+            self.pc = repeat.body
+            self.counters = inside
+            return []
+        if repeat.mx is not None and count >= repeat.mx:
+            self.pc = repeat.succ
+            self.counters = outside
+            return []
+        if repeat.greedy:
+            other = self.copy(repeat.succ)
+            other.counters = outside
+            self.pc = repeat.body
+            self.counters = inside
+        else:
+            other = self.copy(repeat.body)
+            other.counters = inside
+            self.pc = repeat.succ
+            self.counters = outside
+        return [other]
+
     def feed(self, x):
         """
         Take a transition that involves consuming a symbol
@@ -53,10 +120,24 @@ class RefoThread(object):
 
     def copy(self, pc):
         c = self.__class__(pc)
-        c.state = copy.copy(self.state)
+        c.saves = self.saves
         c.i = self.i
+        c.counters = self.counters
         return c
 
+    @property
+    def state(self):
+        """
+        The saved positions as a dict from record to position (a new dict
+        every time).
+        """
+        state = {}
+        node = self.saves
+        while node is not None:
+            record, i, node = node
+            state[record] = i
+        return state
+
     def idle(self):
         return isinstance(self.pc, Atom) or isinstance(self.pc, Accept)
 
@@ -64,16 +145,33 @@ class RefoThread(object):
         return isinstance(self.pc, Accept)
 
     def overlaps(self, other):
-        return self.pc == other.pc
+        return self.pc == other.pc and self.counters == other.counters
 
     def is_alive(self):
         return self.pc is not None
 
 
 class RefoThreadWithPath(RefoThread):
+    """
+    A thread that also keeps the values returned by the predicates it went
+    through. The path is a persistent list of `(value, parent)` pairs
+    (newest first) so copies of the thread share it instead of copying it,
+    `Match.get_path` turns it into a list.
+    """
     def __init__(self, pc):
         super(RefoThreadWithPath, self).__init__(pc)
-        self.state["path"] = []
+        self.path = None
+
+    def copy(self, pc):
+        c = super(RefoThreadWithPath, self).copy(pc)
+        c.path = self.path
+        return c
+
+    @property
+    def state(self):
+        state = super(RefoThreadWithPath, self).state
+        state["path"] = self.path
+        return state
 
     def feed(self, x):
         """
@@ -86,18 +184,11 @@ class RefoThreadWithPath(RefoThread):
         else:
             y = self.pc.comparison_function(x)
             if y:
-                self.state["path"].append(y)
+                self.path = (y, self.path)
                 self.pc = self.pc.succ
             else:
                 self.pc = None
 
-    def copy(self, pc):
-        c = self.__class__(pc)
-        c.state = copy.copy(self.state)
-        c.state["path"] = list(c.state["path"])
-        c.i = self.i
-        return c
-
 
 class VirtualMachine(object):
     """
@@ -111,17 +202,31 @@ class VirtualMachine(object):
     If the code has epsilon-cycles, ie, cyles of instructions that do not
     consume symbols then a thread running over that cycle does only one
     iteration and then is dropped(removed from the thread pool).
+    Subclasses can run other kinds of threads (counting ones for example)
+    by overriding `thread_class` and `path_thread_class`.
     """
+    thread_class = RefoThread
+    path_thread_class = RefoThreadWithPath
+
     def __init__(self, code, keep_path=False):
         self.code = code
         self.path = keep_path
         self.reset()
 
+    @classmethod
+    def prepare(cls, code):
+        """
+        Turns code into what this VM runs, so it can be done only once.
+        Every VM class (an "engine") has this method, this one runs the
+        instruction graph as it is.
+        """
+        return code
+
     def reset(self):
         if self.path:
-            thread = RefoThreadWithPath(self.code)
+            thread = self.path_thread_class(self.code)
         else:
-            thread = RefoThread(self.code)
+            thread = self.thread_class(self.code)
         self.threads = [thread]
 
     def do_epsilon_transitions(self):
@@ -130,6 +235,7 @@ class VirtualMachine(object):
         consume a symbol).
         """
         new = []
+        added = set()
         current = self.threads
         current.reverse()
         # In this cycle the last thread in `current` has highest priority
@@ -137,11 +243,12 @@ class VirtualMachine(object):
         while current:
             thread = current.pop()
             if thread.idle():
-                self._add(new, thread)
+                self._add(new, thread, added)
             else:
-                if thread.pc in seen:
+                key = (thread.pc, thread.counters)
+                if key in seen:
                     continue
-                seen.add(thread.pc)
+                seen.add(key)
                 split = thread.step()
                 for t in split:
                     current.append(t)
@@ -156,9 +263,10 @@ class VirtualMachine(object):
         It's requiered that every thread is in idle state to call this method.
         """
         new = []
+        added = set()
         for thread in self.threads:
             thread.feed(x)
-            self._add(new, thread)
+            self._add(new, thread, added)
         self.threads = new
 
     def accepting_state(self, default):
@@ -189,14 +297,20 @@ class VirtualMachine(object):
         """
         return len(self.threads) != 0
 
-    def _add(self, xs, thread):
+    def _add(self, xs, thread, added):
         """
         Adds a thread `thread` to a thread queue `xs` unless `thread` has
         stopped or it overlaps with another thread in `xs`.
+        `added` is the set of `(pc, counters)` of the threads in `xs`, so
+        checking for overlaps takes constant time however many threads
+        there are (a `MultiVirtualMachine` runs the threads of many programs).
         """
         # This "dropping" of some threads is what makes this algorithm to be
         # polynomial and not exponential in complexity, because this way it's
         # ensured that there will never be more threads than instructions in
         # the code.
-        if thread.is_alive() and all(not thread.overlaps(x) for x in xs):
-            xs.append(thread)
+        if thread.is_alive():
+            key = (thread.pc, thread.counters)
+            if key not in added:
+                added.add(key)
+                xs.append(thread)
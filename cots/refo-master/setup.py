@@ -2,47 +2,17 @@
 import sys
 
 
-def setup_python3():
-    # Taken from "distribute" setup.py
-    from distutils.filelist import FileList
-    from distutils import dir_util, file_util, util, log
-    from os.path import join, exists
-
-    tmp_src = join("build", "src")
-    # Not covered by "setup.py clean --all", so explicit deletion required.
-    if exists(tmp_src):
-        dir_util.remove_tree(tmp_src)
-    log.set_verbosity(1)
-    fl = FileList()
-    for line in open("MANIFEST.in"):
-        if not line.strip():
-            continue
-        fl.process_template_line(line)
-    dir_util.create_tree(tmp_src, fl.files)
-    outfiles_2to3 = []
-    for f in fl.files:
-        outf, copied = file_util.copy_file(f, join(tmp_src, f), update=1)
-        if copied and outf.endswith(".py"):
-            outfiles_2to3.append(outf)
-    util.run_2to3(outfiles_2to3)
-    # arrange setup to use the copy
-    sys.path.insert(0, tmp_src)
-    return tmp_src
-
 kwargs = {}
 
-if sys.version_info[0] >= 3:
+# The code runs unchanged on Python 2 and 3, it isn't converted with 2to3
+# (which setuptools no longer supports)
+try:
     from setuptools import setup
     assert setup
-    kwargs['use_2to3'] = True
-    kwargs['src_root'] = setup_python3()
-else:
-    try:
-        from setuptools import setup
+    if sys.version_info[0] < 3:
         kwargs['test_suite'] = "nose.collector"
-        assert setup
-    except ImportError:
-        from distutils.core import setup
+except ImportError:
+    from distutils.core import setup
 
 
 config = dict(
@@ -0,0 +1,11 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+import sys
+from os.path import abspath, dirname
+
+# The tests import helpers that live next to them (`differential`)
+sys.path.insert(0, abspath(dirname(__file__)))
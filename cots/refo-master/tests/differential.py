@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+"""
+Differential testing of the refo engines.
+
+Generates random patterns (every combinator, greedy and lazy) and random
+sequences, runs them through every engine and compares spans, group
+captures and paths with the reference: a backtracking matcher, apart from
+the engines, with the semantics of the original refo. Failing cases are
+shrunk to a small pattern and sequence before they are reported. The time each engine takes
+to prepare (compile) and to run the same inputs is reported too, with the
+speed of running relative to the reference:
+
+    python tests/differential.py --seed 0 --count 2000
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import sys
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..")))
+
+import refo  # noqa: E402
+from refo import (  # noqa: E402
+    Predicate, Any, Literal, OneOf, Disjunction, Concatenation, Star, Plus,
+    Question, Group, Repetition
+)
+from refo.match import _match, finditer_lame  # noqa: E402
+from refo.virtualmachine import VirtualMachine  # noqa: E402
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SYMBOLS = "abc"
+
+
+class Pair(Predicate):
+    """
+    Holds for "a" and "b", returns the symbol doubled (so paths show what
+    the predicate returned, not just that it held).
+    """
+    def __init__(self):
+        super(Pair, self).__init__(lambda x: x * 2 if x in "ab" else None)
+
+    def __repr__(self):
+        return "Pair()"
+
+
+def atoms():
+    return [Literal("a"), Literal("b"), Literal("c"), Any(), Pair(),
+            OneOf("bc")]
+
+
+def random_pattern(rng, depth=4):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(atoms())
+    kind = rng.randrange(7)
+    greedy = rng.random() < 0.5
+    if kind == 0:
+        return random_pattern(rng, depth - 1) + random_pattern(rng, depth - 1)
+    if kind == 1:
+        return random_pattern(rng, depth - 1) | random_pattern(rng, depth - 1)
+    if kind == 2:
+        return Star(random_pattern(rng, depth - 1), greedy=greedy)
+    if kind == 3:
+        return Plus(random_pattern(rng, depth - 1), greedy=greedy)
+    if kind == 4:
+        return Question(random_pattern(rng, depth - 1), greedy=greedy)
+    if kind == 5:
+        return Group(random_pattern(rng, depth - 1), rng.choice("xyz"))
+    mn = rng.randrange(4)
+    mx = None if rng.random() < 0.3 else mn + rng.randrange(4)
+    return Repetition(random_pattern(rng, depth - 1), mn, mx, greedy=greedy)
+
+
+def random_sequence(rng, length=20):
+    return "".join(rng.choice(SYMBOLS) for _ in range(rng.randrange(length)))
+
+
+def summary(m):
+    """
+    What is compared of a match: the span of every group and the path.
+    """
+    if m is None:
+        return None
+    spans = sorted((repr(key), i) for key, i in m.state.items()
+                   if key != "path")
+    if "path" in m.state:
+        return spans, m.get_path()
+    return spans
+
+
+# The reference is a backtracking matcher written apart from refo's engines
+# (which this series rewrote: shared paths, counted loops, ...). It runs
+# the instruction graph the original refo compiled patterns to, with
+# `Repetition` unrolled into copies of the pattern, and finds the match of
+# highest priority by trying alternatives in priority order, as a Pike VM
+# does. A node reached again at the same position is dropped: either a
+# higher priority thread got there first (the VM keeps only one) or it's an
+# epsilon-cycle (the VM drops the thread).
+
+def _node(kind, *args):
+    return [kind] + list(args)
+
+
+def _build(pattern, cont):
+    if isinstance(pattern, Predicate):
+        return _node("atom", pattern.f, cont)
+    if isinstance(pattern, Disjunction):
+        return _node("split", _build(pattern.a, cont), _build(pattern.b, cont))
+    if isinstance(pattern, Concatenation):
+        for x in reversed(pattern.xs):
+            cont = _build(x, cont)
+        return cont
+    if isinstance(pattern, (Star, Plus)):
+        split = _node("split", None, None)
+        x = _build(pattern.x, split)
+        split[1:] = [x, cont] if pattern.greedy else [cont, x]
+        return split if isinstance(pattern, Star) else x
+    if isinstance(pattern, Question):
+        x = _build(pattern.x, cont)
+        if pattern.greedy:
+            return _node("split", x, cont)
+        return _node("split", cont, x)
+    if isinstance(pattern, Group):
+        end = _node("save", (pattern.key, 1), cont)
+        return _node("save", (pattern.key, 0), _build(pattern.x, end))
+    if isinstance(pattern, Repetition):
+        if pattern.mx is None:
+            cont = _build(Star(pattern.x, pattern.greedy), cont)
+        else:
+            for _ in range(pattern.mx - pattern.mn):
+                cont = _build(Question(pattern.x, pattern.greedy), cont)
+        for _ in range(pattern.mn):
+            cont = _build(pattern.x, cont)
+        return cont
+    raise TypeError("Unknown pattern {0!r}".format(pattern))
+
+
+def _backtrack(code, sequence):
+    """
+    Returns `(saves, path)` of the match of highest priority of `code` at
+    the start of `sequence` or None.
+    """
+    stack = [(code, 0, (), ())]
+    visited = set()
+    while stack:
+        node, i, saves, path = stack.pop()
+        if (id(node), i) in visited:
+            continue
+        visited.add((id(node), i))
+        kind = node[0]
+        if kind == "accept":
+            return dict(saves), list(path)
+        if kind == "atom":
+            if i < len(sequence):
+                y = node[1](sequence[i])
+                if y:
+                    stack.append((node[2], i + 1, saves, path + (y,)))
+        elif kind == "split":
+            stack.append((node[2], i, saves, path))
+            stack.append((node[1], i, saves, path))
+        else:  # save
+            stack.append((node[2], i, saves + ((node[1], i),), path))
+    return None
+
+
+def _summary(found, offset=0, keep_path=False):
+    if found is None:
+        return None
+    saves, path = found
+    spans = sorted((repr(key), i + offset) for key, i in saves.items())
+    if keep_path:
+        return spans, path
+    return spans
+
+
+def reference(pattern):
+    match = _build(Group(pattern, None), _node("accept"))
+    search = _build(Star(Any(), greedy=False) + Group(pattern, None),
+                    _node("accept"))
+
+    def run(sequence):
+        found = []
+        offset = 0
+        while offset <= len(sequence):
+            m = _backtrack(search, sequence[offset:])
+            if m is None:
+                break
+            found.append(_summary(m, offset))
+            i, j = m[0][(None, 0)], m[0][(None, 1)]
+            offset += j if i < j else j + 1
+        return {
+            "match": _summary(_backtrack(match, sequence), keep_path=True),
+            "search": _summary(_backtrack(search, sequence)),
+            "finditer": found,
+        }
+    return run
+
+
+def lame(pattern):
+    # refo's own plain VM and `finditer_lame`, the simplest of its engines
+    match = Group(pattern, None).compile()
+    search = (Star(Any(), greedy=False) + Group(pattern, None)).compile()
+
+    def run(sequence):
+        return {
+            "match": summary(_match(match, sequence, True, VirtualMachine)),
+            "search": summary(_match(search, sequence)),
+            "finditer": [summary(m) for m in finditer_lame(pattern,
+                                                           sequence)],
+        }
+    return run
+
+
+def compiled_engine(engine):
+    def prepare(pattern):
+        compiled = refo.compile(pattern, engine)
+
+        def run(sequence):
+            return {
+                "match": summary(compiled.match(sequence, keep_path=True)),
+                "search": summary(compiled.search(sequence)),
+                "finditer": [summary(m) for m in compiled.finditer(sequence)],
+            }
+        return run
+    return prepare
+
+
+def dfa(pattern):
+    compiled = refo.DFAPattern(pattern)
+
+    def run(sequence):
+        return {
+            "match": summary(compiled.match(sequence, keep_path=True)),
+            "search": summary(compiled.search(sequence)),
+            "finditer": [summary(m) for m in compiled.finditer(sequence)],
+        }
+    return run
+
+
+def optimized(pattern):
+    return compiled_engine(None)(refo.optimize(pattern))
+
+
+def multi(pattern):
+    # Next to another pattern, which must not change how this one matches
+    matcher = refo.MultiPattern([pattern, Plus(Literal("a"))])
+
+    def run(sequence):
+        return {"search": summary(matcher.search(sequence).get(0))}
+    return run
+
+
+def bulk(pattern):
+    def run(sequence):
+        xs = refo.finditer_many(pattern, [sequence])[0]
+        return {"finditer": [summary(m) for m in xs]}
+    return run
+
+
+# Name -> function that prepares a pattern (compiles it for example) and
+# returns a function that runs it on a sequence and returns the results to
+# compare. Engines can leave out results they don't have.
+ENGINES = {
+    "lame": lame,
+    "vm": compiled_engine(None),
+    "pike": compiled_engine(refo.PikeVM),
+    "codegen": compiled_engine(refo.CodegenVM),
+    "dfa": dfa,
+    "optimize": optimized,
+    "multi": multi,
+}
+if numpy is not None:
+    ENGINES["bulk"] = bulk
+
+
+def _results(prepare, pattern, sequence, seconds=None):
+    start = time.time()
+    run = prepare(pattern)
+    middle = time.time()
+    results = run(sequence)
+    if seconds is not None:
+        seconds[0] += middle - start
+        seconds[1] += time.time() - middle
+    return results
+
+
+def differences(pattern, sequence, engines, expected=None, seconds=None):
+    """
+    Returns a list of `(engine, result, expected, got)` for every result of
+    the engines (a dict like `ENGINES`) that differs from the reference.
+    If `seconds` is given the time spent preparing and running is added to
+    `seconds[name]` (a list of the two) for each engine.
+    """
+    if expected is None:
+        expected = _results(reference, pattern, sequence)
+    found = []
+    for name, prepare in sorted(engines.items()):
+        try:
+            results = _results(prepare, pattern, sequence,
+                               seconds and seconds[name])
+        except Exception as e:
+            found.append((name, "error", None, repr(e)))
+            continue
+        for key, got in sorted(results.items()):
+            if got != expected[key]:
+                found.append((name, key, expected[key], got))
+    return found
+
+
+def _smaller_patterns(pattern):
+    """
+    Patterns one step simpler than `pattern`.
+    """
+    if isinstance(pattern, Predicate):
+        if not isinstance(pattern, Literal):
+            yield Literal("a")
+        return
+    if isinstance(pattern, Disjunction):
+        children = [pattern.a, pattern.b]
+    elif isinstance(pattern, Concatenation):
+        children = list(pattern.xs)
+    else:
+        children = [pattern.x]
+    for child in children:
+        yield child
+    if isinstance(pattern, Concatenation) and len(children) > 2:
+        for k in range(len(children)):
+            yield Concatenation(*(children[:k] + children[k + 1:]))
+    if isinstance(pattern, Repetition):
+        if pattern.mx is None:
+            yield Repetition(pattern.x, pattern.mn, pattern.mn + 1,
+                             pattern.greedy)
+        elif pattern.mx > pattern.mn:
+            yield Repetition(pattern.x, pattern.mn, pattern.mx - 1,
+                             pattern.greedy)
+        if pattern.mn > 0:
+            yield Repetition(pattern.x, pattern.mn - 1, pattern.mx,
+                             pattern.greedy)
+    for k, child in enumerate(children):
+        for smaller in _smaller_patterns(child):
+            xs = children[:k] + [smaller] + children[k + 1:]
+            yield _rebuild(pattern, xs)
+
+
+def _rebuild(pattern, children):
+    if isinstance(pattern, Disjunction):
+        return Disjunction(*children)
+    if isinstance(pattern, Concatenation):
+        return Concatenation(*children)
+    x, = children
+    if isinstance(pattern, Group):
+        return Group(x, pattern.key)
+    if isinstance(pattern, Repetition):
+        return Repetition(x, pattern.mn, pattern.mx, pattern.greedy)
+    return pattern.__class__(x, greedy=pattern.greedy)
+
+
+def _size(pattern):
+    # Literals are the simplest predicates and lower bounds count, so every
+    # pattern `_smaller_patterns` yields is smaller
+    if isinstance(pattern, Literal):
+        return 1
+    if isinstance(pattern, Predicate):
+        return 2
+    if isinstance(pattern, Disjunction):
+        return 1 + _size(pattern.a) + _size(pattern.b)
+    if isinstance(pattern, Concatenation):
+        return 1 + sum(_size(x) for x in pattern.xs)
+    if isinstance(pattern, Repetition):
+        mx = pattern.mn + 2 if pattern.mx is None else pattern.mx
+        return 1 + pattern.mn + mx + _size(pattern.x)
+    return 1 + _size(pattern.x)
+
+
+def shrink(pattern, sequence, fails):
+    """
+    Returns the smallest pattern and sequence found, by removing parts one
+    at a time, for which `fails(pattern, sequence)` still holds.
+    """
+    progress = True
+    while progress:
+        progress = False
+        for k in range(len(sequence)):
+            shorter = sequence[:k] + sequence[k + 1:]
+            if fails(pattern, shorter):
+                sequence = shorter
+                progress = True
+                break
+        for smaller in _smaller_patterns(pattern):
+            if _size(smaller) < _size(pattern) and fails(smaller, sequence):
+                pattern = smaller
+                progress = True
+                break
+    return pattern, sequence
+
+
+def run(seed, count, engines=None):
+    """
+    Tests `count` random cases. Returns the failures, as a list of
+    `(pattern, sequence, differences)` shrunk, and the seconds each engine
+    (the reference under None) took to prepare and to run the cases.
+    """
+    if engines is None:
+        engines = ENGINES
+    rng = random.Random(seed)
+    seconds = dict((name, [0.0, 0.0]) for name in [None] + list(engines))
+    failures = []
+    for _ in range(count):
+        pattern = random_pattern(rng)
+        sequence = random_sequence(rng)
+        expected = _results(reference, pattern, sequence, seconds[None])
+        for name in engines:
+            one = {name: engines[name]}
+            if differences(pattern, sequence, one, expected, seconds):
+                def fails(p, s, one=one):
+                    return bool(differences(p, s, one))
+                p, s = shrink(pattern, sequence, fails)
+                failures.append((p, s, differences(p, s, one)))
+    return failures, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compares the refo engines on random patterns")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES),
+                        default=sorted(ENGINES))
+    cfg = parser.parse_args(argv)
+
+    engines = dict((name, ENGINES[name]) for name in cfg.engines)
+    failures, seconds = run(cfg.seed, cfg.count, engines)
+    for pattern, sequence, found in failures:
+        print("FAIL {0!r} on {1!r}".format(pattern, sequence))
+        for name, key, expected, got in found:
+            print("  {0} {1}: expected {2!r}, got {3!r}".format(
+                name, key, expected, got))
+    # Speed is relative to the reference, running only (not preparing)
+    print("{0:10} {1:>10} {2:>10} {3:>8}".format(
+        "engine", "prepare", "run", "speed"))
+    base = seconds[None][1]
+    for name in [None] + sorted(engines):
+        prepare, running = seconds[name]
+        print("{0:10} {1:9.3f}s {2:9.3f}s {3:8.2f}".format(
+            name or "reference", prepare, running,
+            base / max(running, 1e-9)))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+import random
+import sys
+import threading
+import unittest
+import refo
+
+THREADS = 8
+ROUNDS = 10
+
+
+def summary(m):
+    if m is None:
+        return None
+    return sorted((repr(key), m[key]) for key in m)
+
+
+def hammer(f, args):
+    """
+    Runs `f(arg)` for every `arg` in `args` from `THREADS` threads at once,
+    `ROUNDS` times in each thread.
+    Returns the results of every thread (a list per thread) and the
+    exceptions raised.
+    """
+    start = threading.Event()
+    results = [None] * THREADS
+    errors = []
+
+    def run(k):
+        start.wait()
+        try:
+            results[k] = [[f(arg) for arg in args] for _ in range(ROUNDS)]
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(k,))
+               for k in range(THREADS)]
+    for t in threads:
+        t.start()
+    start.set()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+class TestConcurrency(unittest.TestCase):
+    a = refo.Literal("a")
+    b = refo.Literal("b")
+    c = refo.Literal("c")
+
+    def setUp(self):
+        # Switch threads as often as possible
+        if hasattr(sys, "getswitchinterval"):
+            self.interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-5)
+        rng = random.Random(0)
+        self.strings = ["".join(rng.choice("abc") for _ in range(30))
+                        for _ in range(10)]
+
+    def tearDown(self):
+        if hasattr(sys, "getswitchinterval"):
+            sys.setswitchinterval(self.interval)
+
+    def patterns(self):
+        return [
+            refo.Group(self.a + refo.Star(self.b | self.c), "x") + self.a,
+            refo.Star(refo.Any(), greedy=False) + self.b + self.c * (1, 3),
+            refo.Plus(self.a | self.b, greedy=False) + refo.Group(self.c, 1),
+        ]
+
+    def check(self, f, expected=None):
+        if expected is None:
+            expected = [f(s) for s in self.strings]
+        results, errors = hammer(f, self.strings)
+        self.assertEqual(errors, [])
+        for result in results:
+            for xs in result:
+                self.assertEqual(xs, expected)
+
+    def test_shared_compiled_pattern(self):
+        for engine in (None, refo.PikeVM, refo.CodegenVM):
+            for regexptn in self.patterns():
+                compiled = refo.compile(regexptn, engine)
+
+                def f(s):
+                    return (summary(compiled.match(s)),
+                            summary(compiled.search(s)),
+                            [summary(m) for m in compiled.finditer(s)])
+                self.check(f)
+
+    def test_shared_dfa(self):
+        for regexptn in self.patterns():
+            # Few states, so they are dropped all the time
+            dfa = refo.DFAPattern(regexptn, max_states=3)
+
+            def f(s):
+                return (summary(dfa.match(s)), summary(dfa.search(s)),
+                        [summary(m) for m in dfa.finditer(s)])
+            self.check(f)
+
+    def test_shared_multipattern(self):
+        matcher = refo.MultiPattern(self.patterns())
+
+        def f(s):
+            found = matcher.search(s)
+            return sorted((tag, summary(m)) for tag, m in found.items())
+        self.check(f)
+
+    def test_compile_once(self):
+        for engine in (None, refo.PikeVM, refo.CodegenVM):
+            regexptn = self.patterns()[0]
+            results, errors = hammer(
+                lambda _: refo.compile(regexptn, engine), [None])
+            self.assertEqual(errors, [])
+            compiled = set(id(x) for result in results
+                           for xs in result for x in xs)
+            self.assertEqual(len(compiled), 1)
+
+    def test_codegen_keep_path(self):
+        # The code that keeps paths is generated by the first thread to
+        # need it
+        regexptn = refo.Group(refo.Plus(self.a | self.b), "x") + self.c
+        compiled = refo.compile(regexptn, refo.CodegenVM)
+        expected = []
+        for s in self.strings:
+            m = refo.match(regexptn, s, keep_path=True)
+            expected.append(m and m.get_path())
+
+        def f(s):
+            m = compiled.match(s, keep_path=True)
+            return m and m.get_path()
+        self.check(f, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
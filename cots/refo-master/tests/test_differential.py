@@ -0,0 +1,57 @@
+#  Copyright (c) 2026, the kgRobot contributors.
+#
+#  This file extends REfO (Copyright (c) 2012, Machinalis S.R.L.) and is
+#  distributed under the same Modified BSD License.
+#  You should have received a copy of license in the LICENSE.txt file.
+
+import unittest
+import refo
+from differential import ENGINES, reference, run, summary, _size
+
+
+def broken(pattern):
+    # Loses the last match of sequences with a "c"
+    def run(sequence):
+        xs = list(refo.finditer(pattern, sequence))
+        if "c" in sequence:
+            xs = xs[:-1]
+        return {"finditer": [summary(m) for m in xs]}
+    return run
+
+
+class TestDifferential(unittest.TestCase):
+    def test_engines_agree(self):
+        failures, seconds = run(0, 200)
+        self.assertEqual(failures, [])
+        self.assertEqual(set(seconds), set([None]) | set(ENGINES))
+
+    def test_reference(self):
+        a = refo.Literal("a")
+        b = refo.Literal("b")
+        found = reference(refo.Group(refo.Plus(a), "x") + b)("aabab")
+        self.assertEqual(found["match"], (
+            [("('x', 0)", 0), ("('x', 1)", 2), ("(None, 0)", 0),
+             ("(None, 1)", 3)], [True, True, True]))
+        self.assertEqual([spans[2:] for spans in found["finditer"]],
+                         [[("(None, 0)", 0), ("(None, 1)", 3)],
+                          [("(None, 0)", 3), ("(None, 1)", 5)]])
+        # An empty match moves the next search one symbol forward
+        found = reference(refo.Star(a, greedy=False))("ab")
+        self.assertEqual(len(found["finditer"]), 3)
+        # A loop whose body matched nothing is not taken again
+        found = reference(refo.Star(refo.Question(a)) + b)("b")
+        self.assertEqual(found["search"], [("(None, 0)", 0), ("(None, 1)", 1)])
+
+    def test_shrink(self):
+        failures, _ = run(0, 20, {"broken": broken})
+        self.assertNotEqual(failures, [])
+        for pattern, sequence, found in failures:
+            self.assertIn("c", sequence)
+            self.assertLessEqual(len(sequence), 2)
+            self.assertLessEqual(_size(pattern), 2)
+            self.assertEqual([(x[0], x[1]) for x in found],
+                             [("broken", "finditer")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,8 +8,17 @@
 import unittest
 import refo
 from refo.match import Match, match as refomatch
+from refo.match import finditer_lame, finditer_onepass
+from refo.optimize import check_equivalent
+from refo.analysis import requirements, first_predicates
+from refo.bulk import finditer_many, Corpus
+from refo import serialize
 import re
 import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def isprime(x):
@@ -137,6 +146,342 @@ class TestRefoModule(unittest.TestCase):
         strxs = [x.span(1) for x in strxs]
         self.assert_(xs == strxs)
 
+    def test_finditer_onepass1(self):
+        tab = self.a + self.b
+        regexptn = tab * (2, None) + refo.Group(refo.Plus(self.b), "foobar")
+        xs = list(finditer_lame(regexptn, self.seq))
+        ys = list(finditer_onepass(regexptn, iter(self.seq)))
+        self._eq_list_n_stuff(xs, ys)
+        xs = [x.group("foobar") for x in xs]
+        ys = [y.group("foobar") for y in ys]
+        self.assertEqual(xs, ys)
+
+    def test_finditer_onepass2(self):
+        # Empty matches and matches that keep growing after a shorter one
+        a = refo.Literal("a")
+        b = refo.Literal("b")
+        string = "aabaaabbbabaab"
+        regexes = [refo.Star(a),
+                   refo.Question(b, greedy=False),
+                   (a + refo.Star(refo.Any()) + b) | a,
+                   refo.Plus(a, greedy=False) + refo.Star(b),
+                   refo.Group(a * (1, 2), "x") + refo.Star(b, greedy=False)]
+        for regexptn in regexes:
+            xs = [x.span() for x in finditer_lame(regexptn, string)]
+            ys = [y.span() for y in finditer_onepass(regexptn, iter(string))]
+            self.assertEqual(xs, ys)
+
+    def test_compile(self):
+        tab = self.a + self.b
+        regexptn = tab * (2, None) + refo.Group(refo.Plus(self.b), "foobar")
+        compiled = refo.compile(regexptn)
+        self.assertTrue(refo.compile(regexptn) is compiled)
+        self.assertTrue(refo.compile(compiled) is compiled)
+        self.assertTrue(regexptn.compile() is regexptn.compile())
+        self.assertEqual(compiled.search(self.seq).span(),
+                         refo.search(regexptn, self.seq).span())
+        self.assertEqual(refo.search(compiled, self.seq).span(),
+                         refo.search(regexptn, self.seq).span())
+        xs = list(compiled.finditer(self.seq))
+        ys = list(finditer_lame(compiled, self.seq))
+        self._eq_list_n_stuff(xs, ys)
+        self.assertEqual(compiled.match(self.seq), None)
+        m = refomatch(refo.compile(self.b + self.b), self.seq)
+        self.assertEqual(m.span(), (0, 2))
+
+    def test_multipattern(self):
+        tab = self.a + self.b
+        aba = tab + self.a
+        regexes = [self.a + self.b + self.b + self.b + self.a,
+                   aba + self.b * 3 + aba,
+                   tab * 2 + refo.Group(refo.Plus(self.b), "foobar"),
+                   self.b * 50]
+        multi = refo.MultiPattern(regexes)
+        ms = multi.search(self.seq)
+        self.assertEqual(sorted(ms), [0, 1, 2])
+        for i, regexptn in enumerate(regexes[:3]):
+            m = refo.search(regexptn, self.seq)
+            self.assertEqual(ms[i].span(), m.span())
+        self.assertEqual(ms[2].span("foobar"), m.span("foobar"))
+        ms = multi.search(self.seq, tags=[1, 3])
+        self.assertEqual(sorted(ms), [1])
+        # The VM honours the single-program API too: the highest priority
+        # accepting thread, whatever program it belongs to
+        vm = refo.multi.MultiVirtualMachine(multi.roots, multi.owner)
+        vm.do_epsilon_transitions()
+        self.assertEqual(vm.accepting_state("none"), "none")
+        for x in self.seq:
+            vm.feed(x)
+            vm.do_epsilon_transitions()
+            states = vm.accepting_states()
+            if states:
+                break
+        accepting = [t.state for t in vm.threads if t.accepts()]
+        self.assertEqual(vm.accepting_state(None), accepting[0])
+        self.assertIn(accepting[0], list(states.values()))
+
+    def test_pikevm(self):
+        tab = self.a + self.b
+        regexes = [self.b + self.b + self.a + self.a + self.b,
+                   tab * (2, 5),
+                   tab * (2, None) + refo.Group(refo.Plus(self.b), "foobar"),
+                   tab * 2 + refo.Plus(self.b, greedy=False)]
+        for regexptn in regexes:
+            compiled = refo.compile(regexptn, refo.PikeVM)
+            self.assertEqual(compiled.engine, refo.PikeVM)
+            self.assertEqual(compiled.search(self.seq).span(),
+                             refo.search(regexptn, self.seq).span())
+            xs = list(compiled.finditer(self.seq))
+            ys = list(refo.finditer(regexptn, self.seq))
+            self._eq_list_n_stuff(xs, ys)
+            self.assertEqual([x.state for x in xs], [y.state for y in ys])
+
+    def test_pikevm_path(self):
+        seq = [[1, 2], [1], [1, 2, 3], [1, 2], [2, 3], [0, 4, 5], []]
+        regexptn = refo.Star(self.y) + refo.Plus(self.x + self.z)
+        compiled = refo.compile(regexptn, refo.PikeVM)
+        m = refomatch(compiled, seq, keep_path=True)
+        self.assertEqual([4, 1, 9, 1, 9], m.get_path())
+
+    def test_codegen(self):
+        tab = self.a + self.b
+        regexes = [self.b + self.b + self.a + self.a + self.b,
+                   tab * (2, 5),
+                   tab * (2, None) + refo.Group(refo.Plus(self.b), "foobar"),
+                   tab * 2 + refo.Plus(self.b, greedy=False)]
+        for regexptn in regexes:
+            compiled = refo.compile(regexptn, refo.CodegenVM)
+            m = refomatch(regexptn, self.seq)
+            codegenm = compiled.match(self.seq)
+            if m is None:
+                self.assertEqual(codegenm, None)
+            else:
+                self.assertEqual(codegenm.state, m.state)
+            xs = list(compiled.finditer(self.seq))
+            ys = list(refo.finditer(regexptn, self.seq))
+            self.assertEqual([x.state for x in xs], [y.state for y in ys])
+
+    def test_codegen_path(self):
+        seq = [[1, 2], [1], [1, 2, 3], [1, 2], [2, 3], [0, 4, 5], []]
+        regexptn = refo.Star(self.y) + refo.Plus(self.x + self.z)
+        compiled = refo.compile(regexptn, refo.CodegenVM)
+        m = refomatch(compiled, seq, keep_path=True)
+        self.assertEqual([4, 1, 9, 1, 9], m.get_path())
+        self.assertIn(True, compiled.match_code.source)
+
+    def test_dfa(self):
+        tab = self.a + self.b
+        regexes = [self.b + self.b + self.a + self.a + self.b,
+                   tab * (2, 5),
+                   tab * (2, None) + refo.Group(refo.Plus(self.b), "foobar"),
+                   tab * 2 + refo.Plus(self.b, greedy=False)]
+        for regexptn in regexes:
+            dfa = refo.DFAPattern(regexptn, max_states=8)
+            m = refomatch(regexptn, self.seq)
+            dfam = dfa.match(self.seq)
+            if m is None:
+                self.assertEqual(dfam, None)
+            else:
+                self.assertEqual(dfam.state, m.state)
+            self.assertEqual(dfa.search(self.seq).span(),
+                             refo.search(regexptn, self.seq).span())
+            xs = list(dfa.finditer(self.seq))
+            ys = list(refo.finditer(regexptn, self.seq))
+            self._eq_list_n_stuff(xs, ys)
+            self.assertEqual([x.state for x in xs], [y.state for y in ys])
+        dfa = refo.DFAPattern(self.b + self.b + refo.Star(self.a | self.b))
+        self.assertEqual(dfa.match(list(self.seq)[:100]).span(), (0, 100))
+
+    def test_dfa_finditer_onepass(self):
+        # Any iterable, each symbol read once; empty matches go to the VM
+        read = []
+
+        def stream(xs):
+            for x in xs:
+                read.append(x)
+                yield x
+        regexes = [self.a + self.b, refo.Plus(self.b), refo.Star(self.a),
+                   refo.Group(self.a, "x") + refo.Star(self.b, greedy=False)]
+        for regexptn in regexes:
+            del read[:]
+            xs = list(refo.DFAPattern(regexptn).finditer(stream(self.seq)))
+            ys = list(refo.finditer(regexptn, self.seq))
+            self._eq_list_n_stuff(xs, ys)
+            self.assertEqual([x.state for x in xs], [y.state for y in ys])
+            self.assertEqual(len(read), len(self.seq))
+
+    def test_counted_repetition(self):
+        a = refo.Literal("a")
+        b = refo.Literal("b")
+        x = refo.Group(a | a + b, "x")
+        nested = x + x + refo.Question(x + refo.Question(x))
+        string = "abaababaaabab"
+        for engine in (None, refo.PikeVM, refo.CodegenVM):
+            counted = refo.compile(x * (2, 4), engine)
+            unrolled = refo.compile(nested, engine)
+            for i in range(len(string)):
+                m1 = counted.match(string[i:])
+                m2 = unrolled.match(string[i:])
+                self.assertEqual(m1 and m1.state, m2 and m2.state)
+            xs = [m.state for m in counted.finditer(string)]
+            ys = [m.state for m in unrolled.finditer(string)]
+            self.assertEqual(xs, ys)
+        dfa = refo.DFAPattern(a * 3)
+        self.assertEqual(dfa.search(string).span(), (7, 10))
+        # The size of the code doesn't depend on the bounds
+        small = refo.compile(a + refo.Any() * (1, 3) + b, refo.PikeVM)
+        large = refo.compile(a + refo.Any() * (1, 30) + b, refo.PikeVM)
+        self.assertEqual(len(small.match_code), len(large.match_code))
+        self.assertEqual(large.search("xxabbxab").span(), (2, 8))
+
+    def test_optimize(self):
+        a = refo.Literal("a")
+        b = refo.Literal("b")
+        c = refo.Literal("c")
+        anything = refo.Star(refo.Any(), greedy=False)
+        regexptn = a + anything + (b | c | a) + anything
+        optimized = refo.optimize(regexptn)
+        self.assertTrue(isinstance(optimized.xs[-1], refo.OneOf))
+        self.assertEqual(len(optimized.xs), 3)
+        regexptn = refo.Group(a | refo.Plus(b) | c | a, "x") + (anything | b)
+        optimized = refo.optimize(regexptn)
+        self.assertTrue(isinstance(optimized, refo.Group))
+        strings = ["", "abcabc", "cbbbac", "xaxbxc", "bbbbbb", "cacbca"]
+        refo.optimize(regexptn, verify=strings)
+        self.assertRaises(AssertionError, check_equivalent,
+                          a + b, a + c, strings)
+
+    def test_requirements(self):
+        a = refo.Literal("a")
+        b = refo.Literal("b")
+        c = refo.Literal("c")
+        anything = refo.Star(refo.Any(), greedy=False)
+        regexptn = a + anything + (b | c) + refo.Question(a) + anything
+        reqs = requirements(regexptn)
+        self.assertEqual(len(reqs), 2)
+        self.assertEqual(reqs[0], [a])
+        self.assertEqual(set(reqs[1]), set([b, c]))
+        self.assertEqual(requirements(refo.Star(a) | b), [])
+        self.assertEqual(requirements(refo.Plus(a) + c * (0, 2)), [[a]])
+
+    def test_first_predicates(self):
+        a = refo.Literal("a")
+        b = refo.Literal("b")
+        c = refo.Literal("c")
+        anything = refo.Star(refo.Any(), greedy=False)
+        self.assertEqual(first_predicates(refo.Star(a) + b + c), [a, b])
+        self.assertEqual(first_predicates(refo.Question(a) + b | c + a),
+                         [a, b, c])
+        self.assertEqual(first_predicates(anything + a), None)
+        self.assertEqual(first_predicates(refo.Star(a)), None)
+        regexptn = refo.Group(b | c, "x") + anything + a
+        compiled = refo.compile(regexptn)
+        self.assertTrue(compiled.first("c"))
+        self.assertFalse(compiled.first("a"))
+        string = "aaaaacaaba"
+        self.assertEqual(refo.search(regexptn, iter(string)).state,
+                         refo.search(regexptn, string[:]).state)
+        self.assertEqual(compiled.search(iter(string))["x"], (5, 6))
+        self.assertEqual([m.span() for m in compiled.finditer(string)],
+                         [(5, 7), (8, 10)])
+
+    def test_match_stats(self):
+        regexptn = refo.Star(self.a + self.b) + refo.Group(self.a, "x")
+        compiled = refo.compile(regexptn, refo.PikeVM)
+        stats = refo.MatchStats()
+        m = compiled.search(self.seq, stats=stats)
+        self.assertEqual(m.state, compiled.search(self.seq).state)
+        xs = list(refo.finditer(regexptn, list(self.seq)[:100], stats=stats))
+        ys = list(refo.finditer(regexptn, list(self.seq)[:100]))
+        self.assertEqual([x.state for x in xs], [y.state for y in ys])
+        self.assertEqual(stats.calls, 2)
+        self.assertTrue(stats.threads >= stats.peak_threads > 0)
+        self.assertTrue(stats.epsilon_steps > 0)
+        self.assertIn(self.a, stats.predicate_calls)
+        self.assertIn(self.b, stats.predicate_time)
+        self.assertEqual(stats.evaluations, sum(stats.predicate_calls.values()))
+        self.assertIn("peak threads", stats.report())
+
+    @unittest.skipIf(numpy is None, "needs NumPy")
+    def test_finditer_many(self):
+        tested = []
+
+        class Vowel(refo.Predicate):
+            def __init__(self):
+                super(Vowel, self).__init__(lambda x: x.lower() in "aeiou")
+
+            def bulk_terms(self):
+                def test(x):
+                    tested.append(x)
+                    return x in "aeiou"
+                return [(str.lower, test)]
+
+        corpus = ["abcAb", "", "cc", "bAdEcab", "xyz", "aaa"]
+        regexptn = (refo.Group(Vowel(), "v") + refo.Literal("b") |
+                    refo.Literal("c") * (1, 2))
+        xs = finditer_many(regexptn, Corpus(corpus))
+        ys = [list(refo.finditer(regexptn, s)) for s in corpus]
+        self.assertEqual([[m.state for m in ms] for ms in xs],
+                         [[m.state for m in ms] for ms in ys])
+        self.assertEqual(sorted(tested), sorted(set(tested)))
+        xs = finditer_many(refo.Literal("a") + refo.Any(), corpus)
+        self.assertEqual([[m.span() for m in ms] for ms in xs],
+                         [[(0, 2)], [], [], [(5, 7)], [], [(0, 2)]])
+
+    def test_serialize(self):
+        serialize.register(str.lower, "lower")
+        a = refo.Literal("a")
+        vowel = refo.OneOf("AEIOU", key=str.upper)
+        regexes = [
+            refo.Group(a + refo.Star(vowel, greedy=False), "x") + a,
+            refo.Plus(refo.OneOf("bc", key=str.lower) | a) * (2, 4),
+            refo.Question(refo.Any()) + a + refo.Group(refo.Literal("c"), 1),
+        ]
+        seq = "abAaacBcaebcaAxcaac"
+        for engine in (None, refo.PikeVM, refo.CodegenVM):
+            compiled = [refo.compile(x, engine) for x in regexes[1:]]
+            loaded = serialize.loads(serialize.dumps(compiled))
+            for x, y in zip(compiled, loaded):
+                self.assertEqual(y.engine, x.engine)
+                self.assertEqual([m.state for m in y.finditer(seq)],
+                                 [m.state for m in x.finditer(seq)])
+                self.assertIs(refo.compile(y.pattern, engine), y)
+        # Key functions must be registered
+        self.assertRaises(ValueError, serialize.dumps, regexes[:1])
+        serialize.register(str.upper, "upper")
+        data = serialize.to_dict([regexes[0], regexes[0] + vowel],
+                                 refo.CodegenVM)
+        self.assertEqual(len(data["predicates"]), 2)
+        x, y = serialize.from_dict(data)
+        self.assertEqual(x.match(seq[3:]).state,
+                         refomatch(regexes[0], seq[3:]).state)
+        # The code is generated again if it doesn't fit the program
+        data["patterns"][0]["match_code"]["fingerprint"] = ""
+        # and compiled from the source for another Python
+        data["patterns"][0]["search_code"].pop("bytecode", None)
+        x, _ = serialize.from_dict(data)
+        self.assertEqual(x.match(seq[3:]).state,
+                         refomatch(regexes[0], seq[3:]).state)
+        self.assertRaises(ValueError, serialize.dumps, [self.a])
+
+    def test_stream_matcher(self):
+        tab = self.a + self.b
+        regexptn = tab * (2, None) + refo.Group(refo.Plus(self.b), "foobar")
+        matcher = refo.StreamMatcher(regexptn)
+        xs = []
+        for i, x in enumerate(self.seq):
+            for m in matcher.feed(x):
+                # Matches are final as soon as they can't grow
+                self.assertTrue(m.end() < i + 1)
+                xs.append(m)
+        xs.extend(matcher.close())
+        ys = list(finditer_lame(regexptn, self.seq))
+        self._eq_list_n_stuff(xs, ys)
+        matcher = refo.StreamMatcher(refo.Literal("a"))
+        self.assertEqual(matcher.feed("b"), [])
+        self.assertEqual([m.span() for m in matcher.feed("a")], [(1, 2)])
+        self.assertEqual(matcher.close(), [])
+
     def test_match_path(self):
         seq = [[1, 2],     # x and y
                [1],        # x
@@ -151,6 +496,12 @@ class TestRefoModule(unittest.TestCase):
         path = m.get_path()
         self.assertEqual([4, 1, 9, 1, 9], path)
 
+    def test_match_long_path(self):
+        seq = [[1, 2]] * 3000 + [[3]]
+        regexptn = refo.Star(self.x | self.y) + self.z
+        m = refomatch(regexptn, seq, keep_path=True)
+        self.assertEqual([1] * 3000 + [9], m.get_path())
+
 
 if __name__ == "__main__":
     unittest.main()